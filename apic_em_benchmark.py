@@ -0,0 +1,279 @@
+# developed by Gabi Zapodeanu, Cisco Systems, TSA, GSSE, Cisco Systems
+
+# !/usr/bin/env python3
+
+# Benchmark of the inventory and lookup workloads, run against the local mock server
+# Each workload runs --repeat times, each time in a new process, at each fleet size and latency profile. The median
+# wall time, items per second, peak memory (RSS), number of API calls and bytes received are saved to a JSON results
+# file, and compared with a baseline results file: a slower median wall time, or more API calls, than the baseline
+# are flagged. The switchport_inventory workloads run the serial, async and adaptive engines of the script
+# python3 apic_em_benchmark.py --sizes 100,1000 --profiles lan,wan --output results.json
+# python3 apic_em_benchmark.py --sizes 100,1000 --profiles lan,wan --baseline results.json
+
+
+import os
+import sys
+import json
+import time
+import argparse
+import ipaddress
+import statistics
+import resource
+import subprocess
+import contextlib
+import apic_em_mock_server
+
+# Latency profiles: latency and jitter in milliseconds for each API call
+
+PROFILES = {
+    'local': (0, 0),
+    'lan': (2, 1),
+    'wan': (50, 10),
+}
+
+WORKLOADS = ['get_device_license', 'switchport_inventory', 'switchport_inventory_async',
+             'switchport_inventory_adaptive', 'check_duplicate_IP', 'check_duplicate_IP_snapshot']
+
+# Number of hosts for each network device, and number of IP addresses checked by the check_duplicate_IP workloads
+
+HOSTS_PER_DEVICE = 20
+CHECKED_IP_ADDRESSES = 200
+
+# Number of runs of each workload, the median wall time is compared with the baseline
+
+REPEAT = 5
+
+# Relative change from the baseline flagged as regression
+
+TOLERANCE = 0.1
+
+
+def run_workload(workload, workers, ip_count):
+    """
+    The function will run one workload in this process, with the controller set by the APIC_EM_URL environment variable
+    The reports are written to os.devnull, the messages printed by the scripts are discarded
+    :param workload: workload name, one of WORKLOADS
+    :param workers: number of devices, or IP addresses, collected at the same time
+    :param ip_count: number of IP addresses checked by the check_duplicate_IP workloads
+    :return: dictionary with the wall time, the number of items (devices, switches or IP addresses) collected, the
+    peak memory and the metrics of each endpoint template
+    """
+
+    import apic_em_client
+    import apic_em_metrics
+    import apic_em_report
+
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        apic_em_client.get_service_ticket()
+        apic_em_client.ensure_pool_size(workers)
+        if workload == 'get_device_license':
+            import get_device_license
+            device_id_list = get_device_license.get_device_ids()
+            items = len(device_id_list)
+            with apic_em_report.StreamingCSVWriter(os.devnull) as output_writer:
+                for devices in get_device_license.iter_device_info(device_id_list, workers):
+                    output_writer.write_row(devices)
+        elif workload.startswith('switchport_inventory'):
+            # the same steps as switchport_inventory.main(), with the engine of the workload and its default limits
+            import asyncio
+            import apic_em_parallel
+            import switchport_inventory
+            switchport_inventory.preload_switchport_clients()
+            switch_id_list = switchport_inventory.get_switch_ids()
+            items = len(switch_id_list)
+            with apic_em_report.StreamingCSVWriter(os.devnull) as output_writer:
+                if workload == 'switchport_inventory_async':
+                    asyncio.run(switchport_inventory.save_switch_info_async(
+                        output_writer, switch_id_list, switchport_inventory.MAX_IN_FLIGHT,
+                        switchport_inventory.LIMIT_PER_HOST))
+                else:
+                    limiter = None
+                    if workload == 'switchport_inventory_adaptive':
+                        limiter = apic_em_parallel.AdaptiveLimiter(max_limit=switchport_inventory.MAX_IN_FLIGHT)
+                    for switch_info_list in switchport_inventory.iter_switch_info(switch_id_list, limiter):
+                        output_writer.write_rows(switch_info_list)
+        else:
+            import check_duplicate_IP
+            snapshot = None
+            if workload == 'check_duplicate_IP_snapshot':
+                snapshot = check_duplicate_IP.build_snapshot()
+            ip_address_list = benchmark_ip_addresses(ip_count)
+            items = len(ip_address_list)
+            with apic_em_report.StreamingCSVWriter(os.devnull) as output_writer:
+                check_duplicate_IP.check_ip_batch(ip_address_list, output_writer, 'csv', workers, snapshot)
+    wall_time = time.perf_counter() - start
+    return {'wall_time': wall_time, 'items': items, 'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'endpoints': apic_em_metrics.get_metrics()}
+
+
+def benchmark_ip_addresses(ip_count):
+    """
+    The function will return the IP addresses checked by the check_duplicate_IP workloads: a mix of host,
+    network device management, interface and unused IP addresses of the mock server address plan
+    :param ip_count: number of IP addresses
+    :return: list of IP addresses
+    """
+
+    networks = [apic_em_mock_server.HOST_NETWORK + 1, apic_em_mock_server.MANAGEMENT_NETWORK + 1,
+                apic_em_mock_server.INTERFACE_NETWORK, int(ipaddress.IPv4Address('192.0.2.0'))]
+    ip_address_list = []
+    for index in range(ip_count):
+        address = networks[index % len(networks)] + index // len(networks)
+        ip_address_list.append(str(ipaddress.IPv4Address(address)))
+    return ip_address_list
+
+
+def run_benchmark(controller, server_url, workload, workers, ip_count, repeat=REPEAT):
+    """
+    The function will run one workload repeat times, each time in a new process, and measure it
+    The wall time and the API calls are the median of the runs, so one slow run does not change the result
+    :param controller: mock controller, its statistics count the API calls and the bytes
+    :param server_url: mock server URL, for example http://127.0.0.1:8080/api/v1
+    :param workload: workload name
+    :param workers: number of devices, or IP addresses, collected at the same time
+    :param ip_count: number of IP addresses checked by the check_duplicate_IP workloads
+    :param repeat: number of runs
+    :return: dictionary with the results
+    """
+
+    environment = dict(os.environ, APIC_EM_URL=server_url, APIC_EM_TICKET_CACHE='', APIC_EM_METRICS='0')
+    environment.pop('APIC_EM_STORE', None)  # each run starts without local data
+    command = [sys.executable, os.path.abspath(__file__), '--run-workload', workload, '--workers', str(workers),
+               '--ip-count', str(ip_count)]
+    runs = []
+    for run in range(repeat):
+        controller.reset_stats()
+        process = subprocess.run(command, env=environment, stdout=subprocess.PIPE, universal_newlines=True,
+                                 cwd=os.path.dirname(os.path.abspath(__file__)))
+        if process.returncode != 0:
+            return {'error': 'workload exit code ' + str(process.returncode)}
+        run_result = json.loads(process.stdout.strip().splitlines()[-1])
+        stats = controller.stats
+        run_result.update({'requests': stats['requests'], 'bytes_received': stats['bytes_sent'],
+                           'status': dict(stats['status'])})
+        runs.append(run_result)
+    wall_times = [run_result['wall_time'] for run_result in runs]
+    result = dict(runs[-1])
+    result['wall_time'] = statistics.median(wall_times)
+    result['wall_times'] = wall_times
+    result['items_per_second'] = result['items'] / result['wall_time'] if result['wall_time'] else 0
+    result['requests'] = int(statistics.median([run_result['requests'] for run_result in runs]))
+    result['requests_per_second'] = result['requests'] / result['wall_time'] if result['wall_time'] else 0
+    result['peak_rss_kb'] = max(run_result['peak_rss_kb'] for run_result in runs)
+    return result
+
+
+def compare_results(results, baseline, tolerance=TOLERANCE):
+    """
+    The function will compare the results with the baseline results, for the same workload, fleet size and profile
+    A workload is slower if its median wall time is more than tolerance above the baseline median, and all its runs
+    are slower than the baseline median, so the variation from run to run is not flagged. Fewer API calls, and so
+    fewer API calls per second, are not a regression
+    :param results: list of results
+    :param baseline: list of baseline results
+    :param tolerance: relative change flagged as regression
+    :return: list of regression messages, empty if no regression
+    """
+
+    baseline_results = {}
+    for result in baseline:
+        baseline_results[(result['workload'], result['devices'], result['profile'])] = result
+    regressions = []
+    for result in results:
+        key = (result['workload'], result['devices'], result['profile'])
+        previous = baseline_results.get(key)
+        if previous is None or 'error' in result or 'error' in previous:
+            continue
+        name = '%s devices=%d profile=%s' % key
+        if result['requests'] > previous['requests'] * (1 + tolerance):
+            regressions.append('%s: API calls %d, baseline %d' % (name, result['requests'], previous['requests']))
+        if (result['wall_time'] > previous['wall_time'] * (1 + tolerance) and
+                min(result.get('wall_times', [result['wall_time']])) > previous['wall_time']):
+            regressions.append('%s: median wall time %.2fs, baseline %.2fs' %
+                               (name, result['wall_time'], previous['wall_time']))
+    return regressions
+
+
+def print_result(result):
+    """
+    The function will print one result line
+    :param result: dictionary with the results
+    :return: None
+    """
+
+    if 'error' in result:
+        print('%-30s %7d %-6s %s' % (result['workload'], result['devices'], result['profile'], result['error']))
+        return
+    print('%-30s %7d %-6s %9.2fs %9.1f items/s %8d calls %9.1f calls/s %8.1f MB %8.1f MB RSS' %
+          (result['workload'], result['devices'], result['profile'], result['wall_time'], result['items_per_second'],
+           result['requests'], result['requests_per_second'], result['bytes_received'] / 1e6,
+           result['peak_rss_kb'] / 1024.0))
+
+
+def main():
+    """
+    This application will run the workloads against the local mock server, at each fleet size and latency profile,
+    save the results to a JSON file, and compare them with a baseline results file
+    """
+
+    parser = argparse.ArgumentParser(description='APIC-EM scripts benchmark')
+    parser.add_argument('--workloads', default=','.join(WORKLOADS),
+                        help='comma separated workloads (default %(default)s)')
+    parser.add_argument('--sizes', default='100,1000', help='comma separated fleet sizes, number of network devices')
+    parser.add_argument('--profiles', default='lan', help='comma separated latency profiles: ' + ', '.join(PROFILES))
+    parser.add_argument('--workers', type=int, default=8,
+                        help='number of devices, or IP addresses, collected at the same time (default %(default)s)')
+    parser.add_argument('--ip-count', type=int, default=CHECKED_IP_ADDRESSES,
+                        help='number of IP addresses checked (default %(default)s)')
+    parser.add_argument('--repeat', type=int, default=REPEAT,
+                        help='runs of each workload, the median wall time is used (default %(default)s)')
+    parser.add_argument('--output', default='benchmark_results.json', help='results file (default %(default)s)')
+    parser.add_argument('--baseline', help='baseline results file to compare with')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='relative change flagged as regression (default %(default)s)')
+    parser.add_argument('--run-workload', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_workload:
+        # child process, runs one workload and prints the measures
+        print(json.dumps(run_workload(args.run_workload, args.workers, args.ip_count)))
+        return
+
+    results = []
+    for profile in args.profiles.split(','):
+        latency, jitter = PROFILES[profile]
+        for size in [int(size) for size in args.sizes.split(',')]:
+            fleet = apic_em_mock_server.SyntheticFleet(size, size * HOSTS_PER_DEVICE)
+            controller = apic_em_mock_server.MockController(fleet, latency / 1000.0, jitter / 1000.0)
+            server = apic_em_mock_server.start_server(controller)
+            server_url = 'http://127.0.0.1:%d%s' % (server.server_address[1], apic_em_mock_server.API_PREFIX)
+            try:
+                for workload in args.workloads.split(','):
+                    result = {'workload': workload, 'devices': size, 'hosts': fleet.host_count, 'profile': profile,
+                              'workers': args.workers}
+                    result.update(run_benchmark(controller, server_url, workload, args.workers, args.ip_count,
+                                                args.repeat))
+                    print_result(result)
+                    results.append(result)
+            finally:
+                server.shutdown()
+                server.server_close()
+
+    with open(args.output, 'w') as output_file:
+        json.dump({'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'results': results}, output_file, indent=2)
+    print('Results saved to', args.output)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        regressions = compare_results(results, baseline, args.tolerance)
+        for regression in regressions:
+            print('REGRESSION', regression)
+        if regressions:
+            raise SystemExit(1)
+        print('No regression compared with', args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+# Size bounded cache with expiring entries, used to save repeated API calls to the controller
+
+import time
+import threading
+from collections import OrderedDict
+
+
+class TTLCache(object):
+    """
+    Least recently used cache, the entries expire ttl seconds after they were saved
+    When the cache is full, the least recently used entry is removed
+    The cache may be used from multiple threads
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        """
+        :param maxsize: maximum number of entries
+        :param ttl: number of seconds an entry is valid, None for entries that do not expire
+        """
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        The function will return the value saved for the key, if the entry did not expire
+        :param key: cache key
+        :param default: value returned if the key is not in the cache
+        :return: the cached value, or default
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        """
+        The function will save the value for the key, removing the least recently used entries if the cache is full
+        :param key: cache key
+        :param value: value to save
+        :return: None
+        """
+
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        The function will remove all the entries
+        :return: None
+        """
+
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SingleFlight(object):
+    """
+    Coalescing of identical calls in progress: while a call for a key is in progress, the other callers with the
+    same key wait for it and share its result, or its exception, instead of making the same call again
+    Nothing is kept after the call completes, use TTLCache for that
+    The object may be used from multiple threads
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.shared = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, function):
+        """
+        The function will call function(), unless a call with the same key is in progress, then it will wait for
+        that call and return its result
+        :param key: call key, for example the API resource path and the query parameters
+        :param function: function to call, without parameters
+        :return: the function result
+        """
+
+        with self._lock:
+            self.calls += 1
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = InFlightCall()
+                self._in_flight[key] = call
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+        return call.result
+
+
+class InFlightCall(object):
+    """
+    One call in progress, with its result or exception when done
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
@@ -0,0 +1,1012 @@
+# Shared APIC-EM client used by all the sample scripts
+
+import os
+import time
+import atexit
+import threading
+import requests
+import json
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+import apic_em_cache
+import apic_em_json
+import apic_em_store
+import apic_em_resilience
+import apic_em_metrics
+from requests.packages.urllib3.exceptions import InsecureRequestWarning
+
+requests.packages.urllib3.disable_warnings(InsecureRequestWarning)  # Disable insecure https warnings
+
+# Declarations for the controller info. The values will need to change for the proper Sandbox info,
+# or the customer controller. The APIC_EM_URL, APIC_EM_USER and APIC_EM_PASSW environment variables override them,
+# for example APIC_EM_URL=http://127.0.0.1:8080/api/v1 for the local mock server
+
+APIC_EM_URL = os.environ.get('APIC_EM_URL', 'https://sandboxapic.cisco.com/api/v1').rstrip('/')
+APIC_EM = APIC_EM_URL.split('://', 1)[-1]
+APIC_EM_USER = os.environ.get('APIC_EM_USER', 'devnetuser')
+APIC_EM_PASSW = os.environ.get('APIC_EM_PASSW', 'Cisco123!')
+APIC_EM_TICKET = None
+
+# The ticket is saved to the ticket cache file, readable only by the user, and reused by the following runs until
+# it expires. The ticket is refreshed TICKET_REFRESH_MARGIN seconds before it expires. Set the APIC_EM_TICKET_CACHE
+# environment variable to an empty value to disable the ticket cache file
+
+TICKET_CACHE_PATH = os.environ.get('APIC_EM_TICKET_CACHE', os.path.join(os.path.expanduser('~'), '.apic_em_ticket.json'))
+TICKET_REFRESH_MARGIN = 60  # seconds
+TICKET_IDLE_TIMEOUT = 1800  # seconds, used if the controller does not return the ticket timeouts
+TICKET_SESSION_TIMEOUT = 21600  # seconds
+
+# Size of the keep-alive connection pool to the controller. All API calls share the same pool,
+# so the TCP and TLS handshakes are paid once per connection, not once per API call
+
+POOL_SIZE = 10
+
+# Number of records requested in each page when downloading the /network-device and /host collections
+
+PAGE_SIZE = 500
+
+# Network device filters sent to the controller as /network-device query parameters, so only the matching network
+# devices are downloaded. The other filters, and the filters with a list of values, are applied by the client
+
+DEVICE_QUERY_FILTERS = ('family', 'type', 'series', 'role', 'reachabilityStatus', 'platformId', 'softwareVersion')
+
+# The network device info is cached, by device id and by management IP address. The same switches are
+# looked up again and again, by clients connected to them, or by the inventory scripts
+
+DEVICE_CACHE_SIZE = 4096
+DEVICE_CACHE_TTL = 300  # seconds
+
+# Optional SQLite store, shared by all the scripts. When the APIC_EM_STORE environment variable has the store file
+# name, the records downloaded from the controller are saved to the store, and the lookups are answered from the store
+# for APIC_EM_STORE_MAX_AGE seconds
+
+STORE_PATH = os.environ.get('APIC_EM_STORE')
+STORE_MAX_AGE = float(os.environ.get('APIC_EM_STORE_MAX_AGE', '3600'))
+
+_session = None
+_ticket_info = None
+_ticket_lock = threading.Lock()
+_device_cache = apic_em_cache.TTLCache(DEVICE_CACHE_SIZE, DEVICE_CACHE_TTL)
+_device_ip_cache = apic_em_cache.TTLCache(DEVICE_CACHE_SIZE, DEVICE_CACHE_TTL)
+
+# Network devices inventory, loaded once with preload_device_inventory(). When loaded, the network device
+# lookups are answered from the inventory indexes, without API calls
+
+_inventory = None
+
+_store = None
+
+# Identical GET API calls in progress at the same time are sent once, all the callers share the parsed response
+
+_single_flight = apic_em_cache.SingleFlight()
+
+# Optional adaptive limiter for the number of API calls in progress, set by apic_em_parallel.adaptive_map()
+
+_limiter = None
+
+# Timeouts for each API call, in seconds: to open the connection, and between two bytes of the response
+
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60
+
+# The GET API calls that fail, time out, or return one of these status codes are sent again, up to RETRIES times,
+# after a random delay growing from BACKOFF_BASE up to BACKOFF_CAP seconds
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+RETRIES = 3
+BACKOFF_BASE = 0.5  # seconds
+BACKOFF_CAP = 10  # seconds
+
+# The status codes of the controller throttling the API calls, they cut the limit of the adaptive limiter
+
+THROTTLE_STATUS_CODES = (429, 503)
+
+# One circuit breaker for each endpoint family, for example /license-info, /interface or /host. After
+# BREAKER_FAILURES consecutive failed API calls, the calls to the endpoint family fail fast for
+# BREAKER_RESET_TIMEOUT seconds
+
+BREAKER_FAILURES = 5
+BREAKER_RESET_TIMEOUT = 30  # seconds
+
+_breakers = {}
+_breaker_lock = threading.Lock()
+
+# Metrics of the API calls for each endpoint template, printed to the standard error at exit. Set APIC_EM_METRICS=0
+# to not print them, APIC_EM_METRICS_JSON and APIC_EM_METRICS_PROMETHEUS to file names to save them
+
+METRICS_SUMMARY = os.environ.get('APIC_EM_METRICS', '1') != '0'
+METRICS_JSON = os.environ.get('APIC_EM_METRICS_JSON')
+METRICS_PROMETHEUS = os.environ.get('APIC_EM_METRICS_PROMETHEUS')
+
+apic_em_metrics.report_at_exit(METRICS_SUMMARY, METRICS_JSON, METRICS_PROMETHEUS)
+
+
+class APICEMError(Exception):
+    """
+    The controller could not be accessed, for example no ticket could be created
+    """
+
+
+class CircuitOpenError(APICEMError):
+    """
+    The API call was not sent, the circuit breaker of the endpoint family is open after repeated failures
+    """
+
+
+def create_session(pool_size=POOL_SIZE):
+    """
+    The function will create a requests session backed by a keep-alive connection pool
+    When all the pool connections are in use, new requests wait for a free connection
+    :param pool_size: maximum number of connections kept open to the controller
+    :return: requests session
+    """
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.verify = False
+    return session
+
+
+def get_session():
+    """
+    The function will return the shared session, creating it on first use
+    :return: requests session
+    """
+
+    global _session
+    if _session is None:
+        _session = create_session(POOL_SIZE)
+    return _session
+
+
+def set_pool_size(pool_size):
+    """
+    The function will change the size of the connection pool. The open connections are closed,
+    the next API call will create a new session with the requested pool size
+    :param pool_size: maximum number of connections kept open to the controller
+    :return: None
+    """
+
+    global POOL_SIZE, _session
+    POOL_SIZE = pool_size
+    if _session is not None:
+        _session.close()
+        _session = None
+
+
+def ensure_pool_size(workers):
+    """
+    The function will grow the connection pool to one connection for each worker, the pool is never made smaller
+    :param workers: number of API calls sent at the same time
+    :return: None
+    """
+
+    if workers > POOL_SIZE:
+        set_pool_size(workers)
+
+
+def set_controller(url, username=None, password=None):
+    """
+    The function will point all the following API calls to a different controller
+    The ticket, the network device caches and the inventory of the previous controller are discarded
+    :param url: controller base URL, for example https://sandboxapic.cisco.com/api/v1
+    :param username: optional username, the current one is kept if not specified
+    :param password: optional password, the current one is kept if not specified
+    :return: None
+    """
+
+    global APIC_EM_URL, APIC_EM, APIC_EM_USER, APIC_EM_PASSW, APIC_EM_TICKET, _ticket_info, _session
+    APIC_EM_URL = url.rstrip('/')
+    APIC_EM = APIC_EM_URL.split('://', 1)[-1]
+    if username is not None:
+        APIC_EM_USER = username
+    if password is not None:
+        APIC_EM_PASSW = password
+    APIC_EM_TICKET = None
+    _ticket_info = None
+    if _session is not None:
+        _session.close()
+        _session = None
+    with _breaker_lock:
+        _breakers.clear()
+    configure_device_cache(DEVICE_CACHE_SIZE, DEVICE_CACHE_TTL)
+    clear_device_inventory()
+
+
+def set_limiter(limiter):
+    """
+    The function will set the adaptive limiter used by all the API calls
+    :param limiter: apic_em_parallel.AdaptiveLimiter, or None to send the API calls without limit
+    :return: None
+    """
+
+    global _limiter
+    _limiter = limiter
+
+
+def get_breaker(path):
+    """
+    The function will return the circuit breaker of the endpoint family of the API resource path
+    :param path: API resource path, for example /license-info/network-device/{id}
+    :return: apic_em_resilience.CircuitBreaker
+    """
+
+    family = apic_em_resilience.endpoint_family(path)
+    with _breaker_lock:
+        breaker = _breakers.get(family)
+        if breaker is None:
+            breaker = apic_em_resilience.CircuitBreaker(family, BREAKER_FAILURES, BREAKER_RESET_TIMEOUT)
+            _breakers[family] = breaker
+        return breaker
+
+
+def configure_device_cache(maxsize=DEVICE_CACHE_SIZE, ttl=DEVICE_CACHE_TTL):
+    """
+    The function will replace the network device caches with new, empty, caches
+    :param maxsize: maximum number of network devices in each cache
+    :param ttl: number of seconds the network device info is valid, None to never expire, 0 to disable the cache
+    :return: None
+    """
+
+    global DEVICE_CACHE_SIZE, DEVICE_CACHE_TTL, _device_cache, _device_ip_cache
+    DEVICE_CACHE_SIZE = maxsize
+    DEVICE_CACHE_TTL = ttl
+    _device_cache = apic_em_cache.TTLCache(maxsize, ttl)
+    _device_ip_cache = apic_em_cache.TTLCache(maxsize, ttl)
+
+
+def cache_network_device(device_info):
+    """
+    The function will save the network device info in the caches, by device id and by management IP address
+    :param device_info: network device info
+    :return: None
+    """
+
+    if DEVICE_CACHE_TTL == 0:
+        return
+    if device_info.get('id'):
+        _device_cache.set(device_info['id'], device_info)
+    if device_info.get('managementIpAddress'):
+        _device_ip_cache.set(device_info['managementIpAddress'], device_info)
+
+
+def open_store(path, max_age=STORE_MAX_AGE):
+    """
+    The function will open the SQLite store, used by all the following API calls
+    :param path: the SQLite database file name, None to stop using the store
+    :param max_age: number of seconds the saved records are valid
+    :return: the store, or None
+    """
+
+    global STORE_PATH, STORE_MAX_AGE, _store
+    if _store is not None:
+        _store.close()
+    STORE_PATH = path
+    STORE_MAX_AGE = max_age
+    _store = apic_em_store.SnapshotStore(path, max_age) if path else None
+    return _store
+
+
+def get_store():
+    """
+    The function will return the SQLite store, opening it on first use if STORE_PATH is set
+    :return: the store, or None if no store is used
+    """
+
+    if _store is None and STORE_PATH:
+        open_store(STORE_PATH, STORE_MAX_AGE)
+    return _store
+
+
+def api_get(path, params=None):
+    """
+    The function will send a GET request to the controller, using the shared connection pool
+    If the controller does not accept the ticket, a new ticket is created and the request is sent again, once
+    :param path: API resource path, for example /network-device
+    :param params: optional query parameters
+    :return: requests response
+    """
+
+    url = APIC_EM_URL + path
+    ticket = get_ticket()
+    header = {'accept': 'application/json', 'X-Auth-Token': ticket}
+    response = send_get(path, url, params, header)
+    if response.status_code == 401:
+        response.close()
+        header['X-Auth-Token'] = refresh_service_ticket(ticket)
+        response = send_get(path, url, params, header)
+    return response
+
+
+def get_json(path, params=None):
+    """
+    The function will send a GET request to the controller and parse the JSON response
+    If the same GET request, same path and query parameters, is already in progress, no new request is sent,
+    the result of the request in progress is returned. Do not modify the returned JSON data, it may be shared
+    :param path: API resource path, for example /network-device/{id}
+    :param params: optional query parameters
+    :return: status code, parsed JSON response (None if the response is not JSON)
+    """
+
+    key = ('GET', path, tuple(sorted((name, str(value)) for name, value in (params or {}).items())))
+    return _single_flight.do(key, lambda: fetch_json(path, params))
+
+
+def fetch_json(path, params=None):
+    """
+    The function will send a GET request to the controller and parse the JSON response, see get_json
+    :param path: API resource path
+    :param params: optional query parameters
+    :return: status code, parsed JSON response (None if the response is not JSON)
+    """
+
+    response = api_get(path, params)
+    try:
+        response_json = apic_em_json.response_json(response)
+    except ValueError:
+        response_json = None
+    return response.status_code, response_json
+
+
+def send_get(path, url, params, header):
+    """
+    The function will send the GET request, with the connect and read timeouts
+    A request that fails, times out, or returns one of the RETRY_STATUS_CODES is sent again, up to RETRIES times,
+    after a jittered exponential backoff delay, or the Retry-After delay of the controller if longer
+    When the circuit breaker of the endpoint family is open, no request is sent and CircuitOpenError is raised.
+    The breaker counts one failure for the API call, when all the attempts failed. An API call throttled by the
+    controller (429) in all the failed attempts is not counted, the endpoint is not down
+    When an adaptive limiter is set, the request waits for the limiter, and the latency and the throttling
+    (THROTTLE_STATUS_CODES) are reported to the limiter
+    :param path: API resource path, selects the circuit breaker
+    :param url: request URL
+    :param params: optional query parameters
+    :param header: request headers
+    :return: requests response, the last one if all the attempts returned a retry status code
+    """
+
+    breaker = get_breaker(path)
+    if not breaker.allow():
+        raise CircuitOpenError('API calls to ' + breaker.name + ' are failing, retry in ' +
+                               str(int(breaker.retry_after())) + ' seconds')
+    limiter = _limiter
+    succeeded = False
+    throttled = True  # all the failed attempts were throttled by the controller
+    try:
+        for attempt in range(RETRIES + 1):
+            if limiter is not None:
+                limiter.acquire()
+            start = time.monotonic()
+            response = None
+            error = None
+            try:
+                response = get_session().get(url, params=params, headers=header,
+                                             timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+            except requests.exceptions.RequestException as request_error:
+                error = request_error
+            latency = time.monotonic() - start
+            if response is not None:
+                apic_em_metrics.record('GET', path, response.status_code, latency, len(response.content))
+            else:
+                apic_em_metrics.record('GET', path, None, latency)
+            failed = error is not None or response.status_code in RETRY_STATUS_CODES
+            if limiter is not None:
+                limiter.release(latency, throttled=response is not None and
+                                response.status_code in THROTTLE_STATUS_CODES)
+            if not failed:
+                succeeded = True
+                return response
+            if response is None or response.status_code != 429:
+                throttled = False
+            if attempt < RETRIES:
+                if response is not None:
+                    response.close()  # the connection is returned to the pool
+                delay = apic_em_resilience.backoff_delay(attempt, BACKOFF_BASE, BACKOFF_CAP)
+                if response is not None and response.headers.get('Retry-After', '').isdigit():
+                    delay = max(delay, min(BACKOFF_CAP, int(response.headers['Retry-After'])))
+                time.sleep(delay)
+    finally:
+        # the breaker is always updated, so the trial API call of a half-open breaker is never left in progress
+        if succeeded:
+            breaker.record_success()
+        elif throttled:
+            breaker.release_trial()  # throttling is handled by the backoff, the endpoint is not down
+        else:
+            breaker.record_failure()
+    if error is not None:
+        raise APICEMError('API call to ' + path + ' failed after ' + str(RETRIES + 1) + ' attempts: ' + str(error))
+    return response
+
+
+def ticket_is_valid(ticket_info):
+    """
+    The function will find out if the ticket is valid for at least TICKET_REFRESH_MARGIN seconds
+    The ticket expires after the idle timeout since it was last used, or after the session timeout since it was created
+    :param ticket_info: dictionary with the ticket, the timeouts and the time it was created and last used
+    :return: True if the ticket may be used
+    """
+
+    expires = min(ticket_info['created'] + ticket_info['session_timeout'],
+                  ticket_info['last_used'] + ticket_info['idle_timeout'])
+    return expires - TICKET_REFRESH_MARGIN > time.time()
+
+
+def ticket_cache_key():
+    """
+    :return: the ticket cache file key, the tickets are saved for each controller and user
+    """
+
+    return APIC_EM_USER + '@' + APIC_EM
+
+
+def load_cached_ticket():
+    """
+    The function will read the ticket for this controller and user from the ticket cache file
+    :return: dictionary with the ticket info, or None if no valid ticket was saved
+    """
+
+    if not TICKET_CACHE_PATH:
+        return None
+    try:
+        with open(TICKET_CACHE_PATH) as cache_file:
+            ticket_info = json.load(cache_file).get(ticket_cache_key())
+    except (OSError, ValueError, AttributeError):
+        return None
+    if ticket_info and ticket_is_valid(ticket_info):
+        return ticket_info
+    return None
+
+
+def save_cached_ticket(ticket_info):
+    """
+    The function will save the ticket to the ticket cache file. The file is readable only by the user, and is
+    replaced in one step, so a script reading it at the same time never sees a partial file
+    :param ticket_info: dictionary with the ticket info
+    :return: None
+    """
+
+    if not TICKET_CACHE_PATH:
+        return
+    try:
+        with open(TICKET_CACHE_PATH) as cache_file:
+            tickets = json.load(cache_file)
+    except (OSError, ValueError):
+        tickets = {}
+    if not isinstance(tickets, dict):
+        tickets = {}
+    tickets[ticket_cache_key()] = ticket_info
+    temp_path = TICKET_CACHE_PATH + '.' + str(os.getpid())
+    try:
+        cache_fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(cache_fd, 'w') as cache_file:
+            json.dump(tickets, cache_file)
+        os.replace(temp_path, TICKET_CACHE_PATH)
+    except OSError:
+        pass  # the ticket cache file is optional, the ticket is still used by this run
+
+
+def create_service_ticket():
+    """
+    The function will create a new ticket
+    API call to /ticket
+    :return: dictionary with the ticket info
+    """
+
+    payload = {'username': APIC_EM_USER, 'password': APIC_EM_PASSW}
+    url = APIC_EM_URL + '/ticket'
+    header = {'content-type': 'application/json'}
+    start = time.monotonic()
+    try:
+        ticket_response = get_session().post(url, data=json.dumps(payload), headers=header,
+                                             timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+    except requests.exceptions.RequestException as error:
+        apic_em_metrics.record('POST', '/ticket', None, time.monotonic() - start)
+        raise APICEMError('Could not connect to APIC-EM ' + APIC_EM + ': ' + str(error))
+    apic_em_metrics.record('POST', '/ticket', ticket_response.status_code, time.monotonic() - start,
+                           len(ticket_response.content))
+    if not ticket_response:
+        raise APICEMError('Could not create an APIC-EM ticket, status code ' + str(ticket_response.status_code))
+    ticket_json = apic_em_json.response_json(ticket_response)['response']
+    now = time.time()
+    return {'ticket': ticket_json['serviceTicket'], 'created': now, 'last_used': now,
+            'idle_timeout': ticket_json.get('idleTimeout', TICKET_IDLE_TIMEOUT),
+            'session_timeout': ticket_json.get('sessionTimeout', TICKET_SESSION_TIMEOUT)}
+
+
+def get_service_ticket(force=False):
+    """
+    This function will return the Auth ticket required to access APIC-EM
+    A valid ticket from this run, or from the ticket cache file, is reused. Otherwise
+    API call to /ticket is used to create a new user ticket
+    The ticket is saved in this module and used by all the following API calls
+    :param force: create a new ticket, even if the current ticket is valid
+    :return: ticket
+    """
+
+    with _ticket_lock:
+        ticket_info = None
+        if not force:
+            if _ticket_info is not None and ticket_is_valid(_ticket_info):
+                return _ticket_info['ticket']
+            ticket_info = load_cached_ticket()
+        if ticket_info is None:
+            ticket_info = create_service_ticket()
+            save_cached_ticket(ticket_info)
+        return set_ticket(ticket_info)
+
+
+def set_ticket(ticket_info):
+    """
+    The function will save the ticket in this module, used by all the following API calls
+    :param ticket_info: dictionary with the ticket info
+    :return: ticket
+    """
+
+    global APIC_EM_TICKET, _ticket_info
+    _ticket_info = ticket_info
+    APIC_EM_TICKET = ticket_info['ticket']
+    return APIC_EM_TICKET
+
+
+def get_ticket():
+    """
+    The function will return a valid ticket for the next API call, refreshing the ticket before it expires
+    :return: ticket
+    """
+
+    ticket_info = _ticket_info
+    if ticket_info is None or not ticket_is_valid(ticket_info):
+        get_service_ticket()
+        ticket_info = _ticket_info
+    ticket_info['last_used'] = time.time()
+    return ticket_info['ticket']
+
+
+def refresh_service_ticket(rejected_ticket):
+    """
+    The function will create a new ticket, after the controller did not accept the ticket
+    If another thread already replaced the rejected ticket, the new ticket is used
+    :param rejected_ticket: the ticket not accepted by the controller
+    :return: ticket
+    """
+
+    with _ticket_lock:
+        if APIC_EM_TICKET != rejected_ticket:
+            return APIC_EM_TICKET
+        ticket_info = create_service_ticket()
+        save_cached_ticket(ticket_info)
+        return set_ticket(ticket_info)
+
+
+def save_ticket_last_used():
+    """
+    The function will save the time the ticket was last used to the ticket cache file, when the script exits,
+    so the next run knows when the ticket idle timeout expires
+    :return: None
+    """
+
+    if _ticket_info is not None and ticket_is_valid(_ticket_info):
+        save_cached_ticket(_ticket_info)
+
+
+atexit.register(save_ticket_last_used)
+
+
+def get_page(path, start_index, records_to_return, params=None):
+    """
+    The function will return one page of a collection, using the APIC-EM paging
+    API call to {path}/{startIndex}/{recordsToReturn}, the first record has the index 1
+    :param path: collection path, for example /network-device or /host
+    :param start_index: index of the first record in the page
+    :param records_to_return: number of records in the page
+    :param params: optional query parameters
+    :return: list of records, empty if there are no more records
+    APICEMError is raised if the page could not be downloaded, so a partial collection is never returned as complete
+    """
+
+    page_response = api_get(path + '/' + str(start_index) + '/' + str(records_to_return), params=params)
+    if page_response.status_code == 404:
+        return []  # no records from startIndex
+    if not page_response:
+        # do not return a partial collection, it would be saved to the store as complete
+        raise APICEMError('Could not download ' + path + ', status code ' + str(page_response.status_code))
+    try:
+        page_json = apic_em_json.response_json(page_response)
+    except ValueError as error:
+        raise APICEMError('Could not download ' + path + ', the response is not JSON: ' + str(error))
+    if type(page_json) is not dict or type(page_json.get('response')) is not list:
+        raise APICEMError('Could not download ' + path + ', the response has no records list')
+    return page_json['response']
+
+
+def iter_collection(path, params=None, page_size=PAGE_SIZE, prefetch=False):
+    """
+    The function will return the records of a collection one by one, downloading one page at a time
+    The memory used does not depend on the collection size
+    With prefetch, the next page is downloaded while the records of the current page are processed
+    :param path: collection path, for example /network-device or /host
+    :param params: optional query parameters
+    :param page_size: number of records in each page
+    :param prefetch: download the next page in the background
+    :return: generator with the collection records
+    """
+
+    start_index = 1
+    if not prefetch:
+        while True:
+            page = get_page(path, start_index, page_size, params)
+            for record in page:
+                yield record
+            if len(page) < page_size:
+                return
+            start_index += page_size
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        next_page = executor.submit(get_page, path, start_index, page_size, params)
+        while next_page is not None:
+            page = next_page.result()
+            start_index += page_size
+            next_page = None
+            if len(page) == page_size:
+                next_page = executor.submit(get_page, path, start_index, page_size, params)
+            for record in page:
+                yield record
+
+
+def iter_stored_collection(path, table, page_size=PAGE_SIZE, prefetch=False):
+    """
+    The function will return the records of a complete collection one by one, from the SQLite store if the collection
+    was downloaded in the last STORE_MAX_AGE seconds, or from the controller
+    The records downloaded from the controller are saved to the store, one page at a time. When the download
+    is complete, the records not returned by the controller anymore are removed from the store
+    :param path: collection path, /network-device, /interface or /host
+    :param table: store table, devices, interfaces or hosts
+    :param page_size: number of records in each page
+    :param prefetch: download the next page in the background
+    :return: generator with the collection records
+    """
+
+    store = get_store()
+    if store is None:
+        for record in iter_collection(path, page_size=page_size, prefetch=prefetch):
+            yield record
+        return
+    if store.is_fresh(path):
+        for record in getattr(store, 'iter_' + table)():
+            yield record
+        return
+    save_function = getattr(store, 'save_' + table)
+    started = time.time()
+    page = []
+    for record in iter_collection(path, page_size=page_size, prefetch=prefetch):
+        page.append(record)
+        if len(page) == page_size:
+            save_function(page)
+            page = []
+        yield record
+    save_function(page)
+    store.remove_older(table, started)
+    store.mark_fetched(path)
+
+
+def iter_network_devices(page_size=PAGE_SIZE, prefetch=False, **filters):
+    """
+    The function will return the network devices one by one, using the paged /network-device collection
+    Each network device is saved in the network device caches
+    The filters are sent to the controller if supported, see DEVICE_QUERY_FILTERS, and all the filters are applied
+    to each page, so a controller that ignores a query parameter, or matches it differently, does not change the
+    result. If the complete list is in the SQLite store, all the filters are applied locally
+    :param page_size: number of network devices in each page
+    :param prefetch: download the next page in the background
+    :param filters: optional network device field to value, or to list of values, for example family='Unified AP'
+    :return: generator with the network devices info
+    """
+
+    params, client_filters = build_query(filters, DEVICE_QUERY_FILTERS)
+    store = get_store()
+    if not params and not client_filters:
+        device_infos = iter_stored_collection('/network-device', 'devices', page_size, prefetch)
+    elif store is not None and store.is_fresh('/network-device'):
+        device_infos = filter_records(store.iter_devices(), dict(params, **client_filters))
+    else:
+        device_infos = filter_records(iter_collection('/network-device', params, page_size, prefetch),
+                                      dict(params, **client_filters))
+    for device_info in device_infos:
+        cache_network_device(device_info)
+        yield device_info
+
+
+def build_query(filters, query_filters):
+    """
+    The function will split the filters in the query parameters sent to the controller, and the filters applied by
+    the client. The filters without a value are not used
+    :param filters: dictionary record field to value, or to list of values
+    :param query_filters: record fields the controller accepts as query parameters
+    :return: query parameters, client filters
+    """
+
+    params = {}
+    client_filters = {}
+    for name, value in filters.items():
+        if value is None:
+            continue
+        if name in query_filters and type(value) is str:
+            params[name] = value
+        else:
+            client_filters[name] = value
+    return params, client_filters
+
+
+def record_matches(record, filters):
+    """
+    The function will find out if the record matches all the filters
+    :param record: record info, for example network device info
+    :param filters: dictionary record field to value, or to list of values
+    :return: True if the record matches
+    """
+
+    for name, value in filters.items():
+        if type(value) in (list, tuple, set):
+            if record.get(name) not in value:
+                return False
+        elif record.get(name) != value:
+            return False
+    return True
+
+
+def filter_records(records, filters):
+    """
+    :param records: iterable with the records info
+    :param filters: dictionary record field to value, or to list of values
+    :return: generator with the records matching all the filters
+    """
+
+    for record in records:
+        if record_matches(record, filters):
+            yield record
+
+
+def iter_hosts(page_size=PAGE_SIZE, prefetch=False, **filters):
+    """
+    The function will return the client devices one by one, using the paged /host collection
+    :param page_size: number of hosts in each page
+    :param prefetch: download the next page in the background
+    :param filters: optional query parameters for /host
+    :return: generator with the hosts info
+    """
+
+    if filters:
+        return iter_collection('/host', params=filters, page_size=page_size, prefetch=prefetch)
+    return iter_stored_collection('/host', 'hosts', page_size, prefetch)
+
+
+def iter_interfaces(page_size=PAGE_SIZE, prefetch=False):
+    """
+    The function will return the network device interfaces one by one, using the paged /interface collection
+    :param page_size: number of interfaces in each page
+    :param prefetch: download the next page in the background
+    :return: generator with the interfaces info
+    """
+
+    return iter_stored_collection('/interface', 'interfaces', page_size, prefetch)
+
+
+def preload_device_inventory(**filters):
+    """
+    The function will download the list of all network devices, one page at a time, and build the inventory indexes:
+    by_id - device id to network device info
+    by_ip - management IP address to network device info
+    by_family - device family to list of device ids, in the controller order
+    With filters, only the matching network devices are downloaded, see iter_network_devices(), and kept in the
+    inventory, the lookups of the other network devices are not answered by the inventory
+    :param filters: optional network device field to value, for example family='Switches and Hubs'
+    :return: the inventory dictionary, the 'devices' key has the list of all network devices, or of the matching ones
+    """
+
+    global _inventory
+    inventory = {'devices': [], 'by_id': {}, 'by_ip': {}, 'by_family': {}}
+    for device_info in iter_network_devices(prefetch=True, **filters):
+        inventory['devices'].append(device_info)
+        inventory['by_id'][device_info.get('id')] = device_info
+        if device_info.get('managementIpAddress'):
+            inventory['by_ip'][device_info['managementIpAddress']] = device_info
+        inventory['by_family'].setdefault(device_info.get('family'), []).append(device_info.get('id'))
+    _inventory = inventory
+    return inventory
+
+
+def clear_device_inventory():
+    """
+    The function will remove the network devices inventory, the lookups will call the controller again
+    :return: None
+    """
+
+    global _inventory
+    _inventory = None
+
+
+def get_network_device(device_id):
+    """
+    The function will return the info for the network device with the specified device ID
+    API call to /network-device/{id}
+    The info is returned from the inventory if loaded, or from the cache if the network device was looked up recently
+    :param device_id: APIC-EM device id
+    :return: network device info
+    """
+
+    if _inventory is not None and device_id in _inventory['by_id']:
+        return _inventory['by_id'][device_id]
+    device_info = _device_cache.get(device_id)
+    if device_info is None:
+        # the lookups of the same network device in progress share one lookup, also when the cache is empty
+        device_info = _single_flight.do(('network-device', device_id), lambda: load_network_device(device_id))
+    return device_info
+
+
+def load_network_device(device_id):
+    """
+    The function will load the info for the network device with the specified device ID, from the SQLite store or
+    from the controller, and save it in the network device caches
+    :param device_id: APIC-EM device id
+    :return: network device info
+    """
+
+    store = get_store()
+    device_info = store.get_device(device_id) if store is not None else None
+    if device_info is None:
+        status_code, device_json = get_json('/network-device/' + device_id)
+        if status_code >= 400 or device_json is None:
+            raise APICEMError('Could not get the network device ' + device_id + ', status code ' + str(status_code))
+        device_info = device_json['response']
+        if store is not None:
+            store.save_devices([device_info])
+    cache_network_device(device_info)
+    return device_info
+
+
+def get_network_device_by_ip(device_ip):
+    """
+    The function will return the info for the network device with the specified management IP address
+    API call to /network-device/ip-address/{ip-address}
+    The info is returned from the inventory if loaded, or from the cache if the network device was looked up recently
+    :param device_ip: network device management IP address
+    :return: network device info, or None if no network device has the IP address
+    """
+
+    if _inventory is not None and device_ip in _inventory['by_ip']:
+        return _inventory['by_ip'][device_ip]
+    device_info = _device_ip_cache.get(device_ip)
+    if device_info is None:
+        device_info = _single_flight.do(('network-device/ip-address', device_ip),
+                                        lambda: load_network_device_by_ip(device_ip))
+    return device_info
+
+
+def load_network_device_by_ip(device_ip):
+    """
+    The function will load the info for the network device with the specified management IP address, from the
+    SQLite store or from the controller, and save it in the network device caches
+    :param device_ip: network device management IP address
+    :return: network device info, or None if no network device has the IP address
+    """
+
+    store = get_store()
+    device_info = store.get_device_by_ip(device_ip) if store is not None else None
+    if device_info is None:
+        if store is not None and store.is_fresh('/network-device'):
+            return None
+        status_code, device_json = get_json('/network-device/ip-address/' + device_ip)
+        if status_code >= 400 or device_json is None:
+            return None
+        device_info = device_json['response']
+        if store is not None:
+            store.save_devices([device_info])
+    cache_network_device(device_info)
+    return device_info
+
+
+def get_interfaces_by_ip(interface_ip):
+    """
+    The function will return the network device interfaces configured with the specified IP address
+    API call to /interface/ip-address/{ip-address}
+    The interfaces are returned from the SQLite store if all the interfaces were downloaded recently
+    :param interface_ip: IP address
+    :return: list of interfaces, or None if no interface is configured with the IP address
+    """
+
+    store = get_store()
+    if store is not None and store.is_fresh('/interface'):
+        return store.get_interfaces_by_ip(interface_ip) or None
+    status_code, interface_json = get_json('/interface/ip-address/' + interface_ip)
+    if status_code >= 400 or interface_json is None:
+        return None
+    if store is not None:
+        store.save_interfaces(interface_json['response'])
+    return interface_json['response']
+
+
+def get_interfaces_by_device(device_id):
+    """
+    The function will return all the interfaces of the network device with the specified device ID
+    API call to /interface/network-device/{deviceId}
+    The interfaces are returned from the SQLite store if they were downloaded recently
+    :param device_id: APIC-EM device id
+    :return: list of interfaces
+    APICEMError is raised if the interfaces could not be downloaded, for example for an unknown device id
+    """
+
+    path = '/interface/network-device/' + device_id
+    store = get_store()
+    if store is not None and (store.is_fresh(path) or store.is_fresh('/interface')):
+        return store.get_interfaces_by_device(device_id)
+    status_code, interface_json = get_json(path)
+    if status_code != 200 or type(interface_json) is not dict or type(interface_json.get('response')) is not list:
+        raise APICEMError('Could not get the interfaces of ' + device_id + ', status code ' + str(status_code))
+    if store is not None:
+        store.save_interfaces(interface_json['response'])
+        store.mark_fetched(path)
+    return interface_json['response']
+
+
+def get_hosts(**filters):
+    """
+    The function will return the client devices matching the filters, for example hostIp or hostMac
+    API call to /host
+    The hosts are returned from the SQLite store if all the hosts were downloaded recently, and the filter is
+    hostIp or hostMac
+    :param filters: query parameters for /host
+    :return: the 'response' value, a list of hosts, or a dictionary with the error messages
+    """
+
+    store = get_store()
+    if store is not None and set(filters) in ({'hostIp'}, {'hostMac'}) and store.is_fresh('/host'):
+        return store.get_hosts(filters.get('hostIp'), filters.get('hostMac'))
+    status_code, host_json = get_json('/host', params=filters)
+    if host_json is None:
+        raise APICEMError('Could not get the hosts, status code ' + str(status_code))
+    if store is not None and type(host_json['response']) is list:
+        store.save_hosts(host_json['response'])
+    return host_json['response']
+
+
+def get_license_info(device_id):
+    """
+    The function will return the license info of the network device with the specified device ID
+    API call to /license-info/network-device/{id}
+    The license info is returned from the SQLite store if it was downloaded recently
+    :param device_id: APIC-EM device id
+    :return: list with the license info, empty if the controller has no license info for the device (404)
+    APICEMError is raised if the license info could not be downloaded
+    """
+
+    store = get_store()
+    if store is not None:
+        license_info = store.get_license(device_id)
+        if license_info is not None:
+            return license_info
+    status_code, license_json = get_json('/license-info/network-device/' + device_id, params={'deviceid': device_id})
+    if status_code == 404:
+        return []
+    if status_code != 200 or type(license_json) is not dict or type(license_json.get('response')) is not list:
+        raise APICEMError('Could not get the license info of ' + device_id + ', status code ' + str(status_code))
+    if store is not None:
+        store.save_license(device_id, license_json['response'])
+    return license_json['response']
+
+
+def read_addresses(input_file):
+    """
+    The function will read the IP or MAC addresses of the batch modes, one or more on each line, separated by spaces
+    or commas. Empty lines and lines starting with # are skipped, the duplicates are removed, the order is kept
+    :param input_file: file object
+    :return: list of addresses, in the file order
+    """
+
+    addresses = {}
+    for line in input_file:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            addresses.update(dict.fromkeys(line.replace(',', ' ').split()))
+    return list(addresses)
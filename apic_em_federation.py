@@ -0,0 +1,192 @@
+# Federation of several controllers, for example one controller for each region
+# Each controller is collected in its own process, all the controllers at the same time. Each process has its own
+# ticket, connection pool, caches and circuit breakers, the apic_em_client module state of one controller.
+# The results are merged in one report, tagged with the controller name, the network devices known by more than
+# one controller are kept once, by serial number
+#
+# The controllers file is a JSON list, one object for each controller. The username and password are optional, the
+# APIC_EM_USER and APIC_EM_PASSW values are used if missing. password_env is the name of an environment variable
+# with the password, so the file does not need to have it
+# [{"name": "emea", "url": "https://apic-emea.example.com/api/v1", "username": "admin", "password_env": "EMEA_PASSW"},
+#  {"name": "amer", "url": "https://apic-amer.example.com/api/v1", "username": "admin", "password": "secret"}]
+
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import apic_em_client
+import apic_em_json
+import apic_em_metrics
+
+CONTROLLER_NAME = re.compile(r'^[\w.-]+$')
+
+# Lookup error of the addresses of a controller that failed
+
+CONTROLLER_FAILED = 'controller failed'
+
+# The controller collected by this process, set in the controller process by run_on_controller()
+
+_controller = None
+
+
+def load_controllers(path):
+    """
+    The function will read the controllers file
+    :param path: controllers file name, JSON
+    :return: list of dictionaries with the controller name, url, username and password, in the file order
+    ValueError is raised if the file is not valid
+    """
+
+    with open(path) as controllers_file:
+        controller_list = apic_em_json.loads(controllers_file.read())
+    if type(controller_list) is not list or not controller_list:
+        raise ValueError('The controllers file should have a list of controllers')
+    controllers = []
+    names = set()
+    for controller_info in controller_list:
+        if type(controller_info) is not dict or not controller_info.get('url'):
+            raise ValueError('Each controller should have an url: ' + str(controller_info))
+        url = controller_info['url'].rstrip('/')
+        name = controller_info.get('name') or url.split('://', 1)[-1].split('/', 1)[0]
+        if not CONTROLLER_NAME.match(name) or name in names:
+            raise ValueError('The controller names should be unique, letters, digits, . - and _: ' + name)
+        names.add(name)
+        password = controller_info.get('password')
+        if controller_info.get('password_env'):
+            password = os.environ.get(controller_info['password_env'])
+            if password is None:
+                raise ValueError('The environment variable ' + controller_info['password_env'] + ' is not set')
+        controllers.append({'name': name, 'url': url, 'username': controller_info.get('username'),
+                            'password': password})
+    return controllers
+
+
+def read_controllers(path, output=sys.stdout):
+    """
+    The function will read the controllers file of the federation mode, see load_controllers(). In federation mode
+    each controller has its own ticket and connection pool, in its own process, the script does not create a ticket
+    If the file is not valid, the error is printed and the script exits
+    :param path: controllers file name, JSON
+    :param output: file the error is printed to
+    :return: list of controllers
+    """
+
+    try:
+        return load_controllers(path)
+    except (OSError, ValueError) as error:
+        print('Something went wrong with the controllers file!', error, file=output)
+        raise SystemExit(1)
+
+
+def controller_path(path):
+    """
+    The function will return the file name used by the controller collected by this process, for the state and
+    store files that should not be shared by the controllers
+    :param path: file name, for example apic_em_license_state.db
+    :return: file name with the controller name, for example apic_em_license_state.emea.db
+    """
+
+    if _controller is None:
+        return path
+    root, extension = os.path.splitext(path)
+    return root + '.' + _controller['name'] + extension
+
+
+def run_on_controller(controller, function, args):
+    """
+    The function will point the apic_em_client module of this process to the controller, and call the function
+    Runs in the controller process. The API call metrics of the controller are printed to the standard error
+    :param controller: dictionary with the controller name, url, username and password
+    :param function: function to call, a module level function
+    :param args: tuple with the function arguments
+    :return: the function result
+    """
+
+    global _controller
+    _controller = controller
+    apic_em_client.set_controller(controller['url'], controller['username'], controller['password'])
+    if apic_em_client.STORE_PATH:
+        apic_em_client.open_store(controller_path(apic_em_client.STORE_PATH), apic_em_client.STORE_MAX_AGE)
+    apic_em_metrics.reset()
+    try:
+        return function(*args)
+    finally:
+        if apic_em_client.METRICS_SUMMARY and apic_em_metrics.get_metrics():
+            print('Controller ' + controller['name'] + '\n' + apic_em_metrics.format_summary(), file=sys.stderr)
+
+
+def run_on_controllers(controllers, function, *args):
+    """
+    The function will call function(*args) for each controller, all the controllers at the same time, each one
+    in its own process. A controller that fails does not stop the others, the error is printed
+    :param controllers: list of controllers, from load_controllers()
+    :param function: function to call, a module level function, the result should be picklable
+    :param args: the function arguments
+    :return: list of (controller, result), in the controllers order, the result is None if the controller failed
+    """
+
+    results = []
+    with ProcessPoolExecutor(max_workers=len(controllers)) as executor:
+        futures = [executor.submit(run_on_controller, controller, function, args) for controller in controllers]
+        for controller, future in zip(controllers, futures):
+            try:
+                results.append((controller, future.result()))
+            except Exception as error:  # one controller that fails should not stop the report
+                print('Controller', controller['name'], 'failed:', error, file=sys.stderr)
+                results.append((controller, None))
+    return results
+
+
+def merge_devices(results, get_serial_number):
+    """
+    The function will merge the network devices of all the controllers. A network device known by more than one
+    controller, same serial number, is kept once, from the first controller in the controllers order
+    The network devices with no serial number are all kept
+    :param results: list of (controller, list of network devices), from run_on_controllers()
+    :param get_serial_number: function returning the serial number of a network device
+    :return: list of (controller name, network device), and the number of network devices kept once
+    """
+
+    merged = []
+    seen = set()
+    duplicates = 0
+    for controller, devices in results:
+        for device in devices or []:
+            serial_number = get_serial_number(device)
+            if serial_number:
+                if serial_number in seen:
+                    duplicates += 1
+                    continue
+                seen.add(serial_number)
+            merged.append((controller['name'], device))
+    return merged, duplicates
+
+
+def merge_lookups(results, is_used, addresses, failed_lookup):
+    """
+    The function will merge the lookup results of all the controllers, each controller looked up the same list
+    Each address has one row for each controller using it or that failed to look it up. An address not used has one
+    row, with no controller name, or one row for each controller that failed to look it up. A controller that failed
+    has one row for each address, with the error, so its addresses are not reported as not used
+    :param results: list of (controller, list of lookup result dictionaries), from run_on_controllers()
+    :param is_used: function returning True if the lookup result is used
+    :param addresses: list of addresses looked up by each controller
+    :param failed_lookup: function returning the lookup result of an address for a controller that failed
+    :return: list of (controller name, lookup result), in the list order
+    """
+
+    failed_names = [controller['name'] for controller, lookups in results if lookups is None]
+    results = [(controller['name'], lookups) for controller, lookups in results if lookups is not None]
+    merged = []
+    for index, address in enumerate(addresses):
+        rows = [(name, lookups[index]) for name, lookups in results]
+        used_rows = [(name, row) for name, row in rows if is_used(row)]
+        error_rows = [(name, row) for name, row in rows if row.get('error')]
+        if used_rows:
+            merged.extend(used_rows + error_rows)
+        elif len(set(row.get('error') for name, row in rows)) == 1:
+            merged.append(('', rows[0][1]))
+        else:
+            merged.extend(error_rows)
+        merged.extend((name, failed_lookup(address)) for name in failed_names)
+    return merged
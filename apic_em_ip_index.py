@@ -0,0 +1,168 @@
+# Local index of all the IP addresses known by the controller: network device interfaces, network device
+# management IP addresses and client devices. Used to answer IP address checks without API calls
+
+import time
+import bisect
+import ipaddress
+import threading
+import apic_em_client
+import apic_em_records
+
+# Sources of an IP address in the index
+
+INTERFACE = 'interface'
+DEVICE = 'device'
+HOST = 'host'
+
+# The IPv6 addresses are keyed above all the IPv4 addresses, so the two address families do not overlap
+
+IPV6_OFFSET = 1 << 128
+
+
+class IPSnapshot(object):
+    """
+    Snapshot of the IP addresses in use, keyed by the integer value of the IP address
+    Each IP address has a list of entries, one for each use, as a tuple:
+    (source, device id, interface name, VLAN, host type)
+    The snapshot is built with one paged download of /interface, /host and /network-device, and is not updated
+    until refresh() is called. built_at is the time the snapshot was built
+    The strings repeated in many entries (device ids, interface names, VLANs, host types) are interned, the snapshot
+    keeps one copy of each, see apic_em_records.intern()
+    """
+
+    def __init__(self):
+        self.built_at = None
+        self._lock = threading.Lock()
+        self._index = {}
+        self._addresses = []
+        self._devices = {}
+
+    def refresh(self, prefetch=True):
+        """
+        The function will download the interfaces, hosts and network devices, and build a new snapshot
+        The lookups use the previous snapshot until the new one is complete
+        :param prefetch: download the next page in the background
+        :return: None
+        """
+
+        intern = apic_em_records.intern
+        index = {}
+        devices = {}
+        for device_info in apic_em_client.preload_device_inventory()['devices']:
+            device_id = intern(device_info['id'])
+            devices[device_id] = (device_info.get('hostname'), intern(device_info.get('type')))
+            add_entry(index, device_info.get('managementIpAddress'), (DEVICE, device_id, None, None, None))
+        for interface_info in apic_em_client.iter_interfaces(prefetch=prefetch):
+            add_entry(index, interface_info.get('ipv4Address'),
+                      (INTERFACE, intern(interface_info.get('deviceId')), intern(interface_info.get('portName')),
+                       None, None))
+        for host_info in apic_em_client.iter_hosts(prefetch=prefetch):
+            add_entry(index, host_info.get('hostIp'),
+                      (HOST, intern(host_info.get('connectedNetworkDeviceId')),
+                       intern(host_info.get('connectedInterfaceName')), intern(host_info.get('vlanId')),
+                       intern(host_info.get('hostType'))))
+        addresses = sorted(index)
+        with self._lock:
+            self._index = index
+            self._addresses = addresses
+            self._devices = devices
+            self.built_at = time.time()
+
+    def age(self):
+        """
+        The function will return the number of seconds since the snapshot was built
+        :return: seconds, or None if the snapshot was not built
+        """
+
+        if self.built_at is None:
+            return None
+        return time.time() - self.built_at
+
+    def __len__(self):
+        return len(self._addresses)
+
+    def get_device(self, device_id):
+        """
+        The function will return the hostname and type of the network device with the specified device ID
+        :param device_id: APIC-EM device id
+        :return: network device hostname and type, None for both if the device is not known
+        """
+
+        return self._devices.get(device_id, (None, None))
+
+    def lookup(self, ip_address):
+        """
+        The function will return the uses of the IP address
+        :param ip_address: IP address, as a string
+        :return: list of entries, empty if the IP address is not used, or is not a valid IP address
+        """
+
+        try:
+            address = address_key(ipaddress.ip_address(ip_address))
+        except ValueError:
+            return []
+        return list(self._index.get(address, ()))
+
+    def lookup_network(self, network):
+        """
+        The function will return all the IP addresses in use in the network, for example 10.2.0.0/16
+        :param network: network in CIDR format
+        :return: list of (IP address, list of entries), in IP address order
+        """
+
+        network = ipaddress.ip_network(network, strict=False)
+        with self._lock:
+            index = self._index
+            addresses = self._addresses
+        first = bisect.bisect_left(addresses, address_key(network.network_address))
+        last = bisect.bisect_right(addresses, address_key(network.broadcast_address))
+        network_usage = []
+        for address in addresses[first:last]:
+            network_usage.append((str(address_from_key(address)), list(index[address])))
+        return network_usage
+
+
+def address_key(ip_address):
+    """
+    The function will return the index key of the IP address, the integer value of the address
+    :param ip_address: ipaddress IPv4Address or IPv6Address
+    :return: integer key
+    """
+
+    if ip_address.version == 6:
+        return int(ip_address) + IPV6_OFFSET
+    return int(ip_address)
+
+
+def address_from_key(address):
+    """
+    The function will return the IP address for the index key
+    :param address: integer key
+    :return: ipaddress IPv4Address or IPv6Address
+    """
+
+    if address >= IPV6_OFFSET:
+        return ipaddress.IPv6Address(address - IPV6_OFFSET)
+    return ipaddress.IPv4Address(address)
+
+
+def add_entry(index, ip_address, entry):
+    """
+    The function will add one use of the IP address to the index. Invalid or missing IP addresses are skipped
+    :param index: dictionary integer IP address to list of entries
+    :param ip_address: IP address, as a string
+    :param entry: entry tuple
+    :return: None
+    """
+
+    if not ip_address:
+        return
+    try:
+        address = address_key(ipaddress.ip_address(ip_address))
+    except ValueError:
+        return
+    entries = index.get(address)
+    if entries is None:
+        index[address] = [entry]
+    elif entry not in entries:
+        entries.append(entry)
@@ -0,0 +1,36 @@
+# JSON decoding of the controller responses
+# The responses are decoded with orjson if installed, or with the standard library json module. Set the APIC_EM_JSON
+# environment variable to json to always use the standard library
+
+import os
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if os.environ.get('APIC_EM_JSON') == 'json':
+    orjson = None
+
+
+def loads(data):
+    """
+    The function will decode a JSON document
+    :param data: JSON document, bytes or str
+    :return: decoded data
+    """
+
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def response_json(response):
+    """
+    The function will decode the JSON body of a requests response, it replaces response.json()
+    :param response: requests response
+    :return: decoded data, ValueError is raised if the body is not JSON
+    """
+
+    return loads(response.content)
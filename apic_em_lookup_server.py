@@ -0,0 +1,346 @@
+# developed by Gabi Zapodeanu, Cisco Systems, TSA, GSSE, Cisco Systems
+
+# !/usr/bin/env python3
+
+# Resident lookup service: client IP address, client MAC address and duplicate IP address lookups over a local
+# HTTP/JSON API. The ticket, the connection pool, the network devices inventory and the caches are shared by all
+# the lookups, and stay warm between them. With --snapshot the lookups are answered from the IP and MAC address
+# snapshots, refreshed in the background. Each response has the lookup latency, /stats has the latency percentiles
+# python3 apic_em_lookup_server.py --port 8081 --snapshot --refresh 300
+# curl http://127.0.0.1:8081/ip/10.2.1.22
+# curl http://127.0.0.1:8081/mac/5c:f9:dd:52:07:78
+# curl http://127.0.0.1:8081/duplicate-ip/10.2.1.1
+# curl http://127.0.0.1:8081/stats
+
+
+import sys
+import json
+import time
+import argparse
+import ipaddress
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, unquote
+import apic_em_client
+import apic_em_ip_index
+import apic_em_mac_index
+import apic_em_metrics
+import check_duplicate_IP
+import get_mac_client_info
+
+# The controller info, url, username and password, is declared in the apic_em_client module
+
+# Connections to the controller, shared by the lookups in progress, and seconds between two refreshes of the
+# network devices inventory and of the snapshots
+
+POOL_SIZE = 32
+REFRESH_INTERVAL = 300
+
+LOOKUPS = ('ip', 'mac', 'duplicate-ip')
+
+# Fields of the lookup results, the same for all the lookups, so the clients use one parser. The fields not found
+# by a lookup are null, for example the device_* fields of /ip and /mac. For /mac, mac_address is the normalized MAC
+# address and ip_address is the client IP address
+
+LOOKUP_FIELDS = ['ip_address', 'mac_address', 'client_used', 'client_type', 'client_vlan', 'client_device',
+                 'client_device_type', 'client_interface', 'device_used', 'device_hostname', 'device_type',
+                 'device_interface', 'error']
+
+
+class LookupService(object):
+    """
+    The lookups, with the latency statistics of each lookup type
+    The lookups may be called from multiple threads
+    """
+
+    def __init__(self, use_snapshot=False, refresh_interval=REFRESH_INTERVAL):
+        """
+        :param use_snapshot: answer the lookups from the IP and MAC address snapshots, without API calls
+        :param refresh_interval: seconds between two refreshes, 0 to never refresh
+        """
+
+        self.use_snapshot = use_snapshot
+        self.refresh_interval = refresh_interval
+        self.ip_snapshot = None
+        self.mac_snapshot = None
+        self.started = time.time()
+        self.refreshed = None
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def start(self):
+        """
+        The function will create the ticket, load the network devices inventory and the snapshots, and start the
+        background refresh
+        :return: None
+        """
+
+        apic_em_client.get_service_ticket()
+        if self.use_snapshot:
+            self.ip_snapshot = apic_em_ip_index.IPSnapshot()
+            self.mac_snapshot = apic_em_mac_index.MACSnapshot()
+        self.refresh()
+        if self.refresh_interval:
+            threading.Thread(target=self._refresh_loop, daemon=True).start()
+
+    def refresh(self):
+        """
+        The function will load the network devices inventory, and build the snapshots. The lookups in progress use
+        the previous inventory and snapshots until the new ones are complete
+        :return: None
+        """
+
+        if self.use_snapshot:
+            self.ip_snapshot.refresh()
+            self.mac_snapshot.refresh()
+        else:
+            apic_em_client.preload_device_inventory()
+        self.refreshed = time.time()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception as error:  # one refresh that fails should not stop the refresh thread
+                print('Refresh failed, the previous data is used:', error, file=sys.stderr)
+
+    def lookup(self, lookup_type, value):
+        """
+        The function will run one lookup
+        :param lookup_type: ip, mac or duplicate-ip
+        :param value: IP or MAC address
+        :return: status code, lookup result
+        """
+
+        if lookup_type == 'ip':
+            return self.lookup_ip(value)
+        if lookup_type == 'mac':
+            return self.lookup_mac(value)
+        return self.lookup_duplicate_ip(value)
+
+    def lookup_ip(self, client_ip):
+        """
+        The function will find out if a client device uses the IP address
+        :param client_ip: client IP address
+        :return: status code, dictionary with the LOOKUP_FIELDS
+        """
+
+        try:
+            ipaddress.ip_address(client_ip)
+        except ValueError:
+            return 400, lookup_result(ip_address=client_ip, error='invalid IP address')
+        client_usage = check_duplicate_IP.get_client_ip_usage(client_ip, self.ip_snapshot)
+        if client_usage is None:
+            return 200, lookup_result(ip_address=client_ip, client_used=False)
+        return 200, lookup_result(ip_address=client_ip, client_used=True, client_type=client_usage['host_type'],
+                                  client_vlan=client_usage['vlan'], client_device=client_usage['hostname'],
+                                  client_device_type=client_usage['device_type'],
+                                  client_interface=client_usage['interface'])
+
+    def lookup_mac(self, client_mac):
+        """
+        The function will find out if a client device uses the MAC address
+        :param client_mac: MAC address, in any format
+        :return: status code, dictionary with the LOOKUP_FIELDS
+        """
+
+        mac_usage = get_mac_client_info.check_mac_usage(client_mac, self.mac_snapshot)
+        result = lookup_result(**{field: mac_usage[field] for field in LOOKUP_FIELDS if field in mac_usage})
+        result['mac_address'] = mac_usage['normalized_mac'] or client_mac
+        result['ip_address'] = mac_usage['client_ip']
+        return (400 if mac_usage['error'] else 200), result
+
+    def lookup_duplicate_ip(self, ip_address):
+        """
+        The function will find out if the IP address is used by a client device, or configured on a network device
+        :param ip_address: IP address
+        :return: status code, dictionary with the LOOKUP_FIELDS
+        """
+
+        ip_usage = check_duplicate_IP.check_ip_usage(ip_address, self.ip_snapshot)
+        result = lookup_result(**ip_usage)
+        if ip_usage['error'] == 'invalid IP address':
+            return 400, result
+        return (502 if ip_usage['error'] else 200), result
+
+    def record(self, lookup_type, status, latency):
+        """
+        The function will add one lookup to the statistics
+        :param lookup_type: ip, mac or duplicate-ip
+        :param status: status code returned
+        :param latency: seconds
+        :return: None
+        """
+
+        with self._lock:
+            stats = self._stats.get(lookup_type)
+            if stats is None:
+                stats = {'status': {}, 'latency': apic_em_metrics.LatencyHistogram()}
+                self._stats[lookup_type] = stats
+            stats['status'][str(status)] = stats['status'].get(str(status), 0) + 1
+            stats['latency'].add(latency)
+
+    def get_stats(self):
+        """
+        :return: dictionary with the statistics of each lookup type, latency in milliseconds, and the controller
+        API calls
+        """
+
+        lookups = {}
+        with self._lock:
+            for lookup_type, stats in self._stats.items():
+                latency = stats['latency']
+                lookups[lookup_type] = {'requests': latency.count, 'status': dict(stats['status']),
+                                        'latency_p50_ms': latency.quantile(0.5) * 1000,
+                                        'latency_p95_ms': latency.quantile(0.95) * 1000,
+                                        'latency_p99_ms': latency.quantile(0.99) * 1000,
+                                        'latency_max_ms': latency.maximum * 1000}
+        return {'uptime': time.time() - self.started, 'snapshot': self.use_snapshot,
+                'refreshed_age': time.time() - self.refreshed if self.refreshed else None,
+                'lookups': lookups, 'controller': apic_em_metrics.get_metrics()}
+
+
+def lookup_result(**fields):
+    """
+    The function will create a lookup result, with all the LOOKUP_FIELDS
+    :param fields: the values of the fields found by the lookup
+    :return: dictionary with the LOOKUP_FIELDS, null if not found by the lookup
+    """
+
+    result = dict.fromkeys(LOOKUP_FIELDS)
+    result.update(fields)
+    return result
+
+
+class LookupRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP request handler for the lookups, the connections are kept open (HTTP/1.1)
+    GET /ip/{ip}, GET /mac/{mac}, GET /duplicate-ip/{ip}, GET /stats, GET /health and POST /refresh
+    """
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    service = None
+    verbose = False
+
+    def do_GET(self):
+        parts = urlsplit(self.path).path.strip('/').split('/', 1)
+        if parts == ['stats']:
+            self.send_json(200, self.service.get_stats())
+            return
+        if parts == ['health']:
+            self.send_json(200, {'status': 'ok'})
+            return
+        if len(parts) != 2 or parts[0] not in LOOKUPS:
+            self.send_json(404, {'error': 'Resource not found, use /ip/{ip}, /mac/{mac} or /duplicate-ip/{ip}'})
+            return
+        start = time.monotonic()
+        try:
+            status, result = self.service.lookup(parts[0], unquote(parts[1]))
+        except apic_em_client.CircuitOpenError as error:
+            status, result = 503, {'error': str(error)}
+        except apic_em_client.APICEMError as error:
+            status, result = 502, {'error': str(error)}
+        except Exception as error:  # one lookup that fails should not stop the service
+            status, result = 500, {'error': str(error)}
+        latency = time.monotonic() - start
+        self.service.record(parts[0], status, latency)
+        self.send_json(status, {'response': result, 'latency_ms': round(latency * 1000, 3)},
+                       {'Server-Timing': 'lookup;dur=%.3f' % (latency * 1000)})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if urlsplit(self.path).path.strip('/') != 'refresh':
+            self.send_json(404, {'error': 'Resource not found'})
+            return
+        try:
+            self.service.refresh()
+        except apic_em_client.CircuitOpenError as error:
+            self.send_json(503, {'error': str(error)})
+            return
+        except apic_em_client.APICEMError as error:
+            self.send_json(502, {'error': str(error)})
+            return
+        except Exception as error:  # a refresh that fails should not stop the service
+            self.send_json(500, {'error': str(error)})
+            return
+        self.send_json(200, {'status': 'refreshed'})
+
+    def send_json(self, status, body, headers=None):
+        """
+        The function will send the JSON response
+        :param status: status code
+        :param body: response body
+        :param headers: optional additional headers
+        :return: None
+        """
+
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+def create_server(service, host='127.0.0.1', port=0, verbose=False):
+    """
+    The function will create the lookup server
+    :param service: lookup service, started
+    :param host: IP address to listen on
+    :param port: TCP port, 0 for any free port
+    :param verbose: log each request, with the latency in the Server-Timing header
+    :return: HTTP server, server.server_address has the port
+    """
+
+    handler = type('Handler', (LookupRequestHandler,), {'service': service, 'verbose': verbose})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    """
+    This application will start the lookup service, and answer the lookups until interrupted
+    """
+
+    parser = argparse.ArgumentParser(description='APIC-EM IP and MAC address lookup service')
+    parser.add_argument('--host', default='127.0.0.1', help='IP address to listen on (default %(default)s)')
+    parser.add_argument('--port', type=int, default=8081, help='TCP port (default %(default)s)')
+    parser.add_argument('--pool-size', type=int, default=POOL_SIZE,
+                        help='connections to the controller (default %(default)s)')
+    parser.add_argument('--snapshot', action='store_true',
+                        help='answer the lookups from the IP and MAC address snapshots, without API calls')
+    parser.add_argument('--refresh', type=int, default=REFRESH_INTERVAL,
+                        help='seconds between two refreshes of the inventory and snapshots, 0 for never '
+                             '(default %(default)s)')
+    parser.add_argument('--verbose', action='store_true', help='log each request')
+    args = parser.parse_args()
+
+    if args.pool_size != apic_em_client.POOL_SIZE:
+        apic_em_client.set_pool_size(args.pool_size)
+    service = LookupService(args.snapshot, args.refresh)
+    try:
+        service.start()
+    except apic_em_client.APICEMError as error:
+        print('Something went wrong, try again!', error)
+        raise SystemExit(1)
+    server = create_server(service, args.host, args.port, args.verbose)
+    print('Lookup service on http://%s:%d, GET /ip/{ip}, /mac/{mac}, /duplicate-ip/{ip}, /stats' %
+          (args.host, server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+if __name__ == '__main__':
+    main()
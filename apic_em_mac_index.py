@@ -0,0 +1,138 @@
+# Local index of the client MAC addresses known by the controller, built with one paged download of /host
+# Used to resolve many MAC addresses without one API call for each MAC address
+
+import re
+import time
+import threading
+import apic_em_client
+import apic_em_records
+
+# Accepted MAC address formats: aa:bb:cc:dd:ee:ff, aa-bb-cc-dd-ee-ff, aabb.ccdd.eeff (Cisco) and aabbccddeeff
+
+MAC_FORMATS = [
+    re.compile(r'^[0-9a-f]{2}([:-])[0-9a-f]{2}(\1[0-9a-f]{2}){4}$'),
+    re.compile(r'^[0-9a-f]{4}\.[0-9a-f]{4}\.[0-9a-f]{4}$'),
+    re.compile(r'^[0-9a-f]{12}$'),
+]
+
+
+class MACSnapshot(object):
+    """
+    Snapshot of the client MAC addresses, keyed by the integer value of the MAC address
+    Each MAC address has one entry, a tuple: (host IP address, host type, VLAN, device id, interface name)
+    The snapshot is not updated until refresh() is called. built_at is the time the snapshot was built
+    The strings repeated in many entries (host types, VLANs, device ids, interface names) are interned, the snapshot
+    keeps one copy of each, see apic_em_records.intern()
+    """
+
+    def __init__(self):
+        self.built_at = None
+        self._lock = threading.Lock()
+        self._index = {}
+        self._devices = {}
+
+    def refresh(self, prefetch=True):
+        """
+        The function will download the hosts and the network devices, and build a new snapshot
+        The lookups use the previous snapshot until the new one is complete
+        :param prefetch: download the next page in the background
+        :return: None
+        """
+
+        intern = apic_em_records.intern
+        index = {}
+        devices = {}
+        for device_info in apic_em_client.preload_device_inventory()['devices']:
+            devices[intern(device_info['id'])] = (device_info.get('hostname'), intern(device_info.get('type')))
+        for host_info in apic_em_client.iter_hosts(prefetch=prefetch):
+            address = mac_key(host_info.get('hostMac'))
+            if address is not None:
+                index[address] = (host_info.get('hostIp'), intern(host_info.get('hostType')),
+                                  intern(host_info.get('vlanId')), intern(host_info.get('connectedNetworkDeviceId')),
+                                  intern(host_info.get('connectedInterfaceName')))
+        with self._lock:
+            self._index = index
+            self._devices = devices
+            self.built_at = time.time()
+
+    def __len__(self):
+        return len(self._index)
+
+    def get_device(self, device_id):
+        """
+        The function will return the hostname and type of the network device with the specified device ID
+        :param device_id: APIC-EM device id
+        :return: network device hostname and type, None for both if the device is not known
+        """
+
+        return self._devices.get(device_id, (None, None))
+
+    def lookup(self, mac):
+        """
+        The function will return the client using the MAC address
+        :param mac: MAC address, in any of the accepted formats
+        :return: entry tuple, or None if no client uses the MAC address, or the MAC address is not valid
+        """
+
+        address = mac_key(mac)
+        if address is None:
+            return None
+        return self._index.get(address)
+
+
+def mac_key(mac):
+    """
+    The function will return the integer value of the MAC address
+    :param mac: MAC address, in any of the accepted formats
+    :return: integer value, or None if the MAC address format is not valid
+    """
+
+    if not mac:
+        return None
+    mac = mac.strip().lower()
+    for mac_format in MAC_FORMATS:
+        if mac_format.match(mac):
+            return int(mac.replace(':', '').replace('-', '').replace('.', ''), 16)
+    return None
+
+
+def normalize_mac(mac):
+    """
+    The function will return the MAC address in the controller format, aa:bb:cc:dd:ee:ff
+    :param mac: MAC address, in any of the accepted formats
+    :return: normalized MAC address, or None if the MAC address format is not valid
+    """
+
+    return mac_from_key(mac_key(mac))
+
+
+def mac_from_key(address):
+    """
+    The function will return the MAC address in the controller format, aa:bb:cc:dd:ee:ff
+    :param address: integer value of the MAC address, see mac_key()
+    :return: MAC address, or None if address is None
+    """
+
+    if address is None:
+        return None
+    digits = '%012x' % address
+    return ':'.join(digits[index:index + 2] for index in range(0, 12, 2))
+
+
+def normalize_mac_list(mac_list):
+    """
+    The function will normalize the MAC addresses and remove the duplicates, the same MAC address in different
+    formats is kept once, in the first format found
+    :param mac_list: list of MAC addresses, in any of the accepted formats
+    :return: list of (MAC address as input, normalized MAC address or None if not valid), in the input order
+    """
+
+    normalized_list = []
+    seen = set()
+    for mac in mac_list:
+        normalized = normalize_mac(mac)
+        key = normalized if normalized is not None else mac
+        if key not in seen:
+            seen.add(key)
+            normalized_list.append((mac, normalized))
+    return normalized_list
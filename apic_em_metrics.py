@@ -0,0 +1,269 @@
+# Metrics of the API calls to the controller, for each endpoint template, for example /network-device/{id}:
+# number of calls, errors, bytes received and a latency histogram with the p50, p95 and p99 latency
+# The metrics are printed at exit, and may be saved in JSON or Prometheus text format
+
+import sys
+import json
+import math
+import atexit
+import threading
+
+# Path segments kept in the endpoint templates, all the other segments are ids
+
+KEYWORDS = {'network-device', 'interface', 'host', 'license-info', 'ip-address', 'count', 'ticket'}
+
+# The histogram buckets grow by HISTOGRAM_RATIO, from HISTOGRAM_MIN seconds, the percentiles are within 10%
+
+HISTOGRAM_MIN = 0.0001
+HISTOGRAM_RATIO = 2 ** 0.125
+HISTOGRAM_BUCKETS = 200
+
+# Status codes counted as errors, with the API calls that raised an exception. 404 is the answer to a lookup
+# that did not find anything, it is not an error
+
+ERROR_STATUS_CODES = (429,)
+ERROR_STATUS_MIN = 500
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram(object):
+    """
+    Latency histogram with logarithmic buckets, the memory used does not grow with the number of API calls
+    """
+
+    def __init__(self):
+        self.counts = [0] * (HISTOGRAM_BUCKETS + 1)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, latency):
+        """
+        The function will add one latency to the histogram
+        :param latency: seconds
+        :return: None
+        """
+
+        if latency <= HISTOGRAM_MIN:
+            bucket = 0
+        else:
+            bucket = min(HISTOGRAM_BUCKETS, int(math.log(latency / HISTOGRAM_MIN, HISTOGRAM_RATIO)) + 1)
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += latency
+        self.maximum = max(self.maximum, latency)
+
+    def quantile(self, fraction):
+        """
+        The function will return the latency below which the fraction of the API calls completed
+        :param fraction: for example 0.95 for p95
+        :return: seconds, the upper bound of the bucket, 0 if the histogram is empty
+        """
+
+        if not self.count:
+            return 0.0
+        rank = math.ceil(fraction * self.count)
+        seen = 0
+        for bucket, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(self.maximum, HISTOGRAM_MIN * HISTOGRAM_RATIO ** bucket)
+        return self.maximum
+
+
+class EndpointMetrics(object):
+    """
+    Metrics of the API calls to one endpoint template
+    """
+
+    def __init__(self, method, endpoint):
+        self.method = method
+        self.endpoint = endpoint
+        self.calls = 0
+        self.errors = 0
+        self.bytes_received = 0
+        self.status = {}
+        self.latency = LatencyHistogram()
+
+    def to_dict(self):
+        """
+        :return: dictionary with the metrics, latency in seconds
+        """
+
+        return {'method': self.method, 'endpoint': self.endpoint, 'calls': self.calls, 'errors': self.errors,
+                'bytes_received': self.bytes_received, 'status': dict(self.status),
+                'latency_total': self.latency.total, 'latency_max': self.latency.maximum,
+                'latency_p50': self.latency.quantile(0.5), 'latency_p95': self.latency.quantile(0.95),
+                'latency_p99': self.latency.quantile(0.99)}
+
+
+_endpoints = {}
+_lock = threading.Lock()
+
+
+def endpoint_template(path):
+    """
+    The function will return the endpoint template of an API resource path, the ids and the IP addresses are
+    replaced with placeholders, for example /network-device/{id} or /host/{startIndex}/{recordsToReturn}
+    :param path: API resource path
+    :return: endpoint template
+    """
+
+    segments = path.split('?', 1)[0].strip('/').split('/')
+    if len(segments) >= 3 and segments[-1].isdigit() and segments[-2].isdigit():
+        segments[-2:] = ['{startIndex}', '{recordsToReturn}']
+    for index, segment in enumerate(segments):
+        if segment in KEYWORDS or segment.startswith('{'):
+            continue
+        if index > 0 and segments[index - 1] == 'ip-address':
+            segments[index] = '{ip}'
+        else:
+            segments[index] = '{id}'
+    return '/' + '/'.join(segments)
+
+
+def record(method, path, status, latency, size=0):
+    """
+    The function will record one API call
+    :param method: HTTP method, GET or POST
+    :param path: API resource path
+    :param status: status code, None if the API call raised an exception
+    :param latency: seconds the API call took
+    :param size: bytes received
+    :return: None
+    """
+
+    key = (method, endpoint_template(path))
+    with _lock:
+        metrics = _endpoints.get(key)
+        if metrics is None:
+            metrics = EndpointMetrics(method, key[1])
+            _endpoints[key] = metrics
+        metrics.calls += 1
+        metrics.bytes_received += size
+        status_name = str(status) if status is not None else 'exception'
+        metrics.status[status_name] = metrics.status.get(status_name, 0) + 1
+        if status is None or status in ERROR_STATUS_CODES or status >= ERROR_STATUS_MIN:
+            metrics.errors += 1
+        metrics.latency.add(latency)
+
+
+def reset():
+    """
+    The function will remove all the metrics
+    :return: None
+    """
+
+    with _lock:
+        _endpoints.clear()
+
+
+def get_metrics():
+    """
+    :return: list of dictionaries with the metrics of each endpoint template, most time spent first
+    """
+
+    with _lock:
+        metrics_list = [metrics.to_dict() for metrics in _endpoints.values()]
+    return sorted(metrics_list, key=lambda metrics: metrics['latency_total'], reverse=True)
+
+
+def format_summary():
+    """
+    :return: text table with the metrics of each endpoint template, latency in milliseconds
+    """
+
+    lines = ['%-52s %7s %6s %9s %8s %8s %8s %9s' % ('endpoint', 'calls', 'errors', 'MB', 'p50 ms', 'p95 ms',
+                                                    'p99 ms', 'total s')]
+    for metrics in get_metrics():
+        lines.append('%-52s %7d %6d %9.2f %8.1f %8.1f %8.1f %9.2f' %
+                     (metrics['method'] + ' ' + metrics['endpoint'], metrics['calls'], metrics['errors'],
+                      metrics['bytes_received'] / 1e6, metrics['latency_p50'] * 1000, metrics['latency_p95'] * 1000,
+                      metrics['latency_p99'] * 1000, metrics['latency_total']))
+    return '\n'.join(lines)
+
+
+def format_prometheus():
+    """
+    :return: the metrics in Prometheus text format, the latency as a summary with the p50, p95 and p99 quantiles
+    """
+
+    lines = ['# HELP apic_em_requests_total API calls to the controller',
+             '# TYPE apic_em_requests_total counter']
+    metrics_list = get_metrics()
+    for metrics in metrics_list:
+        lines.append('apic_em_requests_total{%s} %d' % (prometheus_labels(metrics), metrics['calls']))
+    lines += ['# HELP apic_em_request_errors_total API calls that failed, raised an exception or were throttled',
+              '# TYPE apic_em_request_errors_total counter']
+    for metrics in metrics_list:
+        lines.append('apic_em_request_errors_total{%s} %d' % (prometheus_labels(metrics), metrics['errors']))
+    lines += ['# HELP apic_em_response_bytes_total bytes received from the controller',
+              '# TYPE apic_em_response_bytes_total counter']
+    for metrics in metrics_list:
+        lines.append('apic_em_response_bytes_total{%s} %d' % (prometheus_labels(metrics), metrics['bytes_received']))
+    lines += ['# HELP apic_em_request_duration_seconds API call latency',
+              '# TYPE apic_em_request_duration_seconds summary']
+    for metrics in metrics_list:
+        labels = prometheus_labels(metrics)
+        for quantile in QUANTILES:
+            lines.append('apic_em_request_duration_seconds{%s,quantile="%s"} %.6f' %
+                         (labels, quantile, metrics['latency_p%d' % round(quantile * 100)]))
+        lines.append('apic_em_request_duration_seconds_sum{%s} %.6f' % (labels, metrics['latency_total']))
+        lines.append('apic_em_request_duration_seconds_count{%s} %d' % (labels, metrics['calls']))
+    return '\n'.join(lines) + '\n'
+
+
+def prometheus_labels(metrics):
+    """
+    :param metrics: dictionary with the metrics of one endpoint template
+    :return: Prometheus labels, method and endpoint
+    """
+
+    return 'method="%s",endpoint="%s"' % (metrics['method'], metrics['endpoint'].replace('"', '\\"'))
+
+
+def write_json(filename):
+    """
+    The function will save the metrics to a JSON file
+    :param filename: file name
+    :return: None
+    """
+
+    with open(filename, 'w') as metrics_file:
+        json.dump({'endpoints': get_metrics()}, metrics_file, indent=2)
+
+
+def write_prometheus(filename):
+    """
+    The function will save the metrics to a file in Prometheus text format, for example for the node exporter
+    textfile collector
+    :param filename: file name
+    :return: None
+    """
+
+    with open(filename, 'w') as metrics_file:
+        metrics_file.write(format_prometheus())
+
+
+def report_at_exit(summary=True, json_file=None, prometheus_file=None):
+    """
+    The function will print the summary to the standard error, and save the metrics files, when the script exits
+    Nothing is printed or saved if no API call was made
+    :param summary: print the summary
+    :param json_file: optional JSON file name
+    :param prometheus_file: optional Prometheus text file name
+    :return: None
+    """
+
+    def report():
+        if not _endpoints:
+            return
+        if summary:
+            print(format_summary(), file=sys.stderr)
+        if json_file:
+            write_json(json_file)
+        if prometheus_file:
+            write_prometheus(prometheus_file)
+
+    atexit.register(report)
@@ -0,0 +1,771 @@
+# developed by Gabi Zapodeanu, Cisco Systems, TSA, GSSE, Cisco Systems
+
+# !/usr/bin/env python3
+
+# Local APIC-EM stand-in, used to run the scripts offline and at scale
+# The network devices, interfaces, hosts and licenses are generated from their index when requested, so a fleet
+# of 10,000 network devices and 500,000 hosts uses no memory. Latency, jitter, errors and throttling may be injected
+# Start the server, and point the scripts to it:
+# python3 apic_em_mock_server.py --devices 10000 --hosts 500000 --latency 50
+# APIC_EM_URL=http://127.0.0.1:8080/api/v1 python3 get_device_license.py
+
+
+import re
+import json
+import time
+import uuid
+import random
+import bisect
+import argparse
+import itertools
+import ipaddress
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+API_PREFIX = '/api/v1'
+
+# Number of records returned by a collection API call without paging, like the controller default
+
+DEFAULT_LIMIT = 500
+
+# The device families repeat in blocks of 20 network devices: 12 switches, 4 routers and 4 access points
+# Each family has: family, type, platformId, series, role, hostname prefix, software version, interfaces, licenses
+# The interfaces are (port name, class name, IP address slot), the licenses are (name, status)
+
+SWITCH = 0
+ROUTER = 1
+ACCESS_POINT = 2
+
+FAMILIES = [
+    ('Switches and Hubs', 'Cisco Catalyst 3850 48-port Switch', 'WS-C3850-48U', 'Cisco Catalyst 3850 Series Switches',
+     'ACCESS', 'sw', '03.06.06E',
+     [('GigabitEthernet1/0/' + str(port), 'SwitchPort', None) for port in range(1, 25)] + [('Vlan1', 'SVI', 0)],
+     [('ipbase', 'INUSE'), ('lanbase', 'NOT IN USE')]),
+    ('Routers', 'Cisco 4331 Integrated Services Router', 'ISR4331/K9', 'Cisco 4300 Series Integrated Services Routers',
+     'BORDER ROUTER', 'rtr', '16.3.2',
+     [('GigabitEthernet0/0/' + str(port), 'RoutedPort', port) for port in range(4)],
+     [('ipbasek9', 'INUSE'), ('securityk9', 'INUSE'), ('uck9', 'NOT IN USE')]),
+    ('Unified AP', 'Cisco 3700I Unified Access Point', 'AIR-CAP3702I-A-K9', 'Cisco 3700I Series Unified Access Points',
+     'ACCESS', 'ap', '8.2.130.0',
+     [('GigabitEthernet0', 'EthernetPort', None)],
+     []),
+]
+FAMILY_PATTERN = [SWITCH] * 12 + [ROUTER] * 4 + [ACCESS_POINT] * 4
+
+# Address plan: network device management IP addresses, interface IP addresses (4 for each network device)
+# and host IP addresses
+
+MANAGEMENT_NETWORK = int(ipaddress.IPv4Address('10.0.0.0'))
+INTERFACE_NETWORK = int(ipaddress.IPv4Address('172.16.0.0'))
+HOST_NETWORK = int(ipaddress.IPv4Address('100.64.0.0'))
+INTERFACE_SLOTS = 4
+
+# Record ids, the record index is the last 12 hex digits
+
+DEVICE_ID_PREFIX = '00000000-0000-4000-a000-'
+INTERFACE_ID_PREFIX = '00000000-0001-4000-a000-'
+HOST_ID_PREFIX = '00000000-0002-4000-a000-'
+
+HOST_MAC_PREFIX = 0x020000000000  # locally administered MAC addresses
+
+# Network device fields accepted as /network-device query parameters, the values are matched exactly
+# The family level fields are the position in the FAMILIES tuples
+
+DEVICE_FILTERS = ('family', 'type', 'platformId', 'series', 'role', 'softwareVersion', 'reachabilityStatus',
+                  'hostname', 'serialNumber', 'managementIpAddress')
+FAMILY_FIELDS = {'family': 0, 'type': 1, 'platformId': 2, 'series': 3, 'role': 4, 'softwareVersion': 6}
+
+# The controller accepts the MAC addresses as aa:bb:cc:dd:ee:ff only
+
+VALID_MAC = re.compile(r'^[0-9a-f]{2}(:[0-9a-f]{2}){5}$')
+
+
+class SyntheticFleet(object):
+    """
+    Synthetic fleet of network devices, interfaces, hosts and licenses
+    Every record is computed from its index, nothing is saved, and the same fleet size always returns the same records
+    Wired hosts are connected to the switch ports, one host out of 5 is a wireless host connected to an access point
+    """
+
+    def __init__(self, device_count=100, host_count=1000):
+        """
+        :param device_count: number of network devices
+        :param host_count: number of hosts
+        """
+
+        self.device_count = device_count
+        self.host_count = host_count
+        self.started = time.time()
+
+        # number of interfaces before each position of the family pattern
+        self._interface_offsets = [0]
+        for family in FAMILY_PATTERN:
+            self._interface_offsets.append(self._interface_offsets[-1] + len(FAMILIES[family][7]))
+        blocks, rest = divmod(device_count, len(FAMILY_PATTERN))
+        self.interface_count = blocks * self._interface_offsets[-1] + self._interface_offsets[rest]
+        self.switch_count = self._family_count(SWITCH)
+        self.access_point_count = self._family_count(ACCESS_POINT)
+
+    def _family_count(self, family):
+        blocks, rest = divmod(self.device_count, len(FAMILY_PATTERN))
+        return blocks * FAMILY_PATTERN.count(family) + FAMILY_PATTERN[:rest].count(family)
+
+    def _family_device(self, family, number):
+        # index of the network device number 'number' of the family
+        per_block = FAMILY_PATTERN.count(family)
+        block, position = divmod(number, per_block)
+        return block * len(FAMILY_PATTERN) + FAMILY_PATTERN.index(family) + position
+
+    def family(self, device_index):
+        """
+        :param device_index: network device index
+        :return: family number, SWITCH, ROUTER or ACCESS_POINT
+        """
+
+        return FAMILY_PATTERN[device_index % len(FAMILY_PATTERN)]
+
+    def device(self, device_index):
+        """
+        :param device_index: network device index
+        :return: network device info
+        """
+
+        family, device_type, platform, series, role, prefix, version, interfaces, licenses = \
+            FAMILIES[self.family(device_index)]
+        return {
+            'id': DEVICE_ID_PREFIX + '%012x' % device_index,
+            'hostname': '%s-%05d' % (prefix, device_index),
+            'family': family,
+            'type': device_type,
+            'platformId': platform,
+            'series': series,
+            'role': role,
+            'softwareVersion': version,
+            'serialNumber': 'FOC%08d' % device_index,
+            'managementIpAddress': str(ipaddress.IPv4Address(MANAGEMENT_NETWORK + device_index + 1)),
+            'macAddress': mac_address(0x00a000000000 + device_index),
+            'reachabilityStatus': 'Reachable',
+            'collectionStatus': 'Managed',
+            'interfaceCount': str(len(interfaces)),
+            'upTime': '%d days, 0:00:00' % (device_index % 365),
+            'lastUpdated': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(self.started)),
+            'lastUpdateTime': int(self.started * 1000),
+            'location': None,
+            'errorCode': None,
+        }
+
+    def device_indexes(self, filters):
+        """
+        :param filters: dictionary network device field to value
+        :return: generator with the indexes of the network devices matching all the filters, in index order
+        """
+
+        families = set(family for family, family_info in enumerate(FAMILIES)
+                       if all(family_info[FAMILY_FIELDS[name]] == value
+                              for name, value in filters.items() if name in FAMILY_FIELDS))
+        device_filters = [(name, value) for name, value in filters.items() if name not in FAMILY_FIELDS]
+        for device_index in range(self.device_count):
+            if self.family(device_index) not in families:
+                continue
+            if device_filters:
+                device_info = self.device(device_index)
+                if any(device_info.get(name) != value for name, value in device_filters):
+                    continue
+            yield device_index
+
+    def device_index(self, device_id):
+        """
+        :param device_id: network device id
+        :return: network device index, or None if no network device has the id
+        """
+
+        return record_index(device_id, DEVICE_ID_PREFIX, self.device_count)
+
+    def device_index_by_ip(self, ip_address):
+        """
+        :param ip_address: management IP address
+        :return: network device index, or None if no network device has the IP address
+        """
+
+        return address_index(ip_address, MANAGEMENT_NETWORK + 1, self.device_count)
+
+    def interface(self, device_index, port_index):
+        """
+        :param device_index: network device index
+        :param port_index: interface index in the network device
+        :return: interface info
+        """
+
+        port_name, class_name, slot = FAMILIES[self.family(device_index)][7][port_index]
+        interface_index = self._first_interface(device_index) + port_index
+        interface_info = {
+            'id': INTERFACE_ID_PREFIX + '%012x' % interface_index,
+            'deviceId': DEVICE_ID_PREFIX + '%012x' % device_index,
+            'portName': port_name,
+            'className': class_name,
+            'interfaceType': 'Virtual' if class_name == 'SVI' else 'Physical',
+            'macAddress': mac_address(0x00b000000000 + interface_index),
+            'status': 'up',
+            'adminStatus': 'UP',
+            'speed': '1000000',
+            'ipv4Address': None,
+            'ipv4Mask': None,
+            'portMode': None,
+            'nativeVlanId': None,
+            'voiceVlan': None,
+            'vlanId': None,
+        }
+        if slot is not None:
+            interface_info['ipv4Address'] = str(ipaddress.IPv4Address(INTERFACE_NETWORK +
+                                                                      device_index * INTERFACE_SLOTS + slot))
+            interface_info['ipv4Mask'] = '255.255.255.252'
+        if class_name == 'SwitchPort':
+            interface_info['portMode'] = 'access'
+            interface_info['nativeVlanId'] = '10'
+            interface_info['voiceVlan'] = '20'
+            interface_info['vlanId'] = '10'
+        return interface_info
+
+    def _first_interface(self, device_index):
+        block, position = divmod(device_index, len(FAMILY_PATTERN))
+        return block * self._interface_offsets[-1] + self._interface_offsets[position]
+
+    def interfaces(self, device_index):
+        """
+        :param device_index: network device index
+        :return: list with all the interfaces of the network device
+        """
+
+        return [self.interface(device_index, port_index)
+                for port_index in range(len(FAMILIES[self.family(device_index)][7]))]
+
+    def interface_by_number(self, interface_index):
+        """
+        :param interface_index: interface index in the fleet
+        :return: interface info
+        """
+
+        block, offset = divmod(interface_index, self._interface_offsets[-1])
+        position = bisect.bisect_right(self._interface_offsets, offset) - 1
+        return self.interface(block * len(FAMILY_PATTERN) + position, offset - self._interface_offsets[position])
+
+    def interfaces_by_ip(self, ip_address):
+        """
+        :param ip_address: IP address
+        :return: list of the interfaces configured with the IP address
+        """
+
+        address = address_index(ip_address, INTERFACE_NETWORK, self.device_count * INTERFACE_SLOTS)
+        if address is None:
+            return []
+        device_index, slot = divmod(address, INTERFACE_SLOTS)
+        for port_index, port in enumerate(FAMILIES[self.family(device_index)][7]):
+            if port[2] == slot:
+                return [self.interface(device_index, port_index)]
+        return []
+
+    def host(self, host_index):
+        """
+        :param host_index: host index
+        :return: host info
+        """
+
+        host_info = {
+            'id': HOST_ID_PREFIX + '%012x' % host_index,
+            'hostIp': str(ipaddress.IPv4Address(HOST_NETWORK + host_index + 1)),
+            'hostMac': mac_address(HOST_MAC_PREFIX + host_index),
+            'lastUpdated': str(int(self.started * 1000)),
+            'source': '200',
+        }
+        if (host_index % 5 == 4 or not self.switch_count) and self.access_point_count:
+            device_index = self._family_device(ACCESS_POINT, host_index % self.access_point_count)
+            host_info['hostType'] = 'wireless'
+            host_info['vlanId'] = '30'
+            host_info['connectedAPName'] = self.device(device_index)['hostname']
+        elif self.switch_count:
+            switch_number = host_index % self.switch_count
+            device_index = self._family_device(SWITCH, switch_number)
+            port_index = (host_index // self.switch_count) % 24
+            host_info['hostType'] = 'wired'
+            host_info['vlanId'] = '10'
+            host_info['connectedInterfaceId'] = INTERFACE_ID_PREFIX + '%012x' % (self._first_interface(device_index) +
+                                                                                port_index)
+            host_info['connectedInterfaceName'] = FAMILIES[SWITCH][7][port_index][0]
+        else:
+            return host_info
+        host_info['connectedNetworkDeviceId'] = DEVICE_ID_PREFIX + '%012x' % device_index
+        host_info['connectedNetworkDeviceIpAddress'] = str(ipaddress.IPv4Address(MANAGEMENT_NETWORK + device_index + 1))
+        return host_info
+
+    def host_index_by_ip(self, ip_address):
+        """
+        :param ip_address: host IP address
+        :return: host index, or None if no host has the IP address
+        """
+
+        return address_index(ip_address, HOST_NETWORK + 1, self.host_count)
+
+    def host_index_by_mac(self, mac):
+        """
+        :param mac: host MAC address, any separator
+        :return: host index, or None if no host has the MAC address
+        """
+
+        digits = ''.join(character for character in mac.lower() if character in '0123456789abcdef')
+        if len(digits) != 12:
+            return None
+        host_index = int(digits, 16) - HOST_MAC_PREFIX
+        if 0 <= host_index < self.host_count:
+            return host_index
+        return None
+
+    def licenses(self, device_index):
+        """
+        :param device_index: network device index
+        :return: list with the license info of the network device
+        """
+
+        license_list = []
+        for name, status in FAMILIES[self.family(device_index)][8]:
+            license_list.append({'name': name, 'status': status, 'type': 'PERMANENT', 'priority': '1',
+                                 'deviceId': DEVICE_ID_PREFIX + '%012x' % device_index, 'evalPeriodLeft': '',
+                                 'maxUsageCount': 0, 'usageCount': 1 if status == 'INUSE' else 0})
+        return license_list
+
+
+class MockController(object):
+    """
+    The API resources of the synthetic fleet, with latency, errors and throttling injected
+    Counts the API calls and the bytes sent, returned by /_mock/stats
+    """
+
+    def __init__(self, fleet, latency=0.0, jitter=0.0, error_rate=0.0, max_concurrent=0, username='devnetuser',
+                 password='Cisco123!', idle_timeout=1800, session_timeout=21600):
+        """
+        :param fleet: synthetic fleet
+        :param latency: seconds added to each API call
+        :param jitter: each API call latency varies randomly by up to +/- jitter seconds
+        :param error_rate: fraction of the API calls that return status code 500
+        :param max_concurrent: API calls in progress above this number return status code 429, 0 for no limit
+        :param username: username accepted by /ticket
+        :param password: password accepted by /ticket
+        :param idle_timeout: ticket idle timeout returned by /ticket
+        :param session_timeout: ticket session timeout returned by /ticket
+        """
+
+        self.fleet = fleet
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.max_concurrent = max_concurrent
+        self.username = username
+        self.password = password
+        self.idle_timeout = idle_timeout
+        self.session_timeout = session_timeout
+        self._tickets = set()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.stats = {'requests': 0, 'bytes_sent': 0, 'status': {}}
+
+    def begin(self):
+        """
+        The function will count one API call in progress
+        :return: False if the API call should be throttled
+        """
+
+        with self._lock:
+            self.stats['requests'] += 1
+            if self.max_concurrent and self._in_flight >= self.max_concurrent:
+                return False
+            self._in_flight += 1
+            return True
+
+    def end(self, status, size):
+        """
+        The function will count the end of an API call
+        :param status: status code returned
+        :param size: number of bytes sent
+        :return: None
+        """
+
+        with self._lock:
+            self._in_flight -= 1
+            self.count(status, size)
+
+    def count(self, status, size):
+        """
+        The function will add the status code and the bytes sent to the statistics, the caller holds the lock
+        :param status: status code returned
+        :param size: number of bytes sent
+        :return: None
+        """
+
+        self.stats['bytes_sent'] += size
+        self.stats['status'][str(status)] = self.stats['status'].get(str(status), 0) + 1
+
+    def reset_stats(self):
+        """
+        The function will reset the statistics
+        :return: None
+        """
+
+        with self._lock:
+            self.stats = {'requests': 0, 'bytes_sent': 0, 'status': {}}
+
+    def delay(self):
+        """
+        The function will wait the injected latency
+        :return: None
+        """
+
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def create_ticket(self, body):
+        """
+        API call to /ticket
+        :param body: request body, JSON with username and password
+        :return: status code, response body
+        """
+
+        try:
+            credentials = json.loads(body or b'{}')
+        except ValueError:
+            credentials = {}
+        if credentials.get('username') != self.username or credentials.get('password') != self.password:
+            return 401, error_body('Authentication failed', 'Bad credentials')
+        ticket = 'ST-' + uuid.uuid4().hex + '-cas'
+        with self._lock:
+            self._tickets.add(ticket)
+        return 200, {'response': {'serviceTicket': ticket, 'idleTimeout': self.idle_timeout,
+                                  'sessionTimeout': self.session_timeout}, 'version': '1.0'}
+
+    def ticket_is_valid(self, ticket):
+        """
+        :param ticket: X-Auth-Token header value
+        :return: True if the ticket was created by /ticket
+        """
+
+        return ticket in self._tickets
+
+    def get(self, path, query):
+        """
+        The function will answer a GET API call
+        :param path: API resource path, without the /api/v1 prefix
+        :param query: dictionary with the query parameters, each value is a list
+        :return: status code, response body
+        """
+
+        parts = path.strip('/').split('/')
+        fleet = self.fleet
+        resource = parts[0]
+        if resource == 'network-device':
+            filters = {name: query[name][0] for name in DEVICE_FILTERS if name in query}
+            if filters:
+                return self._get_devices(parts[1:], filters)
+            return self._collection(parts[1:], fleet.device_count, fleet.device, self._get_device)
+        if resource == 'interface':
+            if len(parts) == 3 and parts[1] == 'ip-address':
+                interfaces = fleet.interfaces_by_ip(parts[2])
+                if not interfaces:
+                    return not_found('No interface found with IP address ' + parts[2])
+                return ok(interfaces)
+            if len(parts) == 3 and parts[1] == 'network-device':
+                device_index = fleet.device_index(parts[2])
+                if device_index is None:
+                    return not_found('No network device found with id ' + parts[2])
+                return ok(fleet.interfaces(device_index))
+            return self._collection(parts[1:], fleet.interface_count, fleet.interface_by_number, None)
+        if resource == 'license-info' and len(parts) == 3 and parts[1] == 'network-device':
+            device_index = fleet.device_index(parts[2])
+            if device_index is None:
+                return not_found('No network device found with id ' + parts[2])
+            return ok(fleet.licenses(device_index))
+        if resource == 'host':
+            return self._get_hosts(parts[1:], query)
+        return not_found('Resource not found: ' + path)
+
+    def _collection(self, parts, count, get_record, get_item):
+        # /{collection}, /{collection}/count, /{collection}/{startIndex}/{recordsToReturn}, /{collection}/{id}...
+        if not parts:
+            return ok([get_record(index) for index in range(min(count, DEFAULT_LIMIT))])
+        if parts == ['count']:
+            return ok(count)
+        if len(parts) == 2 and parts[0].isdigit() and parts[1].isdigit():
+            start = max(int(parts[0]), 1) - 1
+            return ok([get_record(index) for index in range(start, min(count, start + int(parts[1])))])
+        if get_item is not None:
+            return get_item(parts)
+        return not_found('Resource not found')
+
+    def _get_devices(self, parts, filters):
+        # /network-device?family=... or /network-device/{startIndex}/{recordsToReturn}?family=...
+        start, limit = 0, DEFAULT_LIMIT
+        if len(parts) == 2 and parts[0].isdigit() and parts[1].isdigit():
+            start, limit = max(int(parts[0]), 1) - 1, int(parts[1])
+        elif parts:
+            return 400, error_body('Bad request', 'Filters are accepted only by the /network-device collection')
+        device_indexes = itertools.islice(self.fleet.device_indexes(filters), start, start + limit)
+        return ok([self.fleet.device(device_index) for device_index in device_indexes])
+
+    def _get_device(self, parts):
+        fleet = self.fleet
+        if len(parts) == 2 and parts[0] == 'ip-address':
+            device_index = fleet.device_index_by_ip(parts[1])
+        elif len(parts) == 1:
+            device_index = fleet.device_index(parts[0])
+        else:
+            return not_found('Resource not found')
+        if device_index is None:
+            return not_found('No network device found with ' + parts[-1])
+        return ok(fleet.device(device_index))
+
+    def _get_hosts(self, parts, query):
+        fleet = self.fleet
+        start, limit = 0, DEFAULT_LIMIT
+        if parts == ['count']:
+            return ok(fleet.host_count)
+        if len(parts) == 2 and parts[0].isdigit() and parts[1].isdigit():
+            start, limit = max(int(parts[0]), 1) - 1, int(parts[1])
+        elif parts:
+            return not_found('Resource not found')
+        host_ips = query.get('hostIp')
+        host_macs = query.get('hostMac')
+        if host_ips is None and host_macs is None:
+            return ok([fleet.host(index) for index in range(start, min(fleet.host_count, start + limit))])
+        host_indexes = None
+        if host_ips is not None:
+            host_indexes = set(fleet.host_index_by_ip(host_ip) for host_ip in host_ips)
+        if host_macs is not None:
+            for host_mac in host_macs:
+                if not VALID_MAC.match(host_mac.lower()):
+                    return 400, error_body('Bad request', 'Invalid MAC address ' + host_mac)
+            mac_indexes = set(fleet.host_index_by_mac(host_mac) for host_mac in host_macs)
+            host_indexes = mac_indexes if host_indexes is None else host_indexes & mac_indexes
+        host_indexes.discard(None)
+        return ok([fleet.host(index) for index in sorted(host_indexes)][start:start + limit])
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP request handler for the mock controller, the connections are kept open (HTTP/1.1)
+    """
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # the headers and the body are written separately, do not wait for the ACK
+    controller = None
+    verbose = False
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == '/_mock/stats':
+            self.send_json(200, self.controller.stats, count=False)
+            return
+        if not url.path.startswith(API_PREFIX + '/'):
+            self.send_json(*not_found('Resource not found: ' + url.path))
+            return
+        self.answer(lambda: self.controller.get(url.path[len(API_PREFIX):], parse_qs(url.query)), check_ticket=True)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        url = urlsplit(self.path)
+        if url.path == '/_mock/reset':
+            self.controller.reset_stats()
+            self.send_json(200, {'response': 'reset'}, count=False)
+            return
+        if url.path != API_PREFIX + '/ticket':
+            self.send_json(*not_found('Resource not found: ' + url.path))
+            return
+        self.answer(lambda: self.controller.create_ticket(body), check_ticket=False)
+
+    def answer(self, handler, check_ticket):
+        """
+        The function will answer the API call, with the injected latency, errors and throttling
+        :param handler: function returning the status code and the response body
+        :param check_ticket: True if the API call requires a valid ticket
+        :return: None
+        """
+
+        controller = self.controller
+        if not controller.begin():
+            self.send_json(429, error_body('Too many requests', 'Request rate exceeded'), {'Retry-After': '1'})
+            return
+        status, body = 500, error_body('Internal error', 'Mock server error')
+        try:
+            controller.delay()
+            if controller.error_rate and random.random() < controller.error_rate:
+                status, body = 500, error_body('Internal error', 'Injected error')
+            elif check_ticket and not controller.ticket_is_valid(self.headers.get('X-Auth-Token')):
+                status, body = 401, error_body('Unauthorized', 'Invalid or missing ticket')
+            else:
+                status, body = handler()
+        finally:
+            size = self.send_json(status, body, count=False)
+            controller.end(status, size)
+
+    def send_json(self, status, body, headers=None, count=True):
+        """
+        The function will send the JSON response
+        :param status: status code
+        :param body: response body
+        :param headers: optional additional headers
+        :param count: add the response to the statistics
+        :return: number of bytes sent
+        """
+
+        data = json.dumps(body, separators=(',', ':')).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        if count:
+            with self.controller._lock:
+                self.controller.count(status, len(data))
+        return len(data)
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+def ok(response):
+    """
+    :param response: API response value
+    :return: status code 200, response body
+    """
+
+    return 200, {'response': response, 'version': '1.0'}
+
+
+def not_found(message):
+    """
+    :param message: error detail
+    :return: status code 404, response body
+    """
+
+    return 404, error_body('Not found', message)
+
+
+def error_body(error_code, message):
+    """
+    :param error_code: error code
+    :param message: error detail
+    :return: response body with the error, like the controller
+    """
+
+    return {'response': {'errorCode': error_code, 'message': message, 'detail': message}, 'version': '1.0'}
+
+
+def mac_address(value):
+    """
+    :param value: MAC address as an integer
+    :return: MAC address, as xx:xx:xx:xx:xx:xx
+    """
+
+    digits = '%012x' % value
+    return ':'.join(digits[index:index + 2] for index in range(0, 12, 2))
+
+
+def record_index(record_id, prefix, count):
+    """
+    :param record_id: record id
+    :param prefix: id prefix for the record kind
+    :param count: number of records
+    :return: record index, or None if the id is not valid
+    """
+
+    if not record_id.startswith(prefix) or len(record_id) != len(prefix) + 12:
+        return None
+    try:
+        index = int(record_id[len(prefix):], 16)
+    except ValueError:
+        return None
+    return index if index < count else None
+
+
+def address_index(ip_address, first, count):
+    """
+    :param ip_address: IP address
+    :param first: integer value of the first IP address
+    :param count: number of IP addresses
+    :return: IP address index, or None if the IP address is not in the range
+    """
+
+    try:
+        index = int(ipaddress.IPv4Address(ip_address)) - first
+    except ValueError:
+        return None
+    return index if 0 <= index < count else None
+
+
+def create_server(controller, host='127.0.0.1', port=0, verbose=False):
+    """
+    The function will create the mock server
+    :param controller: mock controller
+    :param host: IP address to listen on
+    :param port: TCP port, 0 for any free port
+    :param verbose: log each API call
+    :return: HTTP server, server.server_address has the port
+    """
+
+    handler = type('Handler', (MockRequestHandler,), {'controller': controller, 'verbose': verbose})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_server(controller, host='127.0.0.1', port=0, verbose=False):
+    """
+    The function will start the mock server in a background thread
+    :param controller: mock controller
+    :param host: IP address to listen on
+    :param port: TCP port, 0 for any free port
+    :param verbose: log each API call
+    :return: HTTP server, server.server_address has the port; stop with server.shutdown()
+    """
+
+    server = create_server(controller, host, port, verbose)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    """
+    This application will start a local APIC-EM stand-in, with a synthetic fleet of network devices and hosts
+    Point the scripts to the server with the APIC_EM_URL environment variable, printed at start
+    """
+
+    parser = argparse.ArgumentParser(description='Local APIC-EM mock server')
+    parser.add_argument('--host', default='127.0.0.1', help='IP address to listen on (default %(default)s)')
+    parser.add_argument('--port', type=int, default=8080, help='TCP port (default %(default)s)')
+    parser.add_argument('--devices', type=int, default=100, help='number of network devices (default %(default)s)')
+    parser.add_argument('--hosts', type=int, default=1000, help='number of hosts (default %(default)s)')
+    parser.add_argument('--latency', type=float, default=0, help='milliseconds added to each API call')
+    parser.add_argument('--jitter', type=float, default=0, help='random latency variation, +/- milliseconds')
+    parser.add_argument('--error-rate', type=float, default=0, help='fraction of API calls returning status 500')
+    parser.add_argument('--max-concurrent', type=int, default=0,
+                        help='API calls in progress above this number return status 429 (default no limit)')
+    parser.add_argument('--verbose', action='store_true', help='log each API call')
+    args = parser.parse_args()
+
+    fleet = SyntheticFleet(args.devices, args.hosts)
+    controller = MockController(fleet, args.latency / 1000.0, args.jitter / 1000.0, args.error_rate,
+                                args.max_concurrent)
+    server = create_server(controller, args.host, args.port, args.verbose)
+    print('Mock APIC-EM with', fleet.device_count, 'network devices,', fleet.interface_count, 'interfaces,',
+          fleet.host_count, 'hosts')
+    print('APIC_EM_URL=http://%s:%d%s' % (args.host, server.server_address[1], API_PREFIX))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+if __name__ == '__main__':
+    main()
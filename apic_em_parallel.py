@@ -0,0 +1,151 @@
+# Helpers to run the per-device API calls in parallel, used by the inventory scripts
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+import apic_em_client
+
+
+def ordered_map(function, items, workers=1):
+    """
+    The function will call function(item) for each item, using a pool of worker threads
+    The results are returned in the same order as the items, as soon as they are available
+    At most 2 x workers calls are submitted ahead of the result being consumed, so the memory used
+    does not grow with the number of items
+    With one worker the calls are made one at a time, in the calling thread
+    :param function: function to call for each item
+    :param items: iterable with the items
+    :param workers: number of worker threads
+    :return: generator with the results, in the items order
+    """
+
+    if workers <= 1:
+        for item in items:
+            yield function(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(function, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+class AdaptiveLimiter(object):
+    """
+    Limit for the number of API calls in progress at the same time, adapted to the controller load (AIMD)
+    While the recent average latency stays close to the lowest average latency seen, the limit grows by one for each
+    limit API calls (additive increase). When the controller throttles (429 or 503 status code), or the recent
+    average latency grows above latency_tolerance x the lowest one, the limit is multiplied by decrease_factor
+    (multiplicative decrease), at most once for each latency interval. The other failures are not throttling
+    """
+
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=64, latency_tolerance=2.0, decrease_factor=0.5):
+        """
+        :param initial_limit: the limit when starting
+        :param min_limit: the lowest limit
+        :param max_limit: the highest limit, the number of worker threads
+        :param latency_tolerance: latency increase, compared with the lowest latency, considered as overload
+        :param decrease_factor: the limit is multiplied with this value on overload
+        """
+
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self.calls = 0
+        self.throttled = 0
+        self.decreases = 0
+        self.peak_limit = initial_limit
+        self._limit = float(initial_limit)
+        self._baseline = None
+        self._recent = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        """
+        :return: the current limit, as an integer
+        """
+
+        return max(self.min_limit, int(self._limit))
+
+    def acquire(self):
+        """
+        The function will wait until one more API call may be sent
+        :return: None
+        """
+
+        with self._condition:
+            while self.in_flight >= self.limit:
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency, throttled=False):
+        """
+        The function will update the limit with the result of one API call
+        :param latency: seconds the API call took
+        :param throttled: True if the controller throttled the call, status code 429 or 503
+        :return: None
+        """
+
+        with self._condition:
+            self.in_flight -= 1
+            self.calls += 1
+            # the recent latency is averaged, so the latency jitter of single calls is not seen as overload
+            if self._recent is None:
+                self._recent = latency
+            else:
+                self._recent += (latency - self._recent) * 0.2
+            if self._baseline is None or self._recent < self._baseline:
+                self._baseline = self._recent
+            else:
+                self._baseline += (self._recent - self._baseline) * 0.01  # the lowest latency may grow, slowly
+            overloaded = throttled or self._recent > self._baseline * self.latency_tolerance
+            if throttled:
+                self.throttled += 1
+            now = time.monotonic()
+            if overloaded:
+                if now - self._last_decrease > latency:
+                    self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+                    self._last_decrease = now
+                    self.decreases += 1
+            else:
+                self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+                self.peak_limit = max(self.peak_limit, self.limit)
+            self._condition.notify_all()
+
+    def report(self):
+        """
+        :return: text with the current limit and the limiter counters
+        """
+
+        return ('adaptive limit: %d (peak %d, range %d-%d), %d calls, %d throttled, %d decreases' %
+                (self.limit, self.peak_limit, self.min_limit, self.max_limit, self.calls, self.throttled,
+                 self.decreases))
+
+
+def adaptive_map(function, items, limiter):
+    """
+    The function will call function(item) for each item, in parallel, with the number of API calls in progress
+    governed by the adaptive limiter instead of a fixed number of workers
+    The results are returned in the same order as the items
+    :param function: function to call for each item
+    :param items: iterable with the items
+    :param limiter: adaptive limiter
+    :return: generator with the results, in the items order
+    """
+
+    apic_em_client.ensure_pool_size(limiter.max_limit)
+    apic_em_client.set_limiter(limiter)
+    try:
+        for result in ordered_map(function, items, limiter.max_limit):
+            yield result
+    finally:
+        apic_em_client.set_limiter(None)
@@ -0,0 +1,154 @@
+# Compact records for the controller data: hosts and licenses
+# The records keep only the fields used by the scripts, in __slots__, with the IP and MAC addresses as integers.
+# The strings repeated in many records (device ids, host types, interface names, license names) are interned, so
+# the switchport clients index of switchport_inventory.py keeps one copy of each. The host records use about 7 times
+# less memory than the JSON dictionaries
+# The network devices and interfaces have no record class: the IP and MAC address snapshots keep them as tuples with
+# the interned strings, see intern(), and the reports read a few fields of each JSON dictionary once
+
+import sys
+import ipaddress
+import apic_em_ip_index
+import apic_em_mac_index
+
+
+class Record(object):
+    """
+    Base class of the records, the fields are the __slots__ of the record class
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def fields(cls):
+        """
+        :return: tuple with the record field names, the fields of the base classes first
+        """
+
+        names = ()
+        for record_class in reversed(cls.__mro__):
+            names += tuple(record_class.__dict__.get('__slots__', ()))
+        return names
+
+    def to_dict(self):
+        """
+        :return: dictionary with the record fields, the IP and MAC addresses as integers
+        """
+
+        return {field: getattr(self, field) for field in self.fields()}
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__,
+                           ', '.join('%s=%r' % (field, getattr(self, field)) for field in self.fields()))
+
+
+class Host(Record):
+    """
+    Client device, from /host
+    """
+
+    __slots__ = ('ip', 'mac', 'host_type', 'vlan_id', 'device_id', 'interface_name')
+
+    def __init__(self, ip, mac, host_type, vlan_id, device_id, interface_name):
+        self.ip = ip
+        self.mac = mac
+        self.host_type = host_type
+        self.vlan_id = vlan_id
+        self.device_id = device_id
+        self.interface_name = interface_name
+
+    @property
+    def ip_address(self):
+        return ip_from_key(self.ip)
+
+    @property
+    def mac_address(self):
+        return apic_em_mac_index.mac_from_key(self.mac)
+
+
+class License(Record):
+    """
+    License of a network device, from /license-info/network-device/{id}
+    """
+
+    __slots__ = ('name', 'status')
+
+    def __init__(self, name, status):
+        self.name = name
+        self.status = status
+
+
+def intern(value):
+    """
+    The function will return the interned string, so all the records share one copy of the string
+    :param value: string, or None
+    :return: interned string, or the value if it is not a string
+    """
+
+    if type(value) is str:
+        return sys.intern(value)
+    return value
+
+
+def ip_key(ip_address):
+    """
+    The function will return the integer value of the IP address, the same key as the IP address snapshot
+    :param ip_address: IP address, as a string
+    :return: integer value, or None if the IP address is missing or not valid
+    """
+
+    if not ip_address:
+        return None
+    try:
+        return apic_em_ip_index.address_key(ipaddress.ip_address(ip_address))
+    except ValueError:
+        return None
+
+
+def ip_from_key(address):
+    """
+    :param address: integer value of the IP address, see ip_key()
+    :return: IP address as a string, or None
+    """
+
+    if address is None:
+        return None
+    return str(apic_em_ip_index.address_from_key(address))
+
+
+def parse_host(host_info):
+    """
+    The function will build the record of a client device
+    :param host_info: host info, from /host
+    :return: Host
+    """
+
+    get = host_info.get
+    return Host(ip_key(get('hostIp')), apic_em_mac_index.mac_key(get('hostMac')), intern(get('hostType')),
+                intern(get('vlanId')), intern(get('connectedNetworkDeviceId')), intern(get('connectedInterfaceName')))
+
+
+def parse_licenses(license_info_list):
+    """
+    The function will build the records of the licenses of a network device. The items that are not license info,
+    returned for example for some Access Points, are skipped
+    :param license_info_list: license info list, from /license-info/network-device/{id}
+    :return: list of License
+    """
+
+    return [License(intern(license_info.get('name')), intern(license_info.get('status')))
+            for license_info in license_info_list if type(license_info) is dict]
+
+
+def active_license_names(licenses):
+    """
+    The function will return the names of the active licenses, status INUSE, each name once, in the controller order
+    :param licenses: list of License
+    :return: list of license names
+    """
+
+    names = []
+    for device_license in licenses:
+        if device_license.status == 'INUSE' and device_license.name not in names:
+            names.append(device_license.name)
+    return names
@@ -0,0 +1,125 @@
+# CSV and JSON Lines report writers used by the scripts
+
+import csv
+import json
+import sys
+
+
+class StreamingCSVWriter(object):
+    """
+    CSV writer that saves the rows to disk as soon as they are written
+    The rows of each device are flushed to the file together, so an interrupted run keeps all the devices
+    collected until then, and the memory used does not grow with the number of devices
+    """
+
+    def __init__(self, filename):
+        """
+        :param filename: the CSV file name, '-' to write to the standard output
+        """
+
+        self.filename = filename
+        self.rows = 0
+        self._file = open_output(filename)
+        self._writer = csv.writer(self._file)
+
+    def write_row(self, row):
+        """
+        The function will write one row and flush it to the file
+        :param row: list with the row values
+        :return: None
+        """
+
+        self._writer.writerow(row)
+        self._file.flush()
+        self.rows += 1
+
+    def write_rows(self, rows):
+        """
+        The function will write the rows of one device and flush them to the file
+        :param rows: list of rows
+        :return: None
+        """
+
+        for row in rows:
+            self._writer.writerow(row)
+        self._file.flush()
+        self.rows += len(rows)
+
+    def close(self):
+        """
+        The function will close the file
+        :return: None
+        """
+
+        close_output(self._file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class StreamingJSONLinesWriter(object):
+    """
+    JSON Lines writer, one JSON object for each row, saved to disk as soon as it is written
+    """
+
+    def __init__(self, filename):
+        """
+        :param filename: the JSON Lines file name, '-' to write to the standard output
+        """
+
+        self.filename = filename
+        self.rows = 0
+        self._file = open_output(filename)
+
+    def write_row(self, row):
+        """
+        The function will write one row and flush it to the file
+        :param row: dictionary with the row values
+        :return: None
+        """
+
+        self._file.write(json.dumps(row) + '\n')
+        self._file.flush()
+        self.rows += 1
+
+    def close(self):
+        """
+        The function will close the file
+        :return: None
+        """
+
+        close_output(self._file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_output(filename):
+    """
+    The function will open the file to write to
+    :param filename: file name, '-' for the standard output
+    :return: file object
+    """
+
+    if filename == '-':
+        return sys.stdout
+    return open(filename, 'w', newline='')
+
+
+def close_output(output_file):
+    """
+    The function will close the file, the standard output is left open
+    :param output_file: file object
+    :return: None
+    """
+
+    if output_file is sys.stdout:
+        output_file.flush()
+    else:
+        output_file.close()
@@ -0,0 +1,125 @@
+# Retry delays and circuit breakers for the API calls, so a failed or slow controller endpoint
+# does not stall the scripts
+
+import time
+import random
+import threading
+
+# Circuit breaker states
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class CircuitBreaker(object):
+    """
+    Circuit breaker for one controller endpoint family, for example /license-info
+    After failure_threshold consecutive failures the breaker opens, and the API calls to the endpoint fail fast,
+    without waiting for the controller. After reset_timeout seconds one trial API call is allowed (half-open):
+    if it succeeds the breaker closes, if it fails the breaker opens again
+    The breaker may be used from multiple threads
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        """
+        :param name: endpoint family, used in the messages
+        :param failure_threshold: number of consecutive failures that open the breaker
+        :param reset_timeout: seconds the breaker stays open before a trial API call is allowed
+        """
+
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._trial_in_progress = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        The function will find out if an API call to the endpoint may be sent
+        :return: True if the API call may be sent, False if it should fail fast
+        """
+
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._trial_in_progress = False
+            if self.state == HALF_OPEN and not self._trial_in_progress:
+                self._trial_in_progress = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        """
+        The function will close the breaker after a successful API call
+        :return: None
+        """
+
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_in_progress = False
+
+    def record_failure(self):
+        """
+        The function will count a failed API call, and open the breaker if needed
+        :return: None
+        """
+
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_progress = False
+
+    def release_trial(self):
+        """
+        The function will allow a new trial API call, after an API call that did not show if the endpoint works,
+        for example throttled by the controller (429). The breaker state does not change
+        :return: None
+        """
+
+        with self._lock:
+            self._trial_in_progress = False
+
+    def retry_after(self):
+        """
+        :return: seconds until a trial API call is allowed, 0 if the breaker is not open
+        """
+
+        if self.state != OPEN:
+            return 0
+        return max(0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+
+def backoff_delay(attempt, base=0.5, cap=10.0):
+    """
+    The function will return the delay before sending an API call again, exponential backoff with full jitter:
+    a random value between 0 and min(cap, base x 2 ** attempt), so the retries of parallel API calls do not
+    reach the controller at the same time
+    :param attempt: number of the failed attempt, starting with 0
+    :param base: delay after the first failed attempt, in seconds
+    :param cap: maximum delay, in seconds
+    :return: delay in seconds
+    """
+
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def endpoint_family(path):
+    """
+    The function will return the endpoint family of an API resource path, the first path segment
+    For example /license-info/network-device/{id} is in the /license-info family
+    :param path: API resource path
+    :return: endpoint family
+    """
+
+    return '/' + path.lstrip('/').split('/', 1)[0].split('?', 1)[0]
@@ -0,0 +1,316 @@
+# SQLite store for the controller inventory: network devices, interfaces, hosts and licenses
+# The store is filled by the scripts when they call the controller, and read by all the scripts,
+# so repeated reports and lookups are answered from the local disk
+
+import json
+import time
+import sqlite3
+import threading
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS devices (
+    id TEXT PRIMARY KEY,
+    management_ip TEXT,
+    hostname TEXT,
+    family TEXT,
+    serial_number TEXT,
+    data TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS devices_management_ip ON devices (management_ip);
+CREATE INDEX IF NOT EXISTS devices_family ON devices (family);
+
+CREATE TABLE IF NOT EXISTS interfaces (
+    id TEXT PRIMARY KEY,
+    device_id TEXT,
+    port_name TEXT,
+    ipv4_address TEXT,
+    data TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS interfaces_device_port ON interfaces (device_id, port_name);
+CREATE INDEX IF NOT EXISTS interfaces_ipv4_address ON interfaces (ipv4_address);
+
+CREATE TABLE IF NOT EXISTS hosts (
+    id TEXT PRIMARY KEY,
+    host_ip TEXT,
+    host_mac TEXT,
+    device_id TEXT,
+    port_name TEXT,
+    data TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS hosts_host_ip ON hosts (host_ip);
+CREATE INDEX IF NOT EXISTS hosts_host_mac ON hosts (host_mac);
+CREATE INDEX IF NOT EXISTS hosts_device_port ON hosts (device_id, port_name);
+
+CREATE TABLE IF NOT EXISTS licenses (
+    device_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS license_state (
+    device_id TEXT PRIMARY KEY,
+    marker TEXT NOT NULL,
+    boot_time REAL,
+    data TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS fetches (
+    resource TEXT PRIMARY KEY,
+    updated REAL NOT NULL
+);
+'''
+
+
+class SnapshotStore(object):
+    """
+    SQLite store with the records downloaded from the controller, saved as JSON with the indexed fields
+    Only the records saved in the last max_age seconds are returned
+    The fetches table has the time each API collection was last downloaded, for example /network-device for the
+    complete network devices list, or /interface/network-device/{id} for all the interfaces of a device.
+    If a collection was downloaded in the last max_age seconds, a record missing from the store means 'not found'
+    The store may be used from multiple threads
+    """
+
+    def __init__(self, path, max_age=3600):
+        """
+        :param path: the SQLite database file name
+        :param max_age: number of seconds the saved records are valid
+        """
+
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.executescript(SCHEMA)
+        self._connection.commit()
+
+    def close(self):
+        """
+        The function will close the database
+        :return: None
+        """
+
+        with self._lock:
+            self._connection.close()
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def _query_data(self, table, where='', parameters=()):
+        sql = 'SELECT data FROM ' + table + ' WHERE updated > ?' + where + ' ORDER BY rowid'
+        return [json.loads(row[0]) for row in self._query(sql, (time.time() - self.max_age,) + tuple(parameters))]
+
+    def _iter_data(self, table, batch_size=1000):
+        oldest = time.time() - self.max_age
+        last_rowid = 0
+        while True:
+            rows = self._query('SELECT rowid, data FROM ' + table + ' WHERE rowid > ? AND updated > ? ORDER BY rowid '
+                               'LIMIT ?', (last_rowid, oldest, batch_size))
+            for row in rows:
+                yield json.loads(row[1])
+            if len(rows) < batch_size:
+                return
+            last_rowid = rows[-1][0]
+
+    def _save(self, sql, rows):
+        with self._lock:
+            self._connection.executemany(sql, rows)
+            self._connection.commit()
+
+    def is_fresh(self, resource):
+        """
+        The function will find out if the API collection was downloaded in the last max_age seconds
+        :param resource: API collection, for example /network-device
+        :return: True if the collection may be read from the store
+        """
+
+        rows = self._query('SELECT updated FROM fetches WHERE resource = ?', (resource,))
+        return bool(rows) and rows[0][0] > time.time() - self.max_age
+
+    def mark_fetched(self, resource):
+        """
+        The function will save the time the API resource was downloaded
+        :param resource: API resource, for example /network-device
+        :return: None
+        """
+
+        self._save('INSERT OR REPLACE INTO fetches (resource, updated) VALUES (?, ?)', [(resource, time.time())])
+
+    def remove_older(self, table, updated):
+        """
+        The function will remove the records saved before the specified time, used after a complete collection
+        was downloaded, to remove the records not returned by the controller anymore
+        :param table: devices, interfaces or hosts
+        :param updated: time the collection download started
+        :return: None
+        """
+
+        with self._lock:
+            self._connection.execute('DELETE FROM ' + table + ' WHERE updated < ?', (updated,))
+            self._connection.commit()
+
+    def save_devices(self, devices):
+        """
+        The function will save the network devices
+        :param devices: list of network devices info
+        :return: None
+        """
+
+        now = time.time()
+        self._save('INSERT OR REPLACE INTO devices VALUES (?, ?, ?, ?, ?, ?, ?)',
+                   [(device.get('id'), device.get('managementIpAddress'), device.get('hostname'), device.get('family'),
+                     device.get('serialNumber'), json.dumps(device), now) for device in devices])
+
+    def save_interfaces(self, interfaces):
+        """
+        The function will save the network device interfaces
+        :param interfaces: list of interfaces info
+        :return: None
+        """
+
+        now = time.time()
+        self._save('INSERT OR REPLACE INTO interfaces VALUES (?, ?, ?, ?, ?, ?)',
+                   [(interface.get('id') or '%s/%s' % (interface.get('deviceId'), interface.get('portName')),
+                     interface.get('deviceId'), interface.get('portName'), interface.get('ipv4Address'),
+                     json.dumps(interface), now) for interface in interfaces])
+
+    def save_hosts(self, hosts):
+        """
+        The function will save the client devices
+        :param hosts: list of hosts info
+        :return: None
+        """
+
+        now = time.time()
+        self._save('INSERT OR REPLACE INTO hosts VALUES (?, ?, ?, ?, ?, ?, ?)',
+                   [(host.get('id') or host.get('hostMac'), host.get('hostIp'), (host.get('hostMac') or '').lower(),
+                     host.get('connectedNetworkDeviceId'), host.get('connectedInterfaceName'), json.dumps(host), now)
+                    for host in hosts])
+
+    def save_license(self, device_id, license_info):
+        """
+        The function will save the license info of one network device
+        :param device_id: APIC-EM device id
+        :param license_info: list with the license info
+        :return: None
+        """
+
+        self._save('INSERT OR REPLACE INTO licenses VALUES (?, ?, ?)',
+                   [(device_id, json.dumps(license_info), time.time())])
+
+    def get_device(self, device_id):
+        """
+        :param device_id: APIC-EM device id
+        :return: network device info, or None
+        """
+
+        devices = self._query_data('devices', ' AND id = ?', (device_id,))
+        return devices[0] if devices else None
+
+    def get_device_by_ip(self, device_ip):
+        """
+        :param device_ip: network device management IP address
+        :return: network device info, or None
+        """
+
+        devices = self._query_data('devices', ' AND management_ip = ?', (device_ip,))
+        return devices[0] if devices else None
+
+    def iter_devices(self):
+        """
+        :return: generator with all the network devices info
+        """
+
+        return self._iter_data('devices')
+
+    def iter_interfaces(self):
+        """
+        :return: generator with all the interfaces info
+        """
+
+        return self._iter_data('interfaces')
+
+    def iter_hosts(self):
+        """
+        :return: generator with all the hosts info
+        """
+
+        return self._iter_data('hosts')
+
+    def get_interfaces_by_device(self, device_id):
+        """
+        :param device_id: APIC-EM device id
+        :return: list of the network device interfaces info
+        """
+
+        return self._query_data('interfaces', ' AND device_id = ?', (device_id,))
+
+    def get_interfaces_by_ip(self, interface_ip):
+        """
+        :param interface_ip: IP address
+        :return: list of the interfaces configured with the IP address
+        """
+
+        return self._query_data('interfaces', ' AND ipv4_address = ?', (interface_ip,))
+
+    def get_hosts(self, host_ip=None, host_mac=None):
+        """
+        :param host_ip: optional client IP address
+        :param host_mac: optional client MAC address
+        :return: list of the hosts info matching the IP and MAC address
+        """
+
+        where = ''
+        parameters = []
+        if host_ip is not None:
+            where += ' AND host_ip = ?'
+            parameters.append(host_ip)
+        if host_mac is not None:
+            where += ' AND host_mac = ?'
+            parameters.append(host_mac.lower())
+        return self._query_data('hosts', where, parameters)
+
+    def get_license(self, device_id):
+        """
+        :param device_id: APIC-EM device id
+        :return: list with the license info, or None if not saved
+        """
+
+        licenses = self._query_data('licenses', ' AND device_id = ?', (device_id,))
+        return licenses[0] if licenses else None
+
+    def get_license_states(self):
+        """
+        The function will return the state saved by the previous incremental license runs
+        The state does not expire, it is replaced when the network device changes
+        :return: dictionary, device id to (change marker, boot time, list of active licenses)
+        """
+
+        rows = self._query('SELECT device_id, marker, boot_time, data FROM license_state')
+        return {row[0]: (row[1], row[2], json.loads(row[3])) for row in rows}
+
+    def save_license_states(self, states):
+        """
+        The function will save the state of the network devices collected by an incremental license run
+        :param states: list of (device id, change marker, boot time, list of active licenses)
+        :return: None
+        """
+
+        now = time.time()
+        self._save('INSERT OR REPLACE INTO license_state VALUES (?, ?, ?, ?, ?)',
+                   [(device_id, marker, boot_time, json.dumps(licenses), now)
+                    for device_id, marker, boot_time, licenses in states])
+
+    def remove_license_states(self, device_ids):
+        """
+        The function will remove the state of the network devices not returned by the controller anymore
+        :param device_ids: list of APIC-EM device ids
+        :return: None
+        """
+
+        self._save('DELETE FROM license_state WHERE device_id = ?', [(device_id,) for device_id in device_ids])
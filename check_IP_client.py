@@ -2,20 +2,10 @@
 
 # !/usr/bin/env python3
 
-import requests
 import json
-import requests.packages.urllib3
-from requests.packages.urllib3.exceptions import InsecureRequestWarning
+import apic_em_client
 
-requests.packages.urllib3.disable_warnings(InsecureRequestWarning)  # Disable insecure https warnings
-
-# Declarations for the controller info. The values will need to change for the proper Sandbox info,
-# or the customer controller
-
-APIC_EM = 'sandboxapic.cisco.com/api/v1'
-APIC_EM_USER = 'devnetuser'
-APIC_EM_PASSW = 'Cisco123!'
-APIC_EM_TICKET = None
+# The controller info, url, username and password, is declared in the apic_em_client module
 
 # client IP addresses to test 10.2.1.22 - ethernet
 # client IP addresses to test 10.1.15.117 - wifi
@@ -38,17 +28,13 @@ def get_service_ticket():
     :return: ticket
     """
 
-    payload = {'username': APIC_EM_USER, 'password': APIC_EM_PASSW}
-    url = 'https://' + APIC_EM + '/ticket'
-    header = {'content-type': 'application/json'}
-    ticket_response = requests.post(url, data=json.dumps(payload), headers=header, verify=False)
-    if not ticket_response:
-        print('No data returned!')
-    else:
-        ticket_json = ticket_response.json()
-        ticket = ticket_json['response']['serviceTicket']
-        print('Created APIC-EM ticket: ', ticket)
-        return ticket
+    try:
+        ticket = apic_em_client.get_service_ticket()
+    except apic_em_client.APICEMError as error:
+        print('No data returned!', error)
+        raise SystemExit(1)
+    print('Created APIC-EM ticket: ', ticket)
+    return ticket
 
 
 def get_input_ip():
@@ -71,12 +57,8 @@ def check_client_ip_address(client_ip):
     :return: None
     """
 
-    url = 'https://' + APIC_EM + '/host'
-    header = {'accept': 'application/json', 'X-Auth-Token': APIC_EM_TICKET}
-    payload = {'hostIp': client_ip}
-    host_response = requests.get(url, params=payload, headers=header, verify=False)
-    host_json = host_response.json()
-    if not host_json['response']:
+    host_info = apic_em_client.get_hosts(hostIp=client_ip)
+    if not host_info:
         print('The IP address ', client_ip, ' is not used by any client devices')
     else:
         print('The IP address ', client_ip, ' is used by a client device')
@@ -91,8 +73,7 @@ def main():
 
     # create an auth ticket for APIC-EM
 
-    global APIC_EM_TICKET    # make the ticket a global variable in this module
-    APIC_EM_TICKET = get_service_ticket()
+    get_service_ticket()  # the ticket is saved in the apic_em_client module, and used by all API calls
 
     # input IP address for client
 
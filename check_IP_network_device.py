@@ -2,20 +2,10 @@
 
 # !/usr/bin/env python3
 
-import requests
 import json
-import requests.packages.urllib3
-from requests.packages.urllib3.exceptions import InsecureRequestWarning
+import apic_em_client
 
-requests.packages.urllib3.disable_warnings(InsecureRequestWarning)  # Disable insecure https warnings
-
-# Declarations for the controller info. The values will need to change for the proper Sandbox info,
-# or the customer controller
-
-APIC_EM = 'sandboxapic.cisco.com/api/v1'
-APIC_EM_USER = 'devnetuser'
-APIC_EM_PASSW = 'Cisco123!'
-APIC_EM_TICKET = None
+# The controller info, url, username and password, is declared in the apic_em_client module
 
 
 # AP IP address to test 10.1.14.3
@@ -40,17 +30,13 @@ def get_service_ticket():
     :return: apic_em_ticket
     """
 
-    payload = {'username': APIC_EM_USER, 'password': APIC_EM_PASSW}
-    url = 'https://' + APIC_EM + '/ticket'
-    header = {'content-type': 'application/json'}
-    ticket_response = requests.post(url, data=json.dumps(payload), headers=header, verify=False)
-    if not ticket_response:
-        print('No data returned!')
-    else:
-        ticket_json = ticket_response.json()
-        ticket = ticket_json['response']['serviceTicket']
-        print('Created APIC-EM apic_em_ticket: ', ticket)
-        return ticket
+    try:
+        ticket = apic_em_client.get_service_ticket()
+    except apic_em_client.APICEMError as error:
+        print('No data returned!', error)
+        raise SystemExit(1)
+    print('Created APIC-EM apic_em_ticket: ', ticket)
+    return ticket
 
 
 def get_input_ip():
@@ -74,14 +60,10 @@ def check_device(interface_ip):
     :return: 
     """
 
-    url = 'https://' + APIC_EM + '/interface/ip-address/' + interface_ip
-    header = {'accept': 'application/json', 'X-Auth-Token': apic_em_ticket}
-    interface_response = requests.get(url, headers=header, verify=False)
-    if not interface_response:
-        url = 'https://' + APIC_EM + '/network-device/ip-address/' + interface_ip  # verification required for wireless AP's IP address
-        header = {'accept': 'application/json', 'X-Auth-Token': apic_em_ticket}
-        device_response = requests.get(url, headers=header, verify=False)
-        if not device_response:
+    interface_info = apic_em_client.get_interfaces_by_ip(interface_ip)
+    if not interface_info:
+        device_info = apic_em_client.get_network_device_by_ip(interface_ip)  # verification required for wireless AP's IP address
+        if not device_info:
             print('The IP address ', interface_ip, ' is not configured on any network devices')
         else:
             print('The IP address ', interface_ip, ' is configured on a wireless access point')
@@ -98,8 +80,7 @@ def main():
 
     # create an auth apic_em_ticket for APIC-EM
 
-    global apic_em_ticket  # make the apic_em_ticket a global variable in this module
-    apic_em_ticket = get_service_ticket()
+    get_service_ticket()  # the ticket is saved in the apic_em_client module, and used by all API calls
 
     # input IP address for client
 
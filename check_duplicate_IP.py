@@ -3,19 +3,26 @@
 # !/usr/bin/env python3
 
 
-import requests
 import json
-from requests.packages.urllib3.exceptions import InsecureRequestWarning
+import sys
+import argparse
+import ipaddress
+import functools
+import requests
+import apic_em_client
+import apic_em_federation
+import apic_em_ip_index
+import apic_em_parallel
+import apic_em_report
 
-requests.packages.urllib3.disable_warnings(InsecureRequestWarning)  # Disable insecure https warnings
+# The controller info, url, username and password, is declared in the apic_em_client module
 
-# Declarations for the controller info. The values will need to change for the proper Sandbox info,
-# or the customer controller
+# Batch mode, default number of IP addresses checked at the same time, and the result fields
 
-APIC_EM = 'sandboxapic.cisco.com/api/v1'
-APIC_EM_USER = 'devnetuser'
-APIC_EM_PASSW = 'Cisco123!'
-APIC_EM_TICKET = None
+WORKERS = 8
+RESULT_FIELDS = ['ip_address', 'client_used', 'client_type', 'client_device', 'client_device_type',
+                 'client_interface', 'client_vlan', 'device_used', 'device_hostname', 'device_type',
+                 'device_interface', 'error']
 
 # client IP addresses to test 10.2.1.22 - ethernet connected
 # client IP addresses to test 10.1.15.117 - wifi connected
@@ -41,17 +48,13 @@ def get_service_ticket():
     :return: ticket
     """
 
-    payload = {'username': APIC_EM_USER, 'password': APIC_EM_PASSW}
-    url = 'https://' + APIC_EM + '/ticket'
-    header = {'content-type': 'application/json'}
-    ticket_response = requests.post(url, data=json.dumps(payload), headers=header, verify=False)
-    if not ticket_response:
-        print('No data returned!')
-    else:
-        ticket_json = ticket_response.json()
-        ticket = ticket_json['response']['serviceTicket']
-        print('Created APIC-EM ticket: ', ticket)
-        return ticket
+    try:
+        ticket = apic_em_client.get_service_ticket()
+    except apic_em_client.APICEMError as error:
+        print('No data returned!', error)
+        raise SystemExit(1)
+    print('Created APIC-EM ticket: ', ticket)
+    return ticket
 
 
 def get_input_ip():
@@ -65,57 +68,128 @@ def get_input_ip():
     return ip_address
 
 
-def check_client_ip_address(client_ip):
+def get_client_ip_usage(client_ip, snapshot=None):
     """
     The function will find out if APIC-EM has a client device configured with the specified IP address.
-    API call to /host
-    It will print if a client device exists or not.
+    API call to /host, or the IP address snapshot if provided
     :param client_ip: client IP address
-    :return: None
+    :param snapshot: optional IP address snapshot, answers without API calls
+    :return: None if no client uses the IP address, or a dictionary with the client type, VLAN, and the hostname,
+    model and interface of the network device connected to the client. The interface is None for wireless clients
     """
 
-    url = 'https://' + APIC_EM + '/host'
-    header = {'accept': 'application/json', 'X-Auth-Token': APIC_EM_TICKET}
-    payload = {'hostIp': client_ip}
-    host_response = requests.get(url, params=payload, headers=header, verify=False)
-    host_json = host_response.json()
+    if snapshot is not None:
+        return get_client_ip_usage_snapshot(client_ip, snapshot)
+    host_json = apic_em_client.get_hosts(hostIp=client_ip)
 
     # pprint(host_json)  # needed for troubleshooting
 
     # verification if client found or not
 
-    if not host_json['response']:
+    if not host_json:
+        return None
+    host_info = host_json[0]
+    client_usage = {'host_type': host_info['hostType'], 'vlan': host_info['vlanId'], 'interface': None}
+
+    # verification required for wireless clients, JSON output is different for wireless vs. wired clients
+
+    if client_usage['host_type'] != 'wireless':
+        client_usage['interface'] = host_info['connectedInterfaceName']  # info for ethernet connected clients
+    apic_em_device_id = host_info['connectedNetworkDeviceId']
+    client_usage['hostname'], client_usage['device_type'] = get_hostname_id(apic_em_device_id)
+    return client_usage
+
+
+def get_client_ip_usage_snapshot(client_ip, snapshot):
+    """
+    The function will find out if a client device uses the IP address, using the IP address snapshot
+    :param client_ip: client IP address
+    :param snapshot: IP address snapshot
+    :return: the same dictionary as get_client_ip_usage
+    """
+
+    for source, device_id, interface_name, host_vlan, host_type in snapshot.lookup(client_ip):
+        if source == apic_em_ip_index.HOST:
+            client_usage = {'host_type': host_type, 'vlan': host_vlan, 'interface': None}
+            if host_type != 'wireless':
+                client_usage['interface'] = interface_name
+            client_usage['hostname'], client_usage['device_type'] = snapshot.get_device(device_id)
+            return client_usage
+    return None
+
+
+def check_client_ip_address(client_ip, snapshot=None):
+    """
+    The function will find out if APIC-EM has a client device configured with the specified IP address.
+    API call to /host, or the IP address snapshot if provided
+    It will print if a client device exists or not.
+    :param client_ip: client IP address
+    :param snapshot: optional IP address snapshot, answers without API calls
+    :return: None
+    """
+
+    client_usage = get_client_ip_usage(client_ip, snapshot)
+    if client_usage is None:
         print('The IP address', client_ip, 'is not used by any client devices')
     else:
         print('The IP address', client_ip, 'is used by a client device')
-        host_info = host_json['response'][0]
-        host_type = host_info['hostType']
-        host_vlan = host_info['vlanId']
+        hostname = client_usage['hostname']
+        device_type = client_usage['device_type']
+        host_vlan = client_usage['vlan']
+        if client_usage['host_type'] == 'wireless':
+            print('The IP address', client_ip, ', is connected to the network device:', hostname, ', model:', device_type, ', interface VLAN:', host_vlan)
+        else:
+            interface_name = client_usage['interface']
+            print('The IP address', client_ip, ', is connected to the network device:', hostname, ', model:',
+                  device_type, ', interface:', interface_name, ', VLAN:', host_vlan)
 
-        # verification required for wireless clients, JSON output is different for wireless vs. wired clients
 
-        if host_type == 'wireless':
+def get_device_ip_usage(interface_ip, snapshot=None):
+    """
+    The function will find out if APIC-EM has a network device with the specified IP address configured on an interface
+    API call to /interface/ip-address/{ipAddress}, gets list of interfaces with the given IP address.
+    For wireless AP's, the management IP address is checked with API call to /network-device/ip-address/{ipAddress}
+    If the IP address snapshot is provided, it is used instead of the API calls
+    :param interface_ip: IP address to check
+    :param snapshot: optional IP address snapshot, answers without API calls
+    :return: None if no network device uses the IP address, or a dictionary with the network device hostname, model and
+    interface. The interface is None for wireless AP's
+    """
 
-            # info for wireless clients
+    if snapshot is not None:
+        return get_device_ip_usage_snapshot(interface_ip, snapshot)
+    interface_info_list = apic_em_client.get_interfaces_by_ip(interface_ip)
+    if not interface_info_list:
+        device_info = apic_em_client.get_network_device_by_ip(interface_ip)  # verification required by
+        # wireless AP's IP address
+        if not device_info:
+            return None
+        hostname, device_type = get_hostname_ip(interface_ip)
+        return {'hostname': hostname, 'device_type': device_type, 'interface': None}
+    interface_info = interface_info_list[0]
+    hostname, device_type = get_hostname_id(interface_info['deviceId'])
+    return {'hostname': hostname, 'device_type': device_type, 'interface': interface_info['portName']}
 
-            apic_em_device_id = host_info['connectedNetworkDeviceId']
-            hostname = get_hostname_id(apic_em_device_id)[0]
-            device_type = get_hostname_id(apic_em_device_id)[1]
-            print('The IP address', client_ip, ', is connected to the network device:', hostname, ', model:', device_type, ', interface VLAN:', host_vlan)
-            interface_name = host_vlan
-        else:
 
-            # info for ethernet connected clients
+def get_device_ip_usage_snapshot(interface_ip, snapshot):
+    """
+    The function will find out if a network device uses the IP address, using the IP address snapshot
+    The interfaces are checked first, then the management IP addresses, same as get_device_ip_usage
+    :param interface_ip: IP address to check
+    :param snapshot: IP address snapshot
+    :return: the same dictionary as get_device_ip_usage
+    """
 
-            interface_name = host_info['connectedInterfaceName']
-            apic_em_device_id = host_info['connectedNetworkDeviceId']
-            hostname = get_hostname_id(apic_em_device_id)[0]
-            device_type = get_hostname_id(apic_em_device_id)[1]
-            print('The IP address', client_ip, ', is connected to the network device:', hostname, ', model:',
-                  device_type, ', interface:', interface_name, ', VLAN:', host_vlan)
+    entries = snapshot.lookup(interface_ip)
+    for source in (apic_em_ip_index.INTERFACE, apic_em_ip_index.DEVICE):
+        for entry in entries:
+            if entry[0] == source:
+                hostname, device_type = snapshot.get_device(entry[1])
+                return {'hostname': hostname, 'device_type': device_type, 'interface': entry[2]}
+    return None
 
 
-def get_interface_name(interface_ip):
+def get_interface_name(interface_ip, snapshot=None):
     """
     The function will find out if APIC-EM has a network device with the specified IP address configured on an interface
     API call to /interface/ip-address/{ipAddress}, gets list of interfaces with the given IP address.
@@ -123,35 +197,21 @@ def get_interface_name(interface_ip):
     There is a nested function, get_hostname_ip , to find out the information about wireless
     AP's based on the management IP address
     :param interface_ip: IP address to check
+    :param snapshot: optional IP address snapshot, answers without API calls
     :return: network device hostname
     """
 
-    url = 'https://' + APIC_EM + '/interface/ip-address/' + interface_ip
-    header = {'accept': 'application/json', 'X-Auth-Token': APIC_EM_TICKET}
-    interface_info_response = requests.get(url, headers=header, verify=False)
-    if not interface_info_response:
-        device_ip = interface_ip
-        url = 'https://' + APIC_EM + '/network-device/ip-address/' + device_ip  # verification required by
-        # wireless AP's IP address
-        header = {'accept': 'application/json', 'X-Auth-Token': APIC_EM_TICKET}
-        device_info_response = requests.get(url, headers=header, verify=False)
-        if not device_info_response:
-            print('The IP address ', interface_ip, ' is not configured on any network devices')
-        else:
-            hostname = get_hostname_ip(device_ip)[0]
-            device_type = get_hostname_ip(device_ip)[1]
-            print('The IP address ', device_ip, ' is configured on network device ', hostname, ',  ', device_type)
-            return hostname
+    device_usage = get_device_ip_usage(interface_ip, snapshot)
+    if device_usage is None:
+        print('The IP address ', interface_ip, ' is not configured on any network devices')
+    elif device_usage['interface'] is None:
+        print('The IP address ', interface_ip, ' is configured on network device ', device_usage['hostname'], ',  ',
+              device_usage['device_type'])
+        return device_usage['hostname']
     else:
-        interface_info_json = interface_info_response.json()
-        interface_info = interface_info_json['response'][0]
-        interface_name = interface_info['portName']
-        device_id = interface_info['deviceId']
-        hostname = get_hostname_id(device_id)[0]
-        device_type = get_hostname_id(device_id)[1]
-        print('The IP address ', interface_ip, ' is configured on network device ', hostname, ',  ',
-              device_type, ',  interface ', interface_name)
-        return hostname
+        print('The IP address ', interface_ip, ' is configured on network device ', device_usage['hostname'], ',  ',
+              device_usage['device_type'], ',  interface ', device_usage['interface'])
+        return device_usage['hostname']
 
 
 def get_hostname_id(device_id):
@@ -162,12 +222,9 @@ def get_hostname_id(device_id):
     :return: network device hostname and type
     """
 
-    url = 'https://' + APIC_EM + '/network-device/' + device_id
-    header = {'accept': 'application/json', 'X-Auth-Token': APIC_EM_TICKET}
-    hostname_response = requests.get(url, headers=header, verify=False)
-    hostname_json = hostname_response.json()
-    hostname = hostname_json['response']['hostname']
-    device_type = hostname_json['response']['type']
+    device_info = apic_em_client.get_network_device(device_id)
+    hostname = device_info['hostname']
+    device_type = device_info['type']
     return hostname, device_type
 
 
@@ -179,15 +236,255 @@ def get_hostname_ip(device_ip):
     :return: network device hostname and type
     """
 
-    url = 'https://' + APIC_EM + '/network-device/ip-address/' + device_ip
-    header = {'accept': 'application/json', 'X-Auth-Token': APIC_EM_TICKET}
-    hostname_response = requests.get(url, headers=header, verify=False)
-    hostname_json = hostname_response.json()
-    hostname = hostname_json['response']['hostname']
-    device_type = hostname_json['response']['type']
+    device_info = apic_em_client.get_network_device_by_ip(device_ip)
+    hostname = device_info['hostname']
+    device_type = device_info['type']
     return hostname, device_type
 
 
+def check_ip_usage(ip_address, snapshot=None):
+    """
+    The function will find out if the IP address is used by a client device, or configured on a network device
+    :param ip_address: IP address to check
+    :param snapshot: optional IP address snapshot, answers without API calls
+    :return: dictionary with the result, the 'error' value is set if the IP address could not be checked
+    """
+
+    ip_usage = dict.fromkeys(RESULT_FIELDS)
+    ip_usage['ip_address'] = ip_address
+    ip_usage['client_used'] = False
+    ip_usage['device_used'] = False
+    try:
+        ipaddress.ip_address(ip_address)
+    except ValueError:
+        ip_usage['error'] = 'invalid IP address'
+        return ip_usage
+    try:
+        client_usage = get_client_ip_usage(ip_address, snapshot)
+        if client_usage is not None:
+            ip_usage['client_used'] = True
+            ip_usage['client_type'] = client_usage['host_type']
+            ip_usage['client_device'] = client_usage['hostname']
+            ip_usage['client_device_type'] = client_usage['device_type']
+            ip_usage['client_interface'] = client_usage['interface']
+            ip_usage['client_vlan'] = client_usage['vlan']
+        device_usage = get_device_ip_usage(ip_address, snapshot)
+        if device_usage is not None:
+            ip_usage['device_used'] = True
+            ip_usage['device_hostname'] = device_usage['hostname']
+            ip_usage['device_type'] = device_usage['device_type']
+            ip_usage['device_interface'] = device_usage['interface']
+    except (apic_em_client.APICEMError, requests.exceptions.RequestException) as error:
+        # one IP address that fails should not stop the batch
+        ip_usage['error'] = str(error)
+    return ip_usage
+
+
+def controller_failed_ip_usage(ip_address):
+    """
+    Federation mode, the function will return the result of an IP address not checked because the controller failed
+    :param ip_address: IP address
+    :return: dictionary with the result, the 'error' value is set
+    """
+
+    ip_usage = dict.fromkeys(RESULT_FIELDS)
+    ip_usage.update({'ip_address': ip_address, 'client_used': False, 'device_used': False,
+                     'error': apic_em_federation.CONTROLLER_FAILED})
+    return ip_usage
+
+
+def check_ip_batch(ip_address_list, output_writer, output_format='csv', workers=WORKERS, snapshot=None,
+                   limiter=None):
+    """
+    The function will check all the IP addresses, using a pool of worker threads, and write one row for each
+    IP address, in the input order
+    With the IP address snapshot, the IP addresses are checked locally, in the calling thread
+    With the adaptive limiter, the number of API calls in progress follows the controller load, workers is not used
+    :param ip_address_list: list of IP addresses
+    :param output_writer: streaming CSV or JSON Lines writer
+    :param output_format: csv or jsonl
+    :param workers: number of IP addresses checked at the same time
+    :param snapshot: optional IP address snapshot, answers without API calls
+    :param limiter: optional apic_em_parallel.AdaptiveLimiter
+    :return: number of IP addresses in use
+    """
+
+    used_count = 0
+    if output_format == 'csv':
+        output_writer.write_row(RESULT_FIELDS)
+    check_function = functools.partial(check_ip_usage, snapshot=snapshot)
+    if snapshot is not None:
+        ip_usage_list = apic_em_parallel.ordered_map(check_function, ip_address_list)
+    elif limiter is not None:
+        ip_usage_list = apic_em_parallel.adaptive_map(check_function, ip_address_list, limiter)
+    else:
+        ip_usage_list = apic_em_parallel.ordered_map(check_function, ip_address_list, workers)
+    for ip_usage in ip_usage_list:
+        if ip_usage['client_used'] or ip_usage['device_used']:
+            used_count += 1
+        if output_format == 'csv':
+            output_writer.write_row([ip_usage[field] for field in RESULT_FIELDS])
+        else:
+            output_writer.write_row(ip_usage)
+    return used_count
+
+
+def build_snapshot():
+    """
+    The function will build the IP address snapshot, the messages are printed to the standard error
+    :return: IP address snapshot
+    """
+
+    print('Building the IP address snapshot...', file=sys.stderr)
+    snapshot = apic_em_ip_index.IPSnapshot()
+    snapshot.refresh()
+    print('IP address snapshot built,', len(snapshot), 'IP addresses in use', file=sys.stderr)
+    return snapshot
+
+
+def network_argument(network):
+    """
+    The function will validate the --network argument, before any API call
+    :param network: network in CIDR format, for example 10.2.0.0/16
+    :return: network, argparse.ArgumentTypeError is raised if the network is not valid
+    """
+
+    try:
+        ipaddress.ip_network(network, strict=False)
+    except ValueError:
+        raise argparse.ArgumentTypeError('not a valid network, for example 10.2.0.0/16: ' + network)
+    return network
+
+
+def print_network_usage(network, snapshot):
+    """
+    The function will print all the IP addresses in use in the network, and what is using each IP address
+    :param network: network in CIDR format, for example 10.2.0.0/16
+    :param snapshot: IP address snapshot
+    :return: None
+    """
+
+    network_usage = snapshot.lookup_network(network)
+    for ip_address, entries in network_usage:
+        for source, device_id, interface_name, host_vlan, host_type in entries:
+            hostname, device_type = snapshot.get_device(device_id)
+            print(ip_address, source, hostname, device_type, interface_name or '', host_vlan or '', sep='\t')
+    print(len(network_usage), 'IP addresses in use in', network, file=sys.stderr)
+
+
+def check_controller_ips(ip_address_list, workers=WORKERS, use_snapshot=False, adaptive=None):
+    """
+    Federation mode, the function will check all the IP addresses on one controller, it runs in the controller
+    process
+    :param ip_address_list: list of IP addresses
+    :param workers: number of IP addresses checked at the same time
+    :param use_snapshot: build the IP address snapshot, and check the IP addresses locally
+    :param adaptive: optional maximum number of API calls in progress, for the adaptive limiter
+    :return: list of dictionaries with the result for each IP address, in the list order
+    """
+
+    apic_em_client.ensure_pool_size(workers)
+    if use_snapshot:
+        snapshot = build_snapshot()
+        return [check_ip_usage(ip_address, snapshot) for ip_address in ip_address_list]
+    if adaptive:
+        limiter = apic_em_parallel.AdaptiveLimiter(max_limit=adaptive)
+        ip_usage_list = list(apic_em_parallel.adaptive_map(check_ip_usage, ip_address_list, limiter))
+        print(limiter.report(), file=sys.stderr)
+        return ip_usage_list
+    return list(apic_em_parallel.ordered_map(check_ip_usage, ip_address_list, workers))
+
+
+def check_federated_ip_batch(controllers, ip_address_list, output_writer, args):
+    """
+    Federation mode, the function will check all the IP addresses on all the controllers at the same time, and
+    write one row for each IP address and controller using it, with the controller name in the first column
+    An IP address not used has one row, with no controller name. A controller that failed has one row for each
+    IP address, with the error
+    :param controllers: list of controllers, from apic_em_federation.load_controllers()
+    :param ip_address_list: list of IP addresses
+    :param output_writer: streaming CSV or JSON Lines writer
+    :param args: command line arguments
+    :return: number of IP addresses in use
+    """
+
+    results = apic_em_federation.run_on_controllers(controllers, check_controller_ips, ip_address_list,
+                                                    args.workers, args.snapshot, args.adaptive)
+    ip_usage_list = apic_em_federation.merge_lookups(
+        results, lambda ip_usage: ip_usage['client_used'] or ip_usage['device_used'], ip_address_list,
+        controller_failed_ip_usage)
+    if args.format == 'csv':
+        output_writer.write_row(['controller'] + RESULT_FIELDS)
+    used_ip_addresses = set()
+    for controller_name, ip_usage in ip_usage_list:
+        if ip_usage['client_used'] or ip_usage['device_used']:
+            used_ip_addresses.add(ip_usage['ip_address'])
+        if args.format == 'csv':
+            output_writer.write_row([controller_name] + [ip_usage[field] for field in RESULT_FIELDS])
+        else:
+            output_writer.write_row(dict(ip_usage, controller=controller_name))
+    return len(used_ip_addresses)
+
+
+def open_batch_output(args):
+    """
+    The function will open the batch mode result file
+    :param args: command line arguments
+    :return: streaming CSV or JSON Lines writer
+    """
+
+    if args.format == 'csv':
+        return apic_em_report.StreamingCSVWriter(args.output)
+    return apic_em_report.StreamingJSONLinesWriter(args.output)
+
+
+def run_batch(args):
+    """
+    Batch mode, the IP addresses are read from the input file, and the result is written to the output file
+    The messages are printed to the standard error, so the standard output may be used for the result
+    :param args: command line arguments
+    :return: None
+    """
+
+    controllers = None
+    if args.controllers:
+        controllers = apic_em_federation.read_controllers(args.controllers, sys.stderr)
+    else:
+        try:
+            apic_em_client.get_service_ticket()
+        except apic_em_client.APICEMError as error:
+            print('No data returned!', error, file=sys.stderr)
+            raise SystemExit(1)
+    if args.input == '-':
+        ip_address_list = apic_em_client.read_addresses(sys.stdin)
+    else:
+        with open(args.input) as input_file:
+            ip_address_list = apic_em_client.read_addresses(input_file)
+    if controllers:
+        with open_batch_output(args) as output_writer:
+            used_count = check_federated_ip_batch(controllers, ip_address_list, output_writer, args)
+        print('Checked', len(ip_address_list), 'IP addresses on', len(controllers), 'controllers,', used_count,
+              'in use', file=sys.stderr)
+        return
+    apic_em_client.ensure_pool_size(args.workers)
+    snapshot = None
+    if args.snapshot:
+        try:
+            snapshot = build_snapshot()
+        except apic_em_client.APICEMError as error:
+            print('No data returned!', error, file=sys.stderr)
+            raise SystemExit(1)
+    limiter = None
+    if args.adaptive:
+        limiter = apic_em_parallel.AdaptiveLimiter(max_limit=args.adaptive)
+    # the output file is opened when the snapshot is built, a controller failure leaves the previous report
+    with open_batch_output(args) as output_writer:
+        used_count = check_ip_batch(ip_address_list, output_writer, args.format, args.workers, snapshot, limiter)
+    print('Checked', len(ip_address_list), 'IP addresses,', used_count, 'in use', file=sys.stderr)
+    if limiter is not None:
+        print(limiter.report(), file=sys.stderr)
+
+
 def main():
     """
     This script will validate if user provided IP addresses are already configured on a network device,
@@ -199,19 +496,56 @@ def main():
     A while loop will allow to check multiple IP addresses, until user input is 'q'
     """
 
+    parser = argparse.ArgumentParser(description='APIC-EM duplicate IP address check')
+    parser.add_argument('--input', help='batch mode, file with the IP addresses to check, - for the standard input')
+    parser.add_argument('--output', default='-', help='batch mode, result file (default standard output)')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv', help='batch mode, result format')
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help='batch mode, number of IP addresses checked at the same time (default %(default)s)')
+    parser.add_argument('--adaptive', type=int, metavar='MAX_LIMIT',
+                        help='batch mode, adapt the number of API calls in progress to the controller load, '
+                             'up to MAX_LIMIT')
+    parser.add_argument('--snapshot', action='store_true',
+                        help='load all the IP addresses in use once, and check the IP addresses locally')
+    parser.add_argument('--network', type=network_argument,
+                        help='list the IP addresses in use in the network, for example 10.2.0.0/16')
+    parser.add_argument('--controllers', help='batch mode, federation, JSON file with the controllers to check at '
+                                              'the same time, see apic_em_federation')
+    args = parser.parse_args()
+
+    if args.input:
+        run_batch(args)  # batch mode, no user input
+        return
+
+    if args.network:
+        try:
+            snapshot = build_snapshot()  # the ticket is created by the first API call
+        except apic_em_client.APICEMError as error:
+            print('No data returned!', error, file=sys.stderr)
+            raise SystemExit(1)
+        print_network_usage(args.network, snapshot)
+        return
+
     # create an auth ticket for APIC-EM
 
-    global APIC_EM_TICKET  # make the ticket a global variable in this module
-    APIC_EM_TICKET = get_service_ticket()
+    get_service_ticket()  # the ticket is saved in the apic_em_client module, and used by all API calls
+
+    snapshot = None
+    if args.snapshot:
+        snapshot = build_snapshot()
+        print('Input r to refresh the IP address snapshot')
 
     # this loop will allow running the validation multiple times, until user input is 'q'
 
     ip_address = None
     while ip_address != "q":
         ip_address = get_input_ip()
-        if ip_address != 'q':
-            check_client_ip_address(ip_address)
-            get_interface_name(ip_address)
+        if ip_address == 'r' and snapshot is not None:
+            snapshot.refresh()
+            print('IP address snapshot refreshed,', len(snapshot), 'IP addresses in use')
+        elif ip_address != 'q':
+            check_client_ip_address(ip_address, snapshot)
+            get_interface_name(ip_address, snapshot)
 
 
 if __name__ == '__main__':
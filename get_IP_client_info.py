@@ -2,20 +2,16 @@
 
 # !/usr/bin/env python3
 
-import requests
 import json
-import requests.packages.urllib3
-from requests.packages.urllib3.exceptions import InsecureRequestWarning
+import argparse
+import apic_em_client
+import apic_em_parallel
 
-requests.packages.urllib3.disable_warnings(InsecureRequestWarning)  # Disable insecure https warnings
+# The controller info, url, username and password, is declared in the apic_em_client module
 
-# Declarations for the controller info. The values will need to change for the proper Sandbox info,
-# or the customer controller
+# Default number of IP addresses looked up at the same time, when checking multiple IP addresses
 
-APIC_EM = 'sandboxapic.cisco.com/api/v1'
-APIC_EM_USER = 'devnetuser'
-APIC_EM_PASSW = 'Cisco123!'
-APIC_EM_TICKET = None
+WORKERS = 8
 
 # client IP addresses to test 10.2.1.22 - ethernet
 # client IP addresses to test 10.1.15.117 - wifi
@@ -38,17 +34,13 @@ def get_service_ticket():
     :return: ticket
     """
 
-    payload = {'username': APIC_EM_USER, 'password': APIC_EM_PASSW}
-    url = 'https://' + APIC_EM + '/ticket'
-    header = {'content-type': 'application/json'}
-    ticket_response = requests.post(url, data=json.dumps(payload), headers=header, verify=False)
-    if not ticket_response:
-        print('No data returned!')
-    else:
-        ticket_json = ticket_response.json()
-        ticket = ticket_json['response']['serviceTicket']
-        print('Created APIC-EM ticket: ', ticket)
-        return ticket
+    try:
+        ticket = apic_em_client.get_service_ticket()
+    except apic_em_client.APICEMError as error:
+        print('No data returned!', error)
+        raise SystemExit(1)
+    print('Created APIC-EM ticket: ', ticket)
+    return ticket
 
 
 def get_input_ip():
@@ -62,30 +54,57 @@ def get_input_ip():
     return ip_address
 
 
-def check_client_ip_address(client_ip):
+def get_client_ip_info(client_ip):
     """
-    The function will find out if APIC-EM has a client device configured with the specified IP address.
-    API call to /host
-    It will print if a client device exists or not.
+    The function will find out if APIC-EM has a client device configured with the specified IP address,
+    and the network device the client is connected to
+    API call to /host, and to /network-device/{id}
     :param client_ip: client IP address
-    :return: None
+    :return: None if no client uses the IP address, or the client info, the network device hostname and type
     """
 
-    url = 'https://' + APIC_EM + '/host'
-    header = {'accept': 'application/json', 'X-Auth-Token': APIC_EM_TICKET}
-    payload = {'hostIp': client_ip}
-    host_response = requests.get(url, params=payload, headers=header, verify=False)
-    host_json = host_response.json()
+    host_json = apic_em_client.get_hosts(hostIp=client_ip)
 
     # pprint(host_json)  # needed for troubleshooting
 
     # verification if client found or not
 
-    if not host_json['response']:
+    if not host_json or type(host_json) is not list:
+        return None
+    host_info = host_json[0]
+    hostname, device_type = get_hostname_id(host_info['connectedNetworkDeviceId'])
+    return host_info, hostname, device_type
+
+
+def lookup_client_ip_info(client_ip):
+    """
+    The function will call get_client_ip_info, and return the API call error instead of raising it, so one IP
+    address that fails does not stop the lookup of the other IP addresses
+    :param client_ip: client IP address
+    :return: the result of get_client_ip_info, or the APICEMError
+    """
+
+    try:
+        return get_client_ip_info(client_ip)
+    except apic_em_client.APICEMError as error:
+        return error
+
+
+def print_client_ip_info(client_ip, client_info):
+    """
+    The function will print if a client device uses the IP address, and the network device it is connected to
+    :param client_ip: client IP address
+    :param client_info: the result of get_client_ip_info, or the APICEMError if the IP address could not be checked
+    :return: None
+    """
+
+    if isinstance(client_info, apic_em_client.APICEMError):
+        print('The IP address', client_ip, 'could not be checked:', client_info)
+    elif client_info is None:
         print('The IP address', client_ip, 'is not used by any client devices')
     else:
         print('The IP address', client_ip, 'is used by a client device')
-        host_info = host_json['response'][0]
+        host_info, hostname, device_type = client_info
         host_type = host_info['hostType']
         host_vlan = host_info['vlanId']
 
@@ -95,9 +114,6 @@ def check_client_ip_address(client_ip):
 
             # info for wireless clients
 
-            apic_em_device_id = host_info['connectedNetworkDeviceId']
-            hostname = get_hostname_id(apic_em_device_id)[0]
-            device_type = get_hostname_id(apic_em_device_id)[1]
             print('The IP address', client_ip, ', is connected to the network device:', hostname, ', model:',
                   device_type, ', interface VLAN:', host_vlan)
         else:
@@ -105,13 +121,38 @@ def check_client_ip_address(client_ip):
             # info for ethernet connected clients
 
             interface_name = host_info['connectedInterfaceName']
-            apic_em_device_id = host_info['connectedNetworkDeviceId']
-            hostname = get_hostname_id(apic_em_device_id)[0]
-            device_type = get_hostname_id(apic_em_device_id)[1]
             print('The IP address', client_ip, ', is connected to the network device:', hostname, ', model:',
                   device_type, ', interface:', interface_name, ', VLAN:', host_vlan)
 
 
+def check_client_ip_address(client_ip):
+    """
+    The function will find out if APIC-EM has a client device configured with the specified IP address.
+    API call to /host
+    It will print if a client device exists or not.
+    :param client_ip: client IP address
+    :return: None
+    """
+
+    print_client_ip_info(client_ip, get_client_ip_info(client_ip))
+
+
+def check_client_ip_addresses(client_ip_list, workers=WORKERS):
+    """
+    The function will check multiple IP addresses, looked up in parallel, and print the result for each IP address,
+    in the list order
+    The clients connected to the same network device share one /network-device/{id} API call. An IP address that
+    could not be checked has the error printed, the other IP addresses are still checked
+    :param client_ip_list: list of client IP addresses
+    :param workers: number of IP addresses looked up at the same time
+    :return: None
+    """
+
+    client_info_list = apic_em_parallel.ordered_map(lookup_client_ip_info, client_ip_list, workers)
+    for client_ip, client_info in zip(client_ip_list, client_info_list):
+        print_client_ip_info(client_ip, client_info)
+
+
 def get_hostname_id(device_id):
     """
     The function will find out the hostname of the network device with the specified device ID
@@ -123,12 +164,9 @@ def get_hostname_id(device_id):
     """
 
     hostname = None
-    url = 'https://' + APIC_EM + '/network-device/' + device_id
-    header = {'accept': 'application/json', 'X-Auth-Token': APIC_EM_TICKET}
-    hostname_response = requests.get(url, headers=header, verify=False)
-    hostname_json = hostname_response.json()
-    hostname = hostname_json['response']['hostname']
-    device_type = hostname_json['response']['type']
+    device_info = apic_em_client.get_network_device(device_id)
+    hostname = device_info['hostname']
+    device_type = device_info['type']
     return hostname, device_type
 
 
@@ -142,10 +180,28 @@ def main():
     There is a loop that will allow running the validation multiple times, until user input is 'q'
     """
 
+    parser = argparse.ArgumentParser(description='APIC-EM client IP address info')
+    parser.add_argument('ip_addresses', nargs='*', help='IP addresses to check, looked up in parallel')
+    parser.add_argument('--input', help='file with the IP addresses to check')
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help='number of IP addresses looked up at the same time (default %(default)s)')
+    args = parser.parse_args()
+
     # create an auth ticket for APIC-EM
 
-    global APIC_EM_TICKET    # make the ticket a global variable in this module
-    APIC_EM_TICKET = get_service_ticket()
+    get_service_ticket()  # the ticket is saved in the apic_em_client module, and used by all API calls
+
+    # multiple IP addresses, no user input
+
+    client_ip_list = list(args.ip_addresses)
+    if args.input:
+        with open(args.input) as input_file:
+            client_ip_list += apic_em_client.read_addresses(input_file)
+    client_ip_list = list(dict.fromkeys(client_ip_list))  # the duplicates are removed, the order is kept
+    if client_ip_list:
+        apic_em_client.ensure_pool_size(args.workers)
+        check_client_ip_addresses(client_ip_list, args.workers)
+        return
 
     # input IP address for client
 
@@ -3,20 +3,44 @@
 # !/usr/bin/env python3
 
 
-import requests
+import re
 import json
-import csv
-from requests.packages.urllib3.exceptions import InsecureRequestWarning
+import time
+import argparse
+import calendar
+import apic_em_client
+import apic_em_federation
+import apic_em_parallel
+import apic_em_records
+import apic_em_report
+import apic_em_store
 
-requests.packages.urllib3.disable_warnings(InsecureRequestWarning)  # Disable insecure https warnings
+# The controller info, url, username and password, is declared in the apic_em_client module
 
-# Declarations for the controller info. The values will need to change for the proper Sandbox info,
-# or the customer controller
+# Written in the license column when the license info of a device could not be downloaded, so the device is not
+# reported as a device with no active licenses
 
-APIC_EM = 'sandboxapic.cisco.com/api/v1'
-APIC_EM_USER = 'devnetuser'
-APIC_EM_PASSW = 'Cisco123!'
-APIC_EM_TICKET = None
+LICENSE_LOOKUP_FAILED = 'license lookup failed'
+
+# Default number of devices collected at the same time, use --workers to change it
+
+WORKERS = 1
+
+# Incremental mode: the state of the previous run is saved in STATE_PATH, use --state to change it
+# A network device is collected again if one of the CHANGE_MARKERS fields changed, or if it was reloaded: the boot
+# time, computed from upTime, moved by more than BOOT_TIME_TOLERANCE seconds
+
+STATE_PATH = 'apic_em_license_state.db'
+CHANGE_MARKERS = ('serialNumber', 'platformId', 'softwareVersion')
+BOOT_TIME_TOLERANCE = 600
+
+# Network device filters, command line option and network device field. Use them for reports of one family,
+# for example --family 'Unified AP', only the matching network devices are downloaded
+
+DEVICE_FILTERS = [('family', 'family'), ('type', 'type'), ('role', 'role'), ('reachability', 'reachabilityStatus'),
+                  ('platform', 'platformId')]
+
+UP_TIME = re.compile(r'^(?:(\d+) days?,\s*)?(\d+):(\d+):(\d+)(?:\.\d+)?$')
 
 
 def pprint(json_data):
@@ -36,17 +60,13 @@ def get_service_ticket():
     :return: APIC-EM ticket number
     """
 
-    payload = {'username': APIC_EM_USER, 'password': APIC_EM_PASSW}
-    url = 'https://' + APIC_EM + '/ticket'
-    header = {'content-type': 'application/json'}
-    ticket_response = requests.post(url, data=json.dumps(payload), headers=header, verify=False)
-    if not ticket_response:
-        print('Something went wrong, try again!')
-    else:
-        ticket_json = ticket_response.json()
-        ticket = ticket_json['response']['serviceTicket']
-        print('APIC-EM ticket: ', ticket)  # print the ticket for reference only, not required
-        return ticket
+    try:
+        ticket = apic_em_client.get_service_ticket()
+    except apic_em_client.APICEMError as error:
+        print('Something went wrong, try again!', error)
+        raise SystemExit(1)
+    print('APIC-EM ticket: ', ticket)  # print the ticket for reference only, not required
+    return ticket
 
 
 def get_license_device(deviceid):
@@ -54,28 +74,28 @@ def get_license_device(deviceid):
     The function will find out the active licenses of the network device with the specified device ID
     API call to sandboxapic.cisco.com/api/v1//license-info/network-device/{id}
     :param deviceid: APIC-EM network device id
-    :return: license information for the device, as a list with all licenses
-    """
-
-    license_info = []
-    url = 'https://' + APIC_EM + '/license-info/network-device/' + deviceid
-    header = {'accept': 'application/json', 'X-Auth-Token': APIC_EM_TICKET}
-    payload = {'deviceid': deviceid}
-    device_response = requests.get(url, params=payload, headers=header, verify=False)
-    if device_response.status_code == 200:
-        device_json = device_response.json()
-        device_info = device_json['response']
-        # pprint(device_info)    # use this for printing info about each device
-        for licenses in device_info:
-            try:  # required to avoid errors due to some devices, for example Access Points,
-                # that do not have an "inuse" license.
-                if licenses.get('status') == 'INUSE':
-                    new_license = licenses.get('name')
-                    if new_license not in license_info:
-                        license_info.append(new_license)
-            except:
-                pass
-    return license_info
+    :return: license information for the device, as a list with all licenses, [LICENSE_LOOKUP_FAILED] if the
+    license info could not be downloaded
+    """
+
+    try:
+        device_info = apic_em_client.get_license_info(deviceid)
+    except apic_em_client.APICEMError as error:
+        print('No license info for', deviceid, error)
+        return [LICENSE_LOOKUP_FAILED]
+    # pprint(device_info)    # use this for printing info about each device
+    return get_active_licenses(device_info)
+
+
+def get_active_licenses(device_info):
+    """
+    The function will find out the active licenses in the license info of a network device
+    :param device_info: license info, as returned by /license-info/network-device/{id}
+    :return: list with all active licenses
+    """
+
+    # the items that are not license info, for example for some Access Points, are skipped by the parser
+    return apic_em_records.active_license_names(apic_em_records.parse_licenses(device_info))
 
 
 def get_hostname_devicetype_serialnumber(deviceid):
@@ -83,16 +103,17 @@ def get_hostname_devicetype_serialnumber(deviceid):
     The function will find out the hostname of the network device with the specified device ID
     API call to sandboxapic.cisco.com/api/v1/network-device/{id}
     :param deviceid: APIC-EM network device id
-    :return: device hostname, device type, serial number
+    :return: device hostname, device type, serial number, None for all if the controller did not return the info
     """
 
-    url = 'https://' + APIC_EM + '/network-device/' + deviceid
-    header = {'accept': 'application/json', 'X-Auth-Token': APIC_EM_TICKET}
-    hostname_response = requests.get(url, headers=header, verify=False)
-    hostname_json = hostname_response.json()
-    hostname = hostname_json['response']['hostname']
-    device_type = hostname_json['response']['type']
-    serial_number = hostname_json['response']['serialNumber']
+    try:
+        device_info = apic_em_client.get_network_device(deviceid)
+    except apic_em_client.APICEMError as error:
+        print('No device info for', deviceid, error)
+        return None, None, None
+    hostname = device_info['hostname']
+    device_type = device_info['type']
+    serial_number = device_info['serialNumber']
     return hostname, device_type, serial_number
 
 
@@ -107,46 +128,245 @@ def get_input_file():
     return filename
 
 
-def get_device_ids():
+def get_device_ids(**filters):
     """
     The function will build the ID's list for all network devices
     API call to sandboxapic.cisco.com/api/v1/network-device
+    The devices list is kept in the inventory, the hostname and serial number lookups will not call the controller
+    :param filters: optional network device filters, for example family='Unified AP', see DEVICE_FILTERS
     :return: APIC-EM devices id list
     """
     device_id_list = []
-    url = 'https://' + APIC_EM + '/network-device'
-    header = {'accept': 'application/json', 'X-Auth-Token': APIC_EM_TICKET}
-    device_response = requests.get(url, headers=header, verify=False)
-    device_json = device_response.json()
-    device_info = device_json['response']
+    device_info = apic_em_client.preload_device_inventory(**filters)['devices']
     for items in device_info:
         device_id = items.get('id')
         device_id_list.append(device_id)
     return device_id_list
 
 
-def collect_device_info(device_id_list):
+def collect_device_license(device_id):
+    """
+    The function will create the list for one device - hostname, Serial Number, and active licenses
+    :param device_id: APIC-EM network device id
+    :return: device license list
+    """
+
+    license_file = []
+    print('device id ', device_id)  # print device id, printing messages will show progress
+    host_name, device_type, serial_number = get_hostname_devicetype_serialnumber(device_id)
+    license_file.append(host_name)
+    license_file.append(serial_number)
+    device_license = get_license_device(device_id)  # call the function to provide active licenses
+    for licenses in device_license:  # loop to append the provided active licenses to the device list
+        license_file.append(licenses)
+    return license_file
+
+
+def iter_device_info(device_id_list, workers=1, limiter=None):
+    """
+    The function will return the report rows one at a time, the header followed by one row for each device
+    For each device we will have a list that includes - hostname, Serial Number, and active licenses
+    With more than one worker, the devices are collected in parallel, the rows are in the device id list order
+    With the adaptive limiter, the number of API calls in progress follows the controller load, workers is not used
+    :param device_id_list: APIC-EM devices id list
+    :param workers: number of devices collected at the same time
+    :param limiter: optional apic_em_parallel.AdaptiveLimiter
+    :return: generator with the report rows
+    """
+
+    yield ['Hostname', 'Serial Number', 'License 1', 'License 2']
+    if limiter is not None:
+        license_files = apic_em_parallel.adaptive_map(collect_device_license, device_id_list, limiter)
+    else:
+        license_files = apic_em_parallel.ordered_map(collect_device_license, device_id_list, workers)
+    for license_file in license_files:
+        yield license_file
+
+
+def get_boot_time(device_info):
+    """
+    The function will find out when the network device was last reloaded, from the upTime reported by the
+    controller at the last inventory collection of the device (lastUpdateTime, or lastUpdated)
+    :param device_info: network device info, from the /network-device list
+    :return: boot time, seconds since the epoch, None if the upTime format is not known
+    """
+
+    match = UP_TIME.match((device_info.get('upTime') or '').strip())
+    if match is None:
+        return None
+    days, hours, minutes, seconds = [int(value or 0) for value in match.groups()]
+    up_time = ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+    if device_info.get('lastUpdateTime'):
+        collected = int(device_info['lastUpdateTime']) / 1000.0
+    else:
+        try:
+            collected = calendar.timegm(time.strptime(device_info.get('lastUpdated', ''), '%Y-%m-%d %H:%M:%S'))
+        except ValueError:
+            collected = time.time()
+    return collected - up_time
+
+
+def get_change_marker(device_info):
+    """
+    The function will return the change marker of the network device, the CHANGE_MARKERS fields
+    :param device_info: network device info, from the /network-device list
+    :return: change marker, a string
+    """
+
+    return json.dumps([device_info.get(field) for field in CHANGE_MARKERS])
+
+
+def device_changed(device_info, state):
+    """
+    The function will find out if the network device changed since the previous incremental run
+    :param device_info: network device info, from the /network-device list
+    :param state: (change marker, boot time, list of active licenses) saved by the previous run, or None
+    :return: True if the network device is new, changed or was reloaded
+    """
+
+    if state is None:
+        return True
+    marker, boot_time, licenses = state
+    if marker != get_change_marker(device_info):
+        return True
+    new_boot_time = get_boot_time(device_info)
+    if boot_time is None or new_boot_time is None:
+        return boot_time != new_boot_time
+    return abs(new_boot_time - boot_time) > BOOT_TIME_TOLERANCE
+
+
+def collect_device_license_state(device_info):
+    """
+    The function will create the list for one changed device - hostname, Serial Number, and active licenses,
+    and the state saved for the next incremental run
+    :param device_info: network device info, from the /network-device list
+    :return: device license list, and the device state. If the license info could not be collected, the list has
+    LICENSE_LOOKUP_FAILED and the state is None, so the device is collected again by the next run
+    """
+
+    device_id = device_info.get('id')
+    print('device id ', device_id)  # print device id, printing messages will show progress
+    license_file = [device_info.get('hostname'), device_info.get('serialNumber')]
+    try:
+        device_license = get_active_licenses(apic_em_client.get_license_info(device_id))
+    except apic_em_client.APICEMError as error:
+        print('No license info for', device_id, error)
+        return license_file + [LICENSE_LOOKUP_FAILED], None
+    state = (device_id, get_change_marker(device_info), get_boot_time(device_info), device_license)
+    return license_file + device_license, state
+
+
+def iter_device_info_incremental(state_store, workers=1, limiter=None, filters=None):
+    """
+    The function will return the report rows one at a time, the header followed by one row for each device,
+    like iter_device_info(). The license info is collected only for the network devices that are new, changed or
+    were reloaded since the previous run, the other rows are built from the state saved by the previous run
+    The state is updated when all the rows were returned
+    :param state_store: apic_em_store.SnapshotStore with the state of the previous run
+    :param workers: number of devices collected at the same time
+    :param limiter: optional apic_em_parallel.AdaptiveLimiter
+    :param filters: optional network device filters, the state of the other network devices is removed
+    :return: generator with the report rows
+    """
+
+    previous_states = state_store.get_license_states()
+    devices = apic_em_client.preload_device_inventory(**(filters or {}))['devices']
+    counts = {'changed': 0, 'unchanged': 0}
+
+    def collect(device_info):
+        state = previous_states.get(device_info.get('id'))
+        if device_changed(device_info, state):
+            return collect_device_license_state(device_info) + (True,)
+        return [device_info.get('hostname'), device_info.get('serialNumber')] + state[2], None, False
+
+    yield ['Hostname', 'Serial Number', 'License 1', 'License 2']
+    if limiter is not None:
+        license_files = apic_em_parallel.adaptive_map(collect, devices, limiter)
+    else:
+        license_files = apic_em_parallel.ordered_map(collect, devices, workers)
+    new_states = []
+    for license_file, state, changed in license_files:
+        if state is not None:
+            new_states.append(state)
+        counts['changed' if changed else 'unchanged'] += 1
+        yield license_file
+
+    # save the collected devices, and remove the devices not returned by the controller anymore
+    state_store.save_license_states(new_states)
+    removed = set(previous_states) - set(device_info.get('id') for device_info in devices)
+    state_store.remove_license_states(removed)
+    print('Incremental run:', len(devices), 'devices,', counts['changed'], 'new or changed,', counts['unchanged'],
+          'from the previous run,', len(removed), 'removed')
+
+
+def collect_controller_device_info(workers=1, adaptive=None, filters=None, incremental=False, state_path=STATE_PATH):
+    """
+    Federation mode, the function will create the report rows of one controller, it runs in the controller process
+    In incremental mode, each controller has its own state file, the controller name is added to state_path
+    :param workers: number of devices collected at the same time
+    :param adaptive: optional maximum number of API calls in progress, for the adaptive limiter
+    :param filters: optional network device filters
+    :param incremental: collect the license info only for the devices changed since the previous run
+    :param state_path: state file of the incremental runs
+    :return: list with the report rows, the header first
+    """
+
+    # the connection pool needs one connection for each worker
+    apic_em_client.ensure_pool_size(workers)
+    limiter = None
+    if adaptive:
+        limiter = apic_em_parallel.AdaptiveLimiter(max_limit=adaptive)
+    if incremental:
+        state_store = apic_em_store.SnapshotStore(apic_em_federation.controller_path(state_path))
+        try:
+            device_info_rows = list(iter_device_info_incremental(state_store, workers, limiter, filters))
+        finally:
+            state_store.close()
+    else:
+        device_info_rows = list(iter_device_info(get_device_ids(**(filters or {})), workers, limiter))
+    if limiter is not None:
+        print(limiter.report())
+    return device_info_rows
+
+
+def save_federated_device_info(controllers, filename, args, filters):
+    """
+    Federation mode, the function will collect the report rows of all the controllers at the same time, and save
+    one report with the controller name in the first column. A device known by more than one controller is saved
+    once, by serial number, from the first controller in the controllers file
+    :param controllers: list of controllers, from apic_em_federation.load_controllers()
+    :param filename: the CSV file name
+    :param args: command line arguments
+    :param filters: network device filters
+    :return: None
+    """
+
+    results = apic_em_federation.run_on_controllers(controllers, collect_controller_device_info, args.workers,
+                                                    args.adaptive, filters, args.incremental, args.state)
+    header = ['Hostname', 'Serial Number', 'License 1', 'License 2']
+    device_rows, duplicates = apic_em_federation.merge_devices(
+        [(controller, rows and rows[1:]) for controller, rows in results], lambda row: row[1])
+    with apic_em_report.StreamingCSVWriter(filename) as output_writer:
+        output_writer.write_row(['Controller'] + header)
+        for controller_name, devices in device_rows:
+            output_writer.write_row([controller_name] + devices)
+            print('\t'.join([str(info) for info in [controller_name] + devices]))  # print to console
+    print('Federation:', len(controllers), 'controllers,', len(device_rows), 'devices,', duplicates,
+          'devices known by more than one controller saved once')
+
+
+def collect_device_info(device_id_list, workers=1):
     """
     The function will create a list of lists.
     For each device we will have a list that includes - hostname, Serial Number, and active licenses
     The function will require two values, the list with all device id's and the Auth ticket
+    With more than one worker, the devices are collected in parallel, the lists are in the device id list order
     :param device_id_list: APIC-EM devices id list
+    :param workers: number of devices collected at the same time
     :return: all devices license file
     """
 
-    all_devices_license_file = [['Hostname', 'Serial Number', 'License 1', 'License 2']]
-    for device_id in device_id_list:  # loop to collect data from each device
-        license_file = []
-        print('device id ', device_id)  # print device id, printing messages will show progress
-        host_name = get_hostname_devicetype_serialnumber(device_id)[0]
-        serial_number = get_hostname_devicetype_serialnumber(device_id)[2]
-        license_file.append(host_name)
-        license_file.append(serial_number)
-        device_license = get_license_device(device_id)  # call the function to provide active licenses
-        for licenses in device_license:  # loop to append the provided active licenses to the device list
-            license_file.append(licenses)
-        all_devices_license_file.append(license_file)  # append the created list for this device to the list of lists
-    return all_devices_license_file
+    return list(iter_device_info(device_id_list, workers))
 
 
 def main():
@@ -158,26 +378,56 @@ def main():
     :return:
     """
 
-    # create an APIC-EM Auth ticket
-    global APIC_EM_TICKET    # make the ticket a global variable in this module
-    APIC_EM_TICKET = get_service_ticket()
+    parser = argparse.ArgumentParser(description='APIC-EM network devices license inventory')
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help='number of devices collected at the same time (default %(default)s)')
+    parser.add_argument('--adaptive', type=int, metavar='MAX_LIMIT',
+                        help='adapt the number of API calls in progress to the controller load, up to MAX_LIMIT')
+    parser.add_argument('--incremental', action='store_true',
+                        help='collect the license info only for the devices changed since the previous run')
+    parser.add_argument('--state', default=STATE_PATH,
+                        help='state file of the incremental runs (default %(default)s)')
+    parser.add_argument('--controllers', help='federation mode, JSON file with the controllers to collect at the '
+                                              'same time, see apic_em_federation')
+    for option, field in DEVICE_FILTERS:
+        parser.add_argument('--' + option, help='only the network devices with this ' + field)
+    args = parser.parse_args()
+    filters = {field: getattr(args, option) for option, field in DEVICE_FILTERS if getattr(args, option)}
+
+    if args.controllers:
+        controllers = apic_em_federation.read_controllers(args.controllers)
+        save_federated_device_info(controllers, get_input_file(), args, filters)
+        return
+
+    limiter = None
+    if args.adaptive:
+        limiter = apic_em_parallel.AdaptiveLimiter(max_limit=args.adaptive)
+
+    # the connection pool needs one connection for each worker
+    apic_em_client.ensure_pool_size(args.workers)
 
-    # build a list with all device id's
-    device_id_list = get_device_ids()
-    devices_info = collect_device_info(device_id_list)
-    # pprint(devices_info)  # needed for troubleshooting
+    # create an APIC-EM Auth ticket
+    get_service_ticket()  # the ticket is saved in the apic_em_client module, and used by all API calls
 
-    # ask user for filename input and save file
+    # ask user for filename input, each device is saved to the file as soon as it is collected
     filename = get_input_file()
-    output_file = open(filename, 'w', newline='')
-    output_writer = csv.writer(output_file)
-    for lists in devices_info:
-        output_writer.writerow(lists)
-    output_file.close()
-
-    # print to console
-    for devices in devices_info:
-        print('\t'.join([str(info) for info in devices]))
+
+    if args.incremental:
+        # the devices list, with the change markers, is downloaded, the state of the previous run is read from disk
+        state_store = apic_em_store.SnapshotStore(args.state)
+        device_info_rows = iter_device_info_incremental(state_store, args.workers, limiter, filters)
+    else:
+        # build a list with all device id's
+        state_store = None
+        device_info_rows = iter_device_info(get_device_ids(**filters), args.workers, limiter)
+    with apic_em_report.StreamingCSVWriter(filename) as output_writer:
+        for devices in device_info_rows:
+            output_writer.write_row(devices)
+            print('\t'.join([str(info) for info in devices]))  # print to console
+    if state_store is not None:
+        state_store.close()
+    if limiter is not None:
+        print(limiter.report())
 
 
 if __name__ == '__main__':
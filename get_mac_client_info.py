@@ -3,19 +3,25 @@
 # !/usr/bin/env python3
 
 
-import requests
+import sys
 import json
-from requests.packages.urllib3.exceptions import InsecureRequestWarning
+import argparse
+import apic_em_client
+import apic_em_federation
+import apic_em_mac_index
+import apic_em_parallel
+import apic_em_report
 
-requests.packages.urllib3.disable_warnings(InsecureRequestWarning)  # Disable insecure https warnings
+# The controller info, url, username and password, is declared in the apic_em_client module
 
-# Declarations for the controller info. The values will need to change for the proper Sandbox info,
-# or the customer controller
+# Default number of MAC addresses looked up at the same time, when checking multiple MAC addresses
 
-APIC_EM = 'sandboxapic.cisco.com/api/v1'
-APIC_EM_USER = 'devnetuser'
-APIC_EM_PASSW = 'Cisco123!'
-APIC_EM_TICKET = None
+WORKERS = 8
+
+# Bulk mode result columns
+
+RESULT_FIELDS = ['mac_address', 'normalized_mac', 'client_used', 'client_ip', 'client_type', 'client_vlan',
+                 'client_device', 'client_device_type', 'client_interface', 'error']
 
 # wired client mac address: 5c:f9:dd:52:07:78
 # wired client mac address: e8:9a:8f:7a:22:99
@@ -39,17 +45,13 @@ def get_service_ticket():
     :return: ticket
     """
 
-    payload = {'username': APIC_EM_USER, 'password': APIC_EM_PASSW}
-    url = 'https://' + APIC_EM + '/ticket'
-    header = {'content-type': 'application/json'}
-    ticket_response = requests.post(url, data=json.dumps(payload), headers=header, verify=False)
-    if not ticket_response:
-        print('No data returned!')
-    else:
-        ticket_json = ticket_response.json()
-        ticket = ticket_json['response']['serviceTicket']
-        print('Created APIC-EM ticket: ', ticket)
-        return ticket
+    try:
+        ticket = apic_em_client.get_service_ticket()
+    except apic_em_client.APICEMError as error:
+        print('No data returned!', error)
+        raise SystemExit(1)
+    print('Created APIC-EM ticket: ', ticket)
+    return ticket
 
 
 def get_input_mac():
@@ -63,26 +65,61 @@ def get_input_mac():
     return mac_address
 
 
-def check_client_mac_address(client_mac):
+def get_client_mac_info(client_mac):
     """
-    The function will find out if APIC-EM has a client device configured with the specified MAC address.
-    API call to /host
-    It will print if a client device exists or not.
+    The function will find out if APIC-EM has a client device configured with the specified MAC address,
+    and the network device the client is connected to
+    API call to /host, and to /network-device/{id}
     :param client_mac: client MAC address
-    :return: None
+    :return: the 'response' value of /host (a list of hosts, or a dictionary with the error messages if the MAC
+    address format is not correct), the network device hostname and type
     """
 
-    url = 'https://' + APIC_EM + '/host'
-    header = {'accept': 'application/json', 'X-Auth-Token': APIC_EM_TICKET}
-    payload = {'hostMac': client_mac}
-    host_response = requests.get(url, params=payload, headers=header, verify=False)
-    host_json = host_response.json()
+    # the MAC address format is validated before the API call, the controller needs aa:bb:cc:dd:ee:ff
+    normalized_mac = apic_em_mac_index.normalize_mac(client_mac)
+    if normalized_mac is None:
+        return {'message': 'Invalid MAC address format'}, None, None
+    host_json = apic_em_client.get_hosts(hostMac=normalized_mac)
 
     # pprint(host_json)  # needed for troubleshooting
 
+    hostname = device_type = None
+    if host_json and type(host_json) is list:
+        hostname, device_type = get_hostname_id(host_json[0]['connectedNetworkDeviceId'])
+    return host_json, hostname, device_type
+
+
+def lookup_client_mac_info(client_mac):
+    """
+    The function will call get_client_mac_info, and return the API call error instead of raising it, so one MAC
+    address that fails does not stop the lookup of the other MAC addresses
+    :param client_mac: client MAC address
+    :return: the result of get_client_mac_info, or the APICEMError
+    """
+
+    try:
+        return get_client_mac_info(client_mac)
+    except apic_em_client.APICEMError as error:
+        return error
+
+
+def print_client_mac_info(client_mac, client_info):
+    """
+    The function will print if a client device uses the MAC address, the network device it is connected to,
+    and the client IP address
+    :param client_mac: client MAC address
+    :param client_info: the result of get_client_mac_info, or the APICEMError if the MAC address could not be checked
+    :return: None
+    """
+
+    if isinstance(client_info, apic_em_client.APICEMError):
+        print('The MAC address', client_mac, 'could not be checked:', client_info)
+        return
+    host_json, hostname, device_type = client_info
+
     # verification if client found or not
 
-    if not host_json['response']:
+    if not host_json:
         print('The MAC address', client_mac, 'is not used by any client devices')
     else:
 
@@ -90,9 +127,9 @@ def check_client_mac_address(client_mac):
         # if MAC address is formatted correct, the 'response' is a list, with one item
         # if MAC address is incorrect formatted, the 'response' is a dictionary, with the error messages
 
-        if type(host_json['response']) is list:
+        if type(host_json) is list:
             print('The MAC address', client_mac, 'is used by a client device')
-            host_info = host_json['response'][0]
+            host_info = host_json[0]
             host_type = host_info['hostType']
             host_vlan = host_info['vlanId']
             host_ip = host_info['hostIp']
@@ -103,9 +140,6 @@ def check_client_mac_address(client_mac):
 
                 # info for wireless clients
 
-                apic_em_device_id = host_info['connectedNetworkDeviceId']
-                hostname = get_hostname_id(apic_em_device_id)[0]
-                device_type = get_hostname_id(apic_em_device_id)[1]
                 print('The MAC address', client_mac, ', is connected to the network device:', hostname, ', model:',
                       device_type, ', interface VLAN:', host_vlan)
             else:
@@ -113,9 +147,6 @@ def check_client_mac_address(client_mac):
                 # info for ethernet connected clients
 
                 interface_name = host_info['connectedInterfaceName']
-                apic_em_device_id = host_info['connectedNetworkDeviceId']
-                hostname = get_hostname_id(apic_em_device_id)[0]
-                device_type = get_hostname_id(apic_em_device_id)[1]
                 print('The MAC address', client_mac, ', is connected to the network device:', hostname, ', model:',
                       device_type, ', interface:', interface_name, ', VLAN:', host_vlan)
             print('The client with the MAC address', client_mac, 'has the IP address:', host_ip)
@@ -123,6 +154,206 @@ def check_client_mac_address(client_mac):
             print('The MAC address', client_mac, 'is not in correct format')
 
 
+def check_client_mac_address(client_mac):
+    """
+    The function will find out if APIC-EM has a client device configured with the specified MAC address.
+    API call to /host
+    It will print if a client device exists or not.
+    :param client_mac: client MAC address
+    :return: None
+    """
+
+    print_client_mac_info(client_mac, get_client_mac_info(client_mac))
+
+
+def check_client_mac_addresses(client_mac_list, workers=WORKERS):
+    """
+    The function will check multiple MAC addresses, looked up in parallel, and print the result for each MAC address,
+    in the list order
+    The clients connected to the same network device share one /network-device/{id} API call. A MAC address that
+    could not be checked has the error printed, the other MAC addresses are still checked
+    :param client_mac_list: list of client MAC addresses
+    :param workers: number of MAC addresses looked up at the same time
+    :return: None
+    """
+
+    client_info_list = apic_em_parallel.ordered_map(lookup_client_mac_info, client_mac_list, workers)
+    for client_mac, client_info in zip(client_mac_list, client_info_list):
+        print_client_mac_info(client_mac, client_info)
+
+
+def check_mac_usage(client_mac, snapshot=None):
+    """
+    The function will find out if a client device uses the MAC address, with the MAC address snapshot if provided,
+    or with API calls to /host and /network-device/{id}
+    :param client_mac: MAC address, in any format
+    :param snapshot: optional MAC address snapshot, answers without API calls
+    :return: dictionary with the RESULT_FIELDS, the 'error' value is set if the MAC address format is not valid
+    """
+
+    normalized_mac = apic_em_mac_index.normalize_mac(client_mac)
+    mac_usage = dict.fromkeys(RESULT_FIELDS, None)
+    mac_usage.update({'mac_address': client_mac, 'normalized_mac': normalized_mac, 'client_used': False})
+    if normalized_mac is None:
+        mac_usage['error'] = 'Invalid MAC address format'
+        return mac_usage
+    if snapshot is not None:
+        entry = snapshot.lookup(normalized_mac)
+        if entry is None:
+            return mac_usage
+        host_ip, host_type, host_vlan, device_id, interface_name = entry
+        hostname, device_type = snapshot.get_device(device_id)
+    else:
+        host_json, hostname, device_type = get_client_mac_info(normalized_mac)
+        if not host_json or type(host_json) is not list:
+            return mac_usage
+        host_info = host_json[0]
+        host_ip, host_type, host_vlan = host_info.get('hostIp'), host_info.get('hostType'), host_info.get('vlanId')
+        interface_name = host_info.get('connectedInterfaceName')
+    mac_usage.update({'client_used': True, 'client_ip': host_ip, 'client_type': host_type, 'client_vlan': host_vlan,
+                      'client_device': hostname, 'client_device_type': device_type,
+                      'client_interface': interface_name})
+    return mac_usage
+
+
+def check_mac_batch(mac_list, output_writer, output_format, snapshot):
+    """
+    The function will resolve all the MAC addresses with the MAC address snapshot, and write one row for each
+    distinct MAC address, in the input order. The MAC addresses with a format that is not valid have an error
+    :param mac_list: list of MAC addresses, in any format
+    :param output_writer: streaming CSV or JSON Lines writer
+    :param output_format: csv or jsonl
+    :param snapshot: MAC address snapshot
+    :return: number of MAC addresses checked, used by a client, and not valid
+    """
+
+    checked_count = used_count = invalid_count = 0
+    if output_format == 'csv':
+        output_writer.write_row(RESULT_FIELDS)
+    for client_mac, normalized_mac in apic_em_mac_index.normalize_mac_list(mac_list):
+        mac_usage = check_mac_usage(client_mac, snapshot)
+        checked_count += 1
+        if normalized_mac is None:
+            invalid_count += 1
+        elif mac_usage['client_used']:
+            used_count += 1
+        if output_format == 'csv':
+            output_writer.write_row(['' if mac_usage[field] is None else mac_usage[field] for field in RESULT_FIELDS])
+        else:
+            output_writer.write_row(mac_usage)
+    return checked_count, used_count, invalid_count
+
+
+def build_snapshot():
+    """
+    The function will build the MAC address snapshot, the messages are printed to the standard error
+    :return: MAC address snapshot
+    """
+
+    print('Building the MAC address snapshot...', file=sys.stderr)
+    snapshot = apic_em_mac_index.MACSnapshot()
+    snapshot.refresh()
+    print('MAC address snapshot built,', len(snapshot), 'client MAC addresses', file=sys.stderr)
+    return snapshot
+
+
+def check_controller_macs(mac_list):
+    """
+    Federation mode, the function will resolve the MAC addresses on one controller with the MAC address snapshot,
+    it runs in the controller process
+    :param mac_list: list of MAC addresses, in any format
+    :return: list of dictionaries with the RESULT_FIELDS for each MAC address, in the list order
+    """
+
+    snapshot = build_snapshot()
+    return [check_mac_usage(client_mac, snapshot) for client_mac in mac_list]
+
+
+def controller_failed_mac_usage(client_mac):
+    """
+    Federation mode, the function will return the result of a MAC address not checked because the controller failed
+    :param client_mac: MAC address, in any format
+    :return: dictionary with the RESULT_FIELDS, the 'error' value is set
+    """
+
+    mac_usage = dict.fromkeys(RESULT_FIELDS, None)
+    mac_usage.update({'mac_address': client_mac, 'normalized_mac': apic_em_mac_index.normalize_mac(client_mac),
+                      'client_used': False, 'error': apic_em_federation.CONTROLLER_FAILED})
+    return mac_usage
+
+
+def check_federated_mac_batch(controllers, mac_list, output_writer, output_format):
+    """
+    Federation mode, the function will resolve the MAC addresses on all the controllers at the same time, and
+    write one row for each distinct MAC address and controller using it, with the controller name in the first
+    column. A MAC address not used has one row, with no controller name. A controller that failed has one row for
+    each MAC address, with the error
+    :param controllers: list of controllers, from apic_em_federation.load_controllers()
+    :param mac_list: list of MAC addresses, in any format
+    :param output_writer: streaming CSV or JSON Lines writer
+    :param output_format: csv or jsonl
+    :return: number of MAC addresses checked, used by a client, and not valid
+    """
+
+    normalized_list = apic_em_mac_index.normalize_mac_list(mac_list)
+    client_mac_list = [client_mac for client_mac, normalized_mac in normalized_list]
+    results = apic_em_federation.run_on_controllers(controllers, check_controller_macs, client_mac_list)
+    mac_usage_list = apic_em_federation.merge_lookups(results, lambda mac_usage: mac_usage['client_used'],
+                                                      client_mac_list, controller_failed_mac_usage)
+    if output_format == 'csv':
+        output_writer.write_row(['controller'] + RESULT_FIELDS)
+    used_macs = set()
+    for controller_name, mac_usage in mac_usage_list:
+        if mac_usage['client_used']:
+            used_macs.add(mac_usage['normalized_mac'])
+        if output_format == 'csv':
+            output_writer.write_row([controller_name] + ['' if mac_usage[field] is None else mac_usage[field]
+                                                         for field in RESULT_FIELDS])
+        else:
+            output_writer.write_row(dict(mac_usage, controller=controller_name))
+    invalid_count = len([client_mac for client_mac, normalized_mac in normalized_list if normalized_mac is None])
+    return len(normalized_list), len(used_macs), invalid_count
+
+
+def run_batch(args):
+    """
+    Bulk mode, the MAC addresses are read from the input file, resolved locally with one download of all the
+    hosts, and the result is written to the output file
+    The messages are printed to the standard error, so the standard output may be used for the result
+    :param args: command line arguments
+    :return: None
+    """
+
+    controllers = None
+    if args.controllers:
+        controllers = apic_em_federation.read_controllers(args.controllers, sys.stderr)
+    else:
+        try:
+            apic_em_client.get_service_ticket()
+        except apic_em_client.APICEMError as error:
+            print('No data returned!', error, file=sys.stderr)
+            raise SystemExit(1)
+    if args.input == '-':
+        mac_list = apic_em_client.read_addresses(sys.stdin)
+    else:
+        with open(args.input) as input_file:
+            mac_list = apic_em_client.read_addresses(input_file)
+    snapshot = None if controllers else build_snapshot()
+    if args.format == 'csv':
+        output_writer = apic_em_report.StreamingCSVWriter(args.output)
+    else:
+        output_writer = apic_em_report.StreamingJSONLinesWriter(args.output)
+    with output_writer:
+        if controllers:
+            checked_count, used_count, invalid_count = check_federated_mac_batch(controllers, mac_list, output_writer,
+                                                                                 args.format)
+        else:
+            checked_count, used_count, invalid_count = check_mac_batch(mac_list, output_writer, args.format,
+                                                                       snapshot)
+    print('Checked', checked_count, 'MAC addresses,', used_count, 'in use,', invalid_count, 'not valid',
+          file=sys.stderr)
+
+
 def get_hostname_id(device_id):
     """
     The function will find out the hostname of the network device with the specified device ID
@@ -133,12 +364,9 @@ def get_hostname_id(device_id):
     :return:
     """
 
-    url = 'https://' + APIC_EM + '/network-device/' + device_id
-    header = {'accept': 'application/json', 'X-Auth-Token': APIC_EM_TICKET}
-    hostname_response = requests.get(url, headers=header, verify=False)
-    hostname_json = hostname_response.json()
-    hostname = hostname_json['response']['hostname']
-    device_type = hostname_json['response']['type']
+    device_info = apic_em_client.get_network_device(device_id)
+    hostname = device_info['hostname']
+    device_type = device_info['type']
     return hostname, device_type
 
 
@@ -152,10 +380,31 @@ def main():
     There is a loop that will allow running the validation multiple times, until user input is 'q'
     """
 
+    parser = argparse.ArgumentParser(description='APIC-EM client MAC address info')
+    parser.add_argument('mac_addresses', nargs='*', help='MAC addresses to check, looked up in parallel')
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help='number of MAC addresses looked up at the same time (default %(default)s)')
+    parser.add_argument('--input', help='bulk mode, file with the MAC addresses to check, - for the standard input')
+    parser.add_argument('--output', default='-', help='bulk mode, result file (default standard output)')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv', help='bulk mode, result format')
+    parser.add_argument('--controllers', help='bulk mode, federation, JSON file with the controllers to check at '
+                                              'the same time, see apic_em_federation')
+    args = parser.parse_args()
+
+    if args.input:
+        run_batch(args)  # bulk mode, no user input
+        return
+
     # create an auth ticket for APIC-EM
 
-    global APIC_EM_TICKET    # make the ticket a global variable in this module
-    APIC_EM_TICKET = get_service_ticket()
+    get_service_ticket()  # the ticket is saved in the apic_em_client module, and used by all API calls
+
+    # multiple MAC addresses, no user input
+
+    if args.mac_addresses:
+        apic_em_client.ensure_pool_size(args.workers)
+        check_client_mac_addresses(args.mac_addresses, args.workers)
+        return
 
     # input MAC address for client
 
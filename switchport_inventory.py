@@ -3,20 +3,34 @@
 # !/usr/bin/env python3
 
 
-import requests
 import json
-import csv
-from requests.packages.urllib3.exceptions import InsecureRequestWarning
+import argparse
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import apic_em_client
+import apic_em_federation
+import apic_em_parallel
+import apic_em_records
+import apic_em_report
 
-requests.packages.urllib3.disable_warnings(InsecureRequestWarning)  # Disable insecure https warnings
+# The controller info, url, username and password, is declared in the apic_em_client module
 
-# Declarations for the controller info. The values will need to change for the proper Sandbox info,
-# or the customer controller
+# Written in the license column when the license info of a device could not be downloaded, so the device is not
+# reported as a device with no active licenses
 
-APIC_EM = 'sandboxapic.cisco.com/api/v1'
-APIC_EM_USER = 'devnetuser'
-APIC_EM_PASSW = 'Cisco123!'
-APIC_EM_TICKET = None
+LICENSE_LOOKUP_FAILED = 'license lookup failed'
+
+# Limits for the async engine: API calls in progress at the same time, and connections open to the controller
+
+MAX_IN_FLIGHT = 32
+LIMIT_PER_HOST = 10
+
+# Client devices connected to each switchport, (switch id, interface name): list of apic_em_records.Host, loaded
+# once with load_switchport_clients(). When loaded, each switchport line has the MAC addresses, IP addresses and
+# VLANs of the connected clients, without one /host API call for each switchport
+
+_switchport_clients = None
 
 
 def pprint(json_data):
@@ -36,17 +50,13 @@ def get_service_ticket():
     :return: APIC-EM ticket number
     """
 
-    payload = {'username': APIC_EM_USER, 'password': APIC_EM_PASSW}
-    url = 'https://' + APIC_EM + '/ticket'
-    header = {'content-type': 'application/json'}
-    ticket_response = requests.post(url, data=json.dumps(payload), headers=header, verify=False)
-    if not ticket_response:
-        print('Something went wrong, try again!')
-    else:
-        ticket_json = ticket_response.json()
-        ticket = ticket_json['response']['serviceTicket']
-        print('APIC-EM ticket: ', ticket)  # print the ticket for reference only, not required
-        return ticket
+    try:
+        ticket = apic_em_client.get_service_ticket()
+    except apic_em_client.APICEMError as error:
+        print('Something went wrong, try again!', error)
+        raise SystemExit(1)
+    print('APIC-EM ticket: ', ticket)  # print the ticket for reference only, not required
+    return ticket
 
 
 def get_license_device(deviceid):
@@ -54,28 +64,18 @@ def get_license_device(deviceid):
     The function will find out the active licenses of the network device with the specified device ID
     API call to sandboxapic.cisco.com/api/v1//license-info/network-device/{id}
     :param deviceid: APIC-EM network device id
-    :return: license information for the device, as a list with all licenses
-    """
-
-    license_info = []
-    url = 'https://' + APIC_EM + '/license-info/network-device/' + deviceid
-    header = {'accept': 'application/json', 'X-Auth-Token': APIC_EM_TICKET}
-    payload = {'deviceid': deviceid}
-    device_response = requests.get(url, params=payload, headers=header, verify=False)
-    if device_response.status_code == 200:
-        device_json = device_response.json()
-        device_info = device_json['response']
-        # pprint(device_info)    # use this for printing info about each device
-        for licenses in device_info:
-            try:  # required to avoid errors due to some devices, for example Access Points,
-                # that do not have an "inuse" license.
-                if licenses.get('status') == 'INUSE':
-                    new_license = licenses.get('name')
-                    if new_license not in license_info:
-                        license_info.append(new_license)
-            except:
-                pass
-    return license_info
+    :return: license information for the device, as a list with all licenses, [LICENSE_LOOKUP_FAILED] if the
+    license info could not be downloaded
+    """
+
+    try:
+        device_info = apic_em_client.get_license_info(deviceid)
+    except apic_em_client.APICEMError as error:
+        print('No license info for', deviceid, error)
+        return [LICENSE_LOOKUP_FAILED]
+    # pprint(device_info)    # use this for printing info about each device
+    # the items that are not license info, for example for some Access Points, are skipped by the parser
+    return apic_em_records.active_license_names(apic_em_records.parse_licenses(device_info))
 
 
 def get_hostname_devicetype_serialnumber(deviceid):
@@ -83,16 +83,17 @@ def get_hostname_devicetype_serialnumber(deviceid):
     The function will find out the hostname of the network device with the specified device ID
     API call to sandboxapic.cisco.com/api/v1/network-device/{id}
     :param deviceid: APIC-EM network device id
-    :return: device hostname, device type, serial number
+    :return: device hostname, device type, serial number, None for all if the controller did not return the info
     """
 
-    url = 'https://' + APIC_EM + '/network-device/' + deviceid
-    header = {'accept': 'application/json', 'X-Auth-Token': APIC_EM_TICKET}
-    hostname_response = requests.get(url, headers=header, verify=False)
-    hostname_json = hostname_response.json()
-    hostname = hostname_json['response']['hostname']
-    device_type = hostname_json['response']['type']
-    serial_number = hostname_json['response']['serialNumber']
+    try:
+        device_info = apic_em_client.get_network_device(deviceid)
+    except apic_em_client.APICEMError as error:
+        print('No device info for', deviceid, error)
+        return None, None, None
+    hostname = device_info['hostname']
+    device_type = device_info['type']
+    serial_number = device_info['serialNumber']
     return hostname, device_type, serial_number
 
 
@@ -111,36 +112,79 @@ def get_switch_ids():
     """
     The function will build the ID's list for all network switches
     API call to sandboxapic.cisco.com/api/v1/network-device
+    The switches are kept in the inventory, the hostname and serial number lookups will not call the controller.
+    The family filter is sent to the controller, only the switches are downloaded
     :return: network switches APIC-EM id list
     """
 
-    device_id_list = []
-    url = 'https://' + APIC_EM + '/network-device'
-    header = {'accept': 'application/json', 'X-Auth-Token': APIC_EM_TICKET}
-    device_response = requests.get(url, headers=header, verify=False)
-    device_json = device_response.json()
-    device_info = device_json['response']
-    for items in device_info:
-        if items.get('family') == 'Switches and Hubs':
-            device_id = items.get('id')
-            device_id_list.append(device_id)
+    inventory = apic_em_client.preload_device_inventory(family='Switches and Hubs')
+    device_id_list = list(inventory['by_family'].get('Switches and Hubs', []))
     return device_id_list
 
 
+def load_switchport_clients():
+    """
+    The function will download all the client devices, with one paged /host download, and index them by the
+    switch id and interface they are connected to. The following switchport lines have the connected clients
+    API call to sandboxapic.cisco.com/api/v1/host/{startIndex}/{recordsToReturn}
+    :return: number of client devices connected to a network device interface
+    """
+
+    global _switchport_clients
+    switchport_clients = {}
+    for host in map(apic_em_records.parse_host, apic_em_client.iter_hosts(prefetch=True)):
+        if host.device_id and host.interface_name:
+            switchport_clients.setdefault((host.device_id, host.interface_name), []).append(host)
+    _switchport_clients = switchport_clients
+    return sum(len(hosts) for hosts in switchport_clients.values())
+
+
+def preload_switchport_clients():
+    """
+    The function will load the client devices connected to the switchports, see load_switchport_clients()
+    If the client devices could not be downloaded, the switchport lines will not have the connected clients
+    :return: None
+    """
+
+    try:
+        client_count = load_switchport_clients()
+    except apic_em_client.APICEMError as error:
+        print('No client info, the switchports are saved without the connected clients', error)
+        return
+    print('Client devices connected to the switchports: ', client_count)
+
+
+def get_switchport_clients(device_id, port_name):
+    """
+    The function will find out the client devices connected to the switchport, in the index loaded by
+    load_switchport_clients()
+    :param device_id: APIC-EM switch id
+    :param port_name: switchport name, for example GigabitEthernet1/0/1
+    :return: list with the MAC addresses, the IP addresses and the VLANs of the clients, each one separated by
+    spaces, in the same client order, empty if no client is connected
+    """
+
+    hosts = _switchport_clients.get((device_id, port_name), [])
+    return [' '.join(host.mac_address or '' for host in hosts), ' '.join(host.ip_address or '' for host in hosts),
+            ' '.join(host.vlan_id or '' for host in hosts)]
+
+
 def collect_switchport_info(device_id):
     """
     This function will create an inventory of all switchports and relevant information for each switchport
     Call to /interface/network-device/{deviceId}
+    When the clients were loaded with load_switchport_clients(), each switchport has the connected clients MAC
+    addresses, IP addresses and VLANs, see get_switchport_clients()
     :param device_id: APIC-EM switch id
     :return: list with all the relevant info for each switchport
     """
 
     all_switchport_info_list=[]
-    url = 'https://' + APIC_EM + '/interface/network-device/' + device_id
-    header = {'accept': 'application/json', 'X-Auth-Token': APIC_EM_TICKET}
-    switch_response = requests.get(url, headers=header, verify=False)
-    switch_response = switch_response.json()
-    switch_info = switch_response['response']
+    try:
+        switch_info = apic_em_client.get_interfaces_by_device(device_id)
+    except apic_em_client.APICEMError as error:
+        print('No switchport info for', device_id, error)
+        return all_switchport_info_list
     # pprint(switch_info)
     for ports in switch_info:
         port_info_list = []
@@ -149,11 +193,67 @@ def collect_switchport_info(device_id):
             port_info_list.append(ports.get('portMode'))
             port_info_list.append(ports.get('nativeVlanId'))
             port_info_list.append(ports.get('voiceVlan'))
+            if _switchport_clients is not None:
+                port_info_list.extend(get_switchport_clients(device_id, ports.get('portName')))
         all_switchport_info_list.append(port_info_list)
         # pprint(all_switchport_info_list)  # may be required for troubleshooting
     return all_switchport_info_list
 
 
+def build_switch_info(host_name, serial_number, device_license, switchport_info_list):
+    """
+    The function will create the lists for one switch: hostname, Serial Number and active licenses,
+    followed by one list for each switchport, and an empty line
+    :param host_name: switch hostname
+    :param serial_number: switch serial number
+    :param device_license: list with the active licenses
+    :param switchport_info_list: list with the info for each switchport
+    :return: the lists for the switch
+    """
+
+    switch_info_list = []
+    info_list = [host_name, serial_number]
+    for licenses in device_license:  # loop to append the provided active licenses to the device list
+        info_list.append(licenses)
+    switch_info_list.append(info_list)  # append the created list for this device to the list of lists
+    for switchports in switchport_info_list:
+        switch_info_list.append(switchports)
+    switch_info_list.append('')
+    return switch_info_list
+
+
+def collect_switch(device_id):
+    """
+    The function will create the lists for one switch, see build_switch_info
+    :param device_id: APIC-EM switch id
+    :return: the lists for the switch
+    """
+
+    print('device id ', device_id)  # print device id, printing messages will show progress
+    host_name, device_type, serial_number = get_hostname_devicetype_serialnumber(device_id)
+    device_license = get_license_device(device_id)  # call the function to provide active licenses
+    switchport_info_list = collect_switchport_info(device_id)
+    return build_switch_info(host_name, serial_number, device_license, switchport_info_list)
+
+
+def iter_switch_info(device_id_list, limiter=None):
+    """
+    The function will return the lists for each switch, one switch at a time
+    With the adaptive limiter, the switches are collected in parallel, the number of API calls in progress follows
+    the controller load. The lists are in the device id list order
+    :param device_id_list: APIC-EM devices id list
+    :param limiter: optional apic_em_parallel.AdaptiveLimiter
+    :return: generator with the lists for each switch
+    """
+
+    if limiter is not None:
+        for switch_info_list in apic_em_parallel.adaptive_map(collect_switch, device_id_list, limiter):
+            yield switch_info_list
+        return
+    for device_id in device_id_list:  # loop to collect data from each device
+        yield collect_switch(device_id)
+
+
 def collect_switch_info(device_id_list):
     """
     The function will create a list of lists.
@@ -164,51 +264,184 @@ def collect_switch_info(device_id_list):
     """
 
     all_switches_info_list = []
-    for device_id in device_id_list:  # loop to collect data from each device
-        info_list = []
-        print('device id ', device_id)  # print device id, printing messages will show progress
-        host_name = get_hostname_devicetype_serialnumber(device_id)[0]
-        serial_number = get_hostname_devicetype_serialnumber(device_id)[2]
-        info_list.append(host_name)
-        info_list.append(serial_number)
-        device_license = get_license_device(device_id)  # call the function to provide active licenses
-        for licenses in device_license:  # loop to append the provided active licenses to the device list
-            info_list.append(licenses)
-        all_switches_info_list.append(info_list)  # append the created list for this device to the list of lists
-        switchport_info_list = collect_switchport_info(device_id)
-        for switchports in switchport_info_list:
-            all_switches_info_list.append(switchports)
-        all_switches_info_list.append('')
+    for switch_info_list in iter_switch_info(device_id_list):
+        all_switches_info_list.extend(switch_info_list)
     return all_switches_info_list
 
 
+async def iter_switch_info_async(device_id_list, max_in_flight=MAX_IN_FLIGHT, limit_per_host=LIMIT_PER_HOST):
+    """
+    The asyncio engine for iter_switch_info. The hostname, license and switchport API calls of the switches
+    run at the same time. The lists are the same, and in the same order, as the ones from iter_switch_info
+    Up to 2 x max_in_flight switches are collected ahead of the switch being returned, the memory used does not
+    grow with the number of switches
+    The API calls use the shared connection pool, they run in a thread pool so the event loop is not blocked
+    :param device_id_list: APIC-EM devices id list
+    :param max_in_flight: maximum number of API calls in progress at the same time, for all switches
+    :param limit_per_host: maximum number of connections open to the controller
+    :return: async generator with the lists for each switch
+    """
+
+    if limit_per_host != apic_em_client.POOL_SIZE:
+        apic_em_client.set_pool_size(limit_per_host)
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=max_in_flight)
+    in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def call(function, device_id):
+        async with in_flight:
+            return await loop.run_in_executor(executor, function, device_id)
+
+    async def collect_switch_async(device_id):
+        print('device id ', device_id)  # print device id, printing messages will show progress
+        hostname_info, device_license, switchport_info_list = await asyncio.gather(
+            call(get_hostname_devicetype_serialnumber, device_id),
+            call(get_license_device, device_id),
+            call(collect_switchport_info, device_id))
+        return build_switch_info(hostname_info[0], hostname_info[2], device_license, switchport_info_list)
+
+    pending = deque()
+    try:
+        for device_id in device_id_list:
+            pending.append(asyncio.ensure_future(collect_switch_async(device_id)))
+            if len(pending) >= 2 * max_in_flight:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+        executor.shutdown(wait=False)
+
+
+async def save_switch_info_async(output_writer, device_id_list, max_in_flight, limit_per_host):
+    """
+    The function will save the lists for each switch as soon as the switch is collected, using the asyncio engine
+    :param output_writer: streaming CSV writer
+    :param device_id_list: APIC-EM devices id list
+    :param max_in_flight: maximum number of API calls in progress at the same time, for all switches
+    :param limit_per_host: maximum number of connections open to the controller
+    :return: None
+    """
+
+    async for switch_info_list in iter_switch_info_async(device_id_list, max_in_flight, limit_per_host):
+        output_writer.write_rows(switch_info_list)
+
+
+async def list_switch_info_async(device_id_list, max_in_flight=MAX_IN_FLIGHT, limit_per_host=LIMIT_PER_HOST):
+    """
+    The asyncio engine, the function will return the lists for each switch, see iter_switch_info_async
+    :param device_id_list: APIC-EM devices id list
+    :param max_in_flight: maximum number of API calls in progress at the same time, for all switches
+    :param limit_per_host: maximum number of connections open to the controller
+    :return: list with the lists for each switch
+    """
+
+    return [switch_info_list async for switch_info_list in
+            iter_switch_info_async(device_id_list, max_in_flight, limit_per_host)]
+
+
+def collect_controller_switches(engine='serial', max_in_flight=MAX_IN_FLIGHT, limit_per_host=LIMIT_PER_HOST,
+                                clients=True):
+    """
+    Federation mode, the function will create the lists for each switch of one controller, it runs in the
+    controller process
+    :param engine: serial, async or adaptive
+    :param max_in_flight: async and adaptive engines, maximum number of API calls in progress
+    :param limit_per_host: async engine, maximum number of connections to the controller
+    :param clients: add the connected clients to the switchport lines
+    :return: list with the lists for each switch, see build_switch_info
+    """
+
+    if clients:
+        preload_switchport_clients()
+    switch_id_list = get_switch_ids()
+    if engine == 'async':
+        return asyncio.run(list_switch_info_async(switch_id_list, max_in_flight, limit_per_host))
+    if engine == 'adaptive':
+        limiter = apic_em_parallel.AdaptiveLimiter(max_limit=max_in_flight)
+        switch_info = list(iter_switch_info(switch_id_list, limiter))
+        print(limiter.report())
+        return switch_info
+    return list(iter_switch_info(switch_id_list))
+
+
+def save_federated_switch_info(controllers, filename, args):
+    """
+    Federation mode, the function will collect the switches of all the controllers at the same time, and save one
+    report with the controller name in the first column of each switch and switchport line. A switch known by more
+    than one controller is saved once, by serial number, from the first controller in the controllers file
+    :param controllers: list of controllers, from apic_em_federation.load_controllers()
+    :param filename: the CSV file name
+    :param args: command line arguments
+    :return: None
+    """
+
+    results = apic_em_federation.run_on_controllers(controllers, collect_controller_switches, args.engine,
+                                                    args.max_in_flight, args.limit_per_host, not args.no_clients)
+    switches, duplicates = apic_em_federation.merge_devices(results, lambda switch_info_list: switch_info_list[0][1])
+    with apic_em_report.StreamingCSVWriter(filename) as output_writer:
+        for controller_name, switch_info_list in switches:
+            output_writer.write_rows([[controller_name] + list(info) if info else info for info in switch_info_list])
+    print('Federation:', len(controllers), 'controllers,', len(switches), 'switches,', duplicates,
+          'switches known by more than one controller saved once')
+
+
 def main():
     """
     This application will create a list of all the APIC-EM discovered network switches, their serial numbers and
     active software licenses.
-    We will append to each switch an inventory for each access port: native VLAN, voice VLAN, MAC address connected
-    to each switchport, etc.
+    We will append to each switch an inventory for each access port: native VLAN, voice VLAN, MAC address, IP address
+    and VLAN of the clients connected to each switchport, etc.
+    The clients are downloaded once, with one paged /host download, and indexed by switch and switchport.
     We will access a DevNet Sandbox to run this script.
     Changes to the APIC-EM url, username and password are required if desired to access a different APIC-EM controller.
     """
 
+    parser = argparse.ArgumentParser(description='APIC-EM switches and switchports inventory')
+    parser.add_argument('--engine', choices=['serial', 'async', 'adaptive'], default='serial',
+                        help='serial collects one switch at a time, async collects all switches at the same time, '
+                             'adaptive collects the switches in parallel, following the controller load')
+    parser.add_argument('--max-in-flight', type=int, default=MAX_IN_FLIGHT,
+                        help='async and adaptive engines, maximum number of API calls in progress (default %(default)s)')
+    parser.add_argument('--limit-per-host', type=int, default=LIMIT_PER_HOST,
+                        help='async engine, maximum number of connections to the controller (default %(default)s)')
+    parser.add_argument('--no-clients', action='store_true',
+                        help='do not add the connected clients to the switchport lines, no /host download')
+    parser.add_argument('--controllers', help='federation mode, JSON file with the controllers to collect at the '
+                                              'same time, see apic_em_federation')
+    args = parser.parse_args()
+
+    if args.controllers:
+        controllers = apic_em_federation.read_controllers(args.controllers)
+        save_federated_switch_info(controllers, get_input_file(), args)
+        return
+
     # create an auth ticket for APIC-EM
 
-    global APIC_EM_TICKET  # make the ticket a global variable in this module
-    APIC_EM_TICKET = get_service_ticket()
+    get_service_ticket()  # the ticket is saved in the apic_em_client module, and used by all API calls
+
+    # ask user for filename input, each switch is saved to the file as soon as it is collected
+    filename = get_input_file()
+
+    # index the clients by switch and switchport, with one download of all the hosts
+    if not args.no_clients:
+        preload_switchport_clients()
 
     # build a list with all device id's
     switch_id_list = get_switch_ids()
-    switches_info = collect_switch_info(switch_id_list)
-
-    # ask user for filename input and save file
-    filename = get_input_file()
-    output_file = open(filename, 'w', newline='')
-    output_writer = csv.writer(output_file)
-    for lists in switches_info:
-        output_writer.writerow(lists)
-    output_file.close()
-    # pprint(switches_info)    # print for data validation
+    with apic_em_report.StreamingCSVWriter(filename) as output_writer:
+        if args.engine == 'async':
+            asyncio.run(save_switch_info_async(output_writer, switch_id_list, args.max_in_flight,
+                                               args.limit_per_host))
+        elif args.engine == 'adaptive':
+            limiter = apic_em_parallel.AdaptiveLimiter(max_limit=args.max_in_flight)
+            for switch_info_list in iter_switch_info(switch_id_list, limiter):
+                output_writer.write_rows(switch_info_list)
+            print(limiter.report())
+        else:
+            for switch_info_list in iter_switch_info(switch_id_list):
+                output_writer.write_rows(switch_info_list)
 
 
 if __name__ == '__main__':
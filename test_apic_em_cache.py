@@ -0,0 +1,112 @@
+# Tests for the API call caches, no controller needed
+# python3 -m pytest test_apic_em_cache.py
+
+import time
+import unittest
+import threading
+from unittest import mock
+import apic_em_cache
+
+
+class TTLCacheTest(unittest.TestCase):
+
+    def test_get_saved_value(self):
+        cache = apic_em_cache.TTLCache(maxsize=4, ttl=60)
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('b', 'missing'), 'missing')
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_entry_expires(self):
+        cache = apic_em_cache.TTLCache(maxsize=4, ttl=10)
+        with mock.patch.object(apic_em_cache.time, 'monotonic', return_value=100):
+            cache.set('a', 1)
+        with mock.patch.object(apic_em_cache.time, 'monotonic', return_value=109):
+            self.assertEqual(cache.get('a'), 1)
+        with mock.patch.object(apic_em_cache.time, 'monotonic', return_value=110):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_no_ttl_entry_does_not_expire(self):
+        cache = apic_em_cache.TTLCache(maxsize=4, ttl=None)
+        cache.set('a', 1)
+        with mock.patch.object(apic_em_cache.time, 'monotonic', return_value=10 ** 9):
+            self.assertEqual(cache.get('a'), 1)
+
+    def test_least_recently_used_entry_removed(self):
+        cache = apic_em_cache.TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_set_again_replaces_value(self):
+        cache = apic_em_cache.TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('a', 2)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get('a'), 2)
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def concurrent_calls(self, single_flight, function, callers=4):
+
+        # the leader call runs function, the other callers start while it waits for the release event
+
+        release = threading.Event()
+        results = []
+
+        def leader_function():
+            release.wait(5)
+            return function()
+
+        def call(key_function):
+            try:
+                results.append(single_flight.do('key', key_function))
+            except ValueError as error:
+                results.append(error)
+
+        leader = threading.Thread(target=call, args=(leader_function,))
+        leader.start()
+        while 'key' not in single_flight._in_flight:
+            time.sleep(0.001)
+        followers = [threading.Thread(target=call, args=(function,)) for caller in range(callers - 1)]
+        for follower in followers:
+            follower.start()
+        while single_flight.shared < callers - 1:
+            time.sleep(0.001)
+        release.set()
+        for thread in [leader] + followers:
+            thread.join(5)
+        return results
+
+    def test_concurrent_calls_share_one_call(self):
+        single_flight = apic_em_cache.SingleFlight()
+        function = mock.Mock(return_value='response')
+        results = self.concurrent_calls(single_flight, function)
+        self.assertEqual(results, ['response'] * 4)
+        self.assertEqual(function.call_count, 1)
+        self.assertEqual((single_flight.calls, single_flight.shared), (4, 3))
+
+    def test_exception_shared(self):
+        single_flight = apic_em_cache.SingleFlight()
+        function = mock.Mock(side_effect=ValueError('failed'))
+        results = self.concurrent_calls(single_flight, function)
+        self.assertEqual([str(result) for result in results], ['failed'] * 4)
+        self.assertEqual(function.call_count, 1)
+
+    def test_nothing_kept_after_call(self):
+        single_flight = apic_em_cache.SingleFlight()
+        function = mock.Mock(side_effect=['first', 'second'])
+        self.assertEqual(single_flight.do('key', function), 'first')
+        self.assertEqual(single_flight.do('key', function), 'second')
+        self.assertEqual(single_flight.shared, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
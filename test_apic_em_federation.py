@@ -0,0 +1,79 @@
+# Tests for the merge of the results of several controllers, no controller needed
+# python3 -m pytest test_apic_em_federation.py
+
+import unittest
+import apic_em_federation
+
+EMEA = {'name': 'emea'}
+AMER = {'name': 'amer'}
+
+
+def lookup(address, used=False, error=None):
+    return {'address': address, 'used': used, 'error': error}
+
+
+def failed_lookup(address):
+    return lookup(address, error=apic_em_federation.CONTROLLER_FAILED)
+
+
+def is_used(row):
+    return row['used']
+
+
+class MergeDevicesTest(unittest.TestCase):
+
+    def test_duplicate_serial_number_kept_once(self):
+        results = [(EMEA, [{'serial': 'FOC1'}, {'serial': 'FOC2'}]), (AMER, [{'serial': 'FOC2'}, {'serial': 'FOC3'}])]
+        merged, duplicates = apic_em_federation.merge_devices(results, lambda device: device['serial'])
+        self.assertEqual([(name, device['serial']) for name, device in merged],
+                         [('emea', 'FOC1'), ('emea', 'FOC2'), ('amer', 'FOC3')])
+        self.assertEqual(duplicates, 1)
+
+    def test_no_serial_number_all_kept(self):
+        results = [(EMEA, [{'serial': None}]), (AMER, [{'serial': None}])]
+        merged, duplicates = apic_em_federation.merge_devices(results, lambda device: device['serial'])
+        self.assertEqual(len(merged), 2)
+        self.assertEqual(duplicates, 0)
+
+    def test_failed_controller_skipped(self):
+        results = [(EMEA, None), (AMER, [{'serial': 'FOC1'}])]
+        merged, duplicates = apic_em_federation.merge_devices(results, lambda device: device['serial'])
+        self.assertEqual([name for name, device in merged], ['amer'])
+
+
+class MergeLookupsTest(unittest.TestCase):
+
+    def merge(self, results, addresses):
+        return apic_em_federation.merge_lookups(results, is_used, addresses, failed_lookup)
+
+    def test_used_address_one_row_for_each_controller(self):
+        results = [(EMEA, [lookup('a', used=True)]), (AMER, [lookup('a', used=True)])]
+        self.assertEqual([name for name, row in self.merge(results, ['a'])], ['emea', 'amer'])
+
+    def test_not_used_address_one_row(self):
+        results = [(EMEA, [lookup('a')]), (AMER, [lookup('a')])]
+        self.assertEqual(self.merge(results, ['a']), [('', lookup('a'))])
+
+    def test_lookup_error_kept(self):
+        results = [(EMEA, [lookup('a', used=True), lookup('b')]),
+                   (AMER, [lookup('a', error='timeout'), lookup('b', error='timeout')])]
+        merged = self.merge(results, ['a', 'b'])
+        self.assertEqual([(name, row['address'], row['error']) for name, row in merged],
+                         [('emea', 'a', None), ('amer', 'a', 'timeout'), ('amer', 'b', 'timeout')])
+
+    def test_failed_controller_one_error_row_for_each_address(self):
+        results = [(EMEA, [lookup('a', used=True), lookup('b')]), (AMER, None)]
+        merged = self.merge(results, ['a', 'b'])
+        self.assertEqual([(name, row['address'], row['error']) for name, row in merged],
+                         [('emea', 'a', None), ('amer', 'a', apic_em_federation.CONTROLLER_FAILED),
+                          ('', 'b', None), ('amer', 'b', apic_em_federation.CONTROLLER_FAILED)])
+
+    def test_all_controllers_failed(self):
+        merged = self.merge([(EMEA, None), (AMER, None)], ['a'])
+        self.assertEqual([(name, row['error']) for name, row in merged],
+                         [('emea', apic_em_federation.CONTROLLER_FAILED),
+                          ('amer', apic_em_federation.CONTROLLER_FAILED)])
+
+
+if __name__ == '__main__':
+    unittest.main()
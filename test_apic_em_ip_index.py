@@ -0,0 +1,58 @@
+# Tests for the IP address snapshot, no controller needed
+# python3 -m pytest test_apic_em_ip_index.py
+
+import unittest
+from unittest import mock
+import apic_em_client
+import apic_em_ip_index
+
+DEVICES = [{'id': 'd1', 'hostname': 'sw-1', 'type': 'Cisco Catalyst 3850', 'managementIpAddress': '10.2.0.1'},
+           {'id': 'd2', 'hostname': 'rtr-1', 'type': 'Cisco 4451 Router', 'managementIpAddress': '10.3.0.1'}]
+INTERFACES = [{'deviceId': 'd1', 'portName': 'Vlan10', 'ipv4Address': '10.2.1.1'},
+              {'deviceId': 'd2', 'portName': 'GigabitEthernet0/0/0', 'ipv4Address': '10.2.255.255'},
+              {'deviceId': 'd2', 'portName': 'Loopback0', 'ipv4Address': '10.3.0.1'},
+              {'deviceId': 'd2', 'portName': 'GigabitEthernet0/0/1', 'ipv4Address': None}]
+HOSTS = [{'hostIp': '10.2.1.22', 'hostType': 'wired', 'vlanId': '10', 'connectedNetworkDeviceId': 'd1',
+          'connectedInterfaceName': 'GigabitEthernet1/0/1'},
+         {'hostIp': '2001:db8::10', 'hostType': 'wireless', 'vlanId': '20', 'connectedNetworkDeviceId': 'd1',
+          'connectedInterfaceName': None},
+         {'hostIp': 'not an address', 'hostType': 'wired'}]
+
+
+class IPSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshot = apic_em_ip_index.IPSnapshot()
+        with mock.patch.object(apic_em_client, 'preload_device_inventory', return_value={'devices': DEVICES}), \
+                mock.patch.object(apic_em_client, 'iter_interfaces', return_value=iter(INTERFACES)), \
+                mock.patch.object(apic_em_client, 'iter_hosts', return_value=iter(HOSTS)):
+            self.snapshot.refresh()
+
+    def test_lookup(self):
+        self.assertEqual(len(self.snapshot), 6)
+        self.assertEqual(self.snapshot.lookup('10.3.0.1'),
+                         [(apic_em_ip_index.DEVICE, 'd2', None, None, None),
+                          (apic_em_ip_index.INTERFACE, 'd2', 'Loopback0', None, None)])
+        self.assertEqual(self.snapshot.lookup('10.9.9.9'), [])
+        self.assertEqual(self.snapshot.lookup('not an address'), [])
+
+    def test_lookup_network(self):
+        network_usage = self.snapshot.lookup_network('10.2.0.0/16')
+        self.assertEqual([ip_address for ip_address, entries in network_usage],
+                         ['10.2.0.1', '10.2.1.1', '10.2.1.22', '10.2.255.255'])
+        self.assertEqual(network_usage[2][1],
+                         [(apic_em_ip_index.HOST, 'd1', 'GigabitEthernet1/0/1', '10', 'wired')])
+
+    def test_lookup_network_host_bits_set(self):
+        self.assertEqual([ip_address for ip_address, entries in self.snapshot.lookup_network('10.2.1.5/24')],
+                         ['10.2.1.1', '10.2.1.22'])
+
+    def test_lookup_network_address_families_do_not_overlap(self):
+        self.assertEqual([ip_address for ip_address, entries in self.snapshot.lookup_network('2001:db8::/32')],
+                         ['2001:db8::10'])
+        self.assertEqual(len(self.snapshot.lookup_network('0.0.0.0/0')), 5)
+        self.assertEqual(self.snapshot.lookup_network('192.168.0.0/16'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
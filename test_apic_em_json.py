@@ -0,0 +1,69 @@
+# Tests for the decoding of the controller responses, with orjson and with the standard library json module
+# python3 -m pytest test_apic_em_json.py
+
+import unittest
+from unittest import mock
+import apic_em_client
+import apic_em_json
+
+PAGE = b'{"response": [{"id": "1", "hostname": "sw-1"}, {"id": "2", "hostname": "sw-\\u00e9"}], "version": "1.0"}'
+
+
+class FakeResponse(object):
+    """
+    Response with a status code and a body
+    """
+
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    def __bool__(self):
+        return self.status_code < 400
+
+
+class LoadsTest(unittest.TestCase):
+
+    def check_backend(self):
+        self.assertEqual(apic_em_json.loads(PAGE)['response'][1], {'id': '2', 'hostname': 'sw-é'})
+        self.assertEqual(apic_em_json.loads(PAGE.decode()), apic_em_json.loads(PAGE))
+        self.assertEqual(apic_em_json.response_json(FakeResponse(200, b'{"response": []}')), {'response': []})
+        with self.assertRaises(ValueError):
+            apic_em_json.loads(PAGE[:-10])
+
+    def test_json_backend(self):
+        with mock.patch.object(apic_em_json, 'orjson', None):
+            self.check_backend()
+
+    @unittest.skipIf(apic_em_json.orjson is None, 'orjson is not installed')
+    def test_orjson_backend(self):
+        self.check_backend()
+
+
+class GetPageTest(unittest.TestCase):
+
+    def get_page(self, status_code, content):
+        with mock.patch.object(apic_em_client, 'api_get', return_value=FakeResponse(status_code, content)):
+            return apic_em_client.get_page('/network-device', 1, 500)
+
+    def test_records(self):
+        self.assertEqual([record['id'] for record in self.get_page(200, PAGE)], ['1', '2'])
+
+    def test_end_of_collection(self):
+        self.assertEqual(self.get_page(404, b'{"response": {"errorCode": "NotFound"}}'), [])
+
+    def test_truncated_page_raises(self):
+        with self.assertRaises(apic_em_client.APICEMError):
+            self.get_page(200, PAGE[:40])
+
+    def test_no_records_list_raises(self):
+        with self.assertRaises(apic_em_client.APICEMError):
+            self.get_page(200, b'{"response": {"message": "error"}}')
+
+    def test_error_status_raises(self):
+        with self.assertRaises(apic_em_client.APICEMError):
+            self.get_page(400, b'{"response": {"message": "error"}}')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+# Tests for the MAC address normalization and the MAC address snapshot, no controller needed
+# python3 -m pytest test_apic_em_mac_index.py
+
+import unittest
+from unittest import mock
+import apic_em_client
+import apic_em_mac_index
+
+HOST = {'hostMac': '00:0c:29:AB:cd:01', 'hostIp': '10.2.1.22', 'hostType': 'wired', 'vlanId': '10',
+        'connectedNetworkDeviceId': 'd1', 'connectedInterfaceName': 'GigabitEthernet1/0/1'}
+
+
+class MacKeyTest(unittest.TestCase):
+
+    def test_accepted_formats(self):
+        for mac in ['00:0c:29:ab:cd:01', '00-0C-29-AB-CD-01', '000c.29ab.cd01', '000C29ABCD01', ' 00:0c:29:ab:cd:01\n']:
+            self.assertEqual(apic_em_mac_index.mac_key(mac), 0x000c29abcd01, mac)
+
+    def test_invalid_formats(self):
+        for mac in [None, '', '00:0c:29:ab:cd', '00:0c-29:ab:cd:01', '000c.29ab.cd0g', '00:0c:29:ab:cd:01:02',
+                    '0c:29:ab:cd:1:00']:
+            self.assertIsNone(apic_em_mac_index.mac_key(mac), mac)
+
+    def test_normalize_mac(self):
+        self.assertEqual(apic_em_mac_index.normalize_mac('000C.29AB.CD01'), '00:0c:29:ab:cd:01')
+        self.assertEqual(apic_em_mac_index.normalize_mac('000000000001'), '00:00:00:00:00:01')
+        self.assertIsNone(apic_em_mac_index.normalize_mac('not a mac'))
+
+
+class NormalizeMacListTest(unittest.TestCase):
+
+    def test_duplicates_in_other_formats_removed(self):
+        mac_list = ['000c.29ab.cd01', '00:0c:29:ab:cd:02', '00-0C-29-AB-CD-01', '000c29abcd02']
+        self.assertEqual(apic_em_mac_index.normalize_mac_list(mac_list),
+                         [('000c.29ab.cd01', '00:0c:29:ab:cd:01'), ('00:0c:29:ab:cd:02', '00:0c:29:ab:cd:02')])
+
+    def test_invalid_mac_kept_once(self):
+        mac_list = ['bad', '00:0c:29:ab:cd:01', 'bad', 'other']
+        self.assertEqual(apic_em_mac_index.normalize_mac_list(mac_list),
+                         [('bad', None), ('00:0c:29:ab:cd:01', '00:0c:29:ab:cd:01'), ('other', None)])
+
+
+class MACSnapshotTest(unittest.TestCase):
+
+    def test_lookup_in_any_format(self):
+        inventory = {'devices': [{'id': 'd1', 'hostname': 'sw-1', 'type': 'Cisco Catalyst 3850'}]}
+        snapshot = apic_em_mac_index.MACSnapshot()
+        with mock.patch.object(apic_em_client, 'preload_device_inventory', return_value=inventory), \
+                mock.patch.object(apic_em_client, 'iter_hosts', return_value=iter([HOST, {'hostMac': None}])):
+            snapshot.refresh()
+        self.assertEqual(len(snapshot), 1)
+        self.assertEqual(snapshot.lookup('000c.29ab.cd01'), ('10.2.1.22', 'wired', '10', 'd1', 'GigabitEthernet1/0/1'))
+        self.assertIsNone(snapshot.lookup('00:0c:29:ab:cd:02'))
+        self.assertIsNone(snapshot.lookup('bad'))
+        self.assertEqual(snapshot.get_device('d1'), ('sw-1', 'Cisco Catalyst 3850'))
+        self.assertEqual(snapshot.get_device('d2'), (None, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# Tests for the adaptive concurrency limit, no controller needed
+# python3 -m pytest test_apic_em_parallel.py
+
+import unittest
+from unittest import mock
+import apic_em_client
+import apic_em_metrics
+import apic_em_parallel
+
+
+class FakeResponse(object):
+    """
+    Response with a status code, no body
+    """
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+        self.content = b''
+
+    def close(self):
+        pass
+
+
+class AdaptiveLimiterTest(unittest.TestCase):
+
+    def release(self, limiter, latency, throttled=False):
+        limiter.acquire()
+        limiter.release(latency, throttled)
+
+    def test_limit_grows_while_latency_is_flat(self):
+        limiter = apic_em_parallel.AdaptiveLimiter(initial_limit=4, max_limit=8)
+        for call in range(100):
+            self.release(limiter, 0.01)
+        self.assertEqual(limiter.limit, 8)
+        self.assertEqual(limiter.peak_limit, 8)
+        self.assertEqual(limiter.decreases, 0)
+
+    def test_throttled_call_halves_limit(self):
+        limiter = apic_em_parallel.AdaptiveLimiter(initial_limit=8, max_limit=8)
+        self.release(limiter, 0.01, throttled=True)
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.throttled, 1)
+        self.assertEqual(limiter.decreases, 1)
+
+    def test_latency_growth_decreases_limit(self):
+        limiter = apic_em_parallel.AdaptiveLimiter(initial_limit=8, max_limit=8)
+        for call in range(10):
+            self.release(limiter, 0.01)
+        for call in range(10):
+            self.release(limiter, 1.0)
+        self.assertLess(limiter.limit, 8)
+        self.assertEqual(limiter.throttled, 0)
+
+    def test_limit_not_below_min_limit(self):
+        limiter = apic_em_parallel.AdaptiveLimiter(initial_limit=2, min_limit=1)
+        with mock.patch.object(apic_em_parallel.time, 'monotonic', side_effect=range(100, 200)):
+            for call in range(10):
+                self.release(limiter, 0.01, throttled=True)
+        self.assertEqual(limiter.limit, 1)
+
+
+class SendGetLimiterTest(unittest.TestCase):
+
+    def setUp(self):
+        patches = [mock.patch.object(apic_em_client, 'BACKOFF_BASE', 0),
+                   mock.patch.object(apic_em_client, 'BACKOFF_CAP', 0),
+                   mock.patch.object(apic_em_client, 'RETRIES', 0),
+                   mock.patch.object(apic_em_client, '_breakers', {})]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(apic_em_metrics.reset)
+
+    def throttled(self, status_code):
+        limiter = mock.Mock()
+        session = mock.Mock()
+        session.get.return_value = FakeResponse(status_code)
+        with mock.patch.object(apic_em_client, '_limiter', limiter), \
+                mock.patch.object(apic_em_client, 'get_session', return_value=session):
+            apic_em_client.send_get('/host', 'http://mock/host', None, {})
+        return limiter.release.call_args[1]['throttled']
+
+    def test_429_and_503_are_throttling(self):
+        self.assertTrue(self.throttled(429))
+        self.assertTrue(self.throttled(503))
+
+    def test_other_errors_are_not_throttling(self):
+        self.assertFalse(self.throttled(200))
+        self.assertFalse(self.throttled(500))
+        self.assertFalse(self.throttled(504))
+
+
+if __name__ == '__main__':
+    unittest.main()
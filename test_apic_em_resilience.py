@@ -0,0 +1,111 @@
+# Tests for the circuit breakers and the retries of apic_em_client.send_get, with a fake session, no controller
+# python3 -m pytest test_apic_em_resilience.py
+
+import unittest
+from unittest import mock
+import apic_em_client
+import apic_em_metrics
+import apic_em_resilience
+
+
+class FakeResponse(object):
+    """
+    Response with a status code, no body
+    """
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+        self.content = b''
+
+    def __bool__(self):
+        return self.status_code < 400
+
+    def close(self):
+        pass
+
+
+class FakeSession(object):
+    """
+    Session returning the status codes in order, the last one again when all were returned
+    """
+
+    def __init__(self, status_codes):
+        self.status_codes = list(status_codes)
+        self.calls = 0
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        if len(self.status_codes) > 1:
+            return FakeResponse(self.status_codes.pop(0))
+        return FakeResponse(self.status_codes[0])
+
+
+class SendGetBreakerTest(unittest.TestCase):
+
+    def setUp(self):
+        patches = [mock.patch.object(apic_em_client, 'BACKOFF_BASE', 0),
+                   mock.patch.object(apic_em_client, 'BACKOFF_CAP', 0),
+                   mock.patch.object(apic_em_client, '_limiter', None),
+                   mock.patch.object(apic_em_client, '_breakers', {})]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(apic_em_metrics.reset)
+
+    def send_get(self, status_codes):
+        session = FakeSession(status_codes)
+        with mock.patch.object(apic_em_client, 'get_session', return_value=session):
+            response = apic_em_client.send_get('/license-info/network-device/1', 'http://mock/license-info', None, {})
+        return response, session
+
+    def open_breaker(self):
+        breaker = apic_em_client.get_breaker('/license-info')
+        breaker.reset_timeout = 0
+        for failure in range(breaker.failure_threshold):
+            breaker.record_failure()
+        self.assertEqual(breaker.state, apic_em_resilience.OPEN)
+        return breaker
+
+    def test_one_failure_for_each_api_call(self):
+        response, session = self.send_get([500])
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(session.calls, apic_em_client.RETRIES + 1)
+        breaker = apic_em_client.get_breaker('/license-info')
+        self.assertEqual(breaker.failures, 1)
+        self.assertEqual(breaker.state, apic_em_resilience.CLOSED)
+
+    def test_retry_success_closes(self):
+        response, session = self.send_get([500, 503, 200])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(apic_em_client.get_breaker('/license-info').failures, 0)
+
+    def test_half_open_trial_throttled_releases_trial(self):
+        breaker = self.open_breaker()
+        response, session = self.send_get([429])
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(breaker.state, apic_em_resilience.HALF_OPEN)
+        # the trial slot is free again, the next API call is the new trial call
+        response, session = self.send_get([200])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(breaker.state, apic_em_resilience.CLOSED)
+
+    def test_half_open_trial_failed_reopens(self):
+        breaker = self.open_breaker()
+        breaker.reset_timeout = 60
+        breaker._opened_at -= 60
+        self.send_get([500])
+        self.assertEqual(breaker.state, apic_em_resilience.OPEN)
+        with self.assertRaises(apic_em_client.CircuitOpenError):
+            self.send_get([200])
+
+    def test_half_open_allows_one_trial(self):
+        breaker = self.open_breaker()
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.release_trial()
+        self.assertTrue(breaker.allow())
+
+
+if __name__ == '__main__':
+    unittest.main()
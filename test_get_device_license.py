@@ -0,0 +1,119 @@
+# Tests for the incremental license report, no controller needed
+# python3 -m pytest test_get_device_license.py
+
+import unittest
+from unittest import mock
+import apic_em_client
+import apic_em_store
+import get_device_license
+
+# collected at 2017-01-01 00:00:00 UTC, up for 2 days, 3 hours, 4 minutes and 5 seconds
+
+COLLECTED = 1483228800
+UP_TIME = 2 * 86400 + 3 * 3600 + 4 * 60 + 5
+
+
+def device(device_id='d1', up_time='2 days, 3:04:05.00', **fields):
+    device_info = {'id': device_id, 'hostname': 'sw-' + device_id, 'serialNumber': 'FOC' + device_id,
+                   'platformId': 'WS-C3850-48U', 'softwareVersion': '16.3.2', 'upTime': up_time,
+                   'lastUpdateTime': COLLECTED * 1000}
+    device_info.update(fields)
+    return device_info
+
+
+class GetBootTimeTest(unittest.TestCase):
+
+    def test_days_and_time(self):
+        self.assertEqual(get_device_license.get_boot_time(device()), COLLECTED - UP_TIME)
+
+    def test_one_day(self):
+        self.assertEqual(get_device_license.get_boot_time(device(up_time='1 day, 0:00:10')), COLLECTED - 86410)
+
+    def test_time_only(self):
+        self.assertEqual(get_device_license.get_boot_time(device(up_time='3:04:05')), COLLECTED - 11045)
+
+    def test_last_updated_string(self):
+        device_info = device(lastUpdateTime=None, lastUpdated='2017-01-01 00:00:00')
+        self.assertEqual(get_device_license.get_boot_time(device_info), COLLECTED - UP_TIME)
+
+    def test_unknown_format(self):
+        for up_time in [None, '', 'unknown', '2 weeks']:
+            self.assertIsNone(get_device_license.get_boot_time(device(up_time=up_time)), up_time)
+
+
+class DeviceChangedTest(unittest.TestCase):
+
+    def state(self, device_info, licenses=('ipbase',)):
+        return (get_device_license.get_change_marker(device_info), get_device_license.get_boot_time(device_info),
+                list(licenses))
+
+    def test_new_device(self):
+        self.assertTrue(get_device_license.device_changed(device(), None))
+
+    def test_unchanged_device(self):
+        state = self.state(device())
+        self.assertFalse(get_device_license.device_changed(device(), state))
+
+    def test_later_collection_same_boot_time(self):
+        state = self.state(device())
+        later = device(up_time='2 days, 4:04:05', lastUpdateTime=(COLLECTED + 3600) * 1000)
+        self.assertFalse(get_device_license.device_changed(later, state))
+
+    def test_boot_time_within_tolerance(self):
+        state = self.state(device())
+        self.assertFalse(get_device_license.device_changed(device(up_time='2 days, 3:00:05'), state))
+
+    def test_reloaded_device(self):
+        state = self.state(device())
+        self.assertTrue(get_device_license.device_changed(device(up_time='0:10:00'), state))
+
+    def test_change_marker_fields(self):
+        state = self.state(device())
+        for field in get_device_license.CHANGE_MARKERS:
+            self.assertTrue(get_device_license.device_changed(device(**{field: 'changed'}), state), field)
+
+    def test_up_time_format_no_longer_known(self):
+        state = self.state(device())
+        self.assertTrue(get_device_license.device_changed(device(up_time='unknown'), state))
+        state = self.state(device(up_time='unknown'))
+        self.assertFalse(get_device_license.device_changed(device(up_time='unknown'), state))
+
+
+class IncrementalRunTest(unittest.TestCase):
+
+    def run_report(self, state_store, devices, license_info):
+        with mock.patch.object(apic_em_client, 'preload_device_inventory', return_value={'devices': devices}), \
+                mock.patch.object(apic_em_client, 'get_license_info', side_effect=license_info) as get_license_info, \
+                mock.patch('builtins.print'):
+            rows = list(get_device_license.iter_device_info_incremental(state_store))
+        return rows[1:], [call[0][0] for call in get_license_info.call_args_list]
+
+    def test_only_changed_devices_collected(self):
+        state_store = apic_em_store.SnapshotStore(':memory:')
+        licenses = [{'name': 'ipbase', 'status': 'INUSE'}, {'name': 'ipservices', 'status': 'NOTINUSE'}]
+        rows, collected = self.run_report(state_store, [device('d1'), device('d2')], lambda device_id: licenses)
+        self.assertEqual(rows, [['sw-d1', 'FOCd1', 'ipbase'], ['sw-d2', 'FOCd2', 'ipbase']])
+        self.assertEqual(collected, ['d1', 'd2'])
+
+        # d2 reloaded, d3 new, d1 unchanged
+        devices = [device('d1'), device('d2', up_time='0:05:00'), device('d3')]
+        rows, collected = self.run_report(state_store, devices, lambda device_id: [])
+        self.assertEqual(rows, [['sw-d1', 'FOCd1', 'ipbase'], ['sw-d2', 'FOCd2'], ['sw-d3', 'FOCd3']])
+        self.assertEqual(collected, ['d2', 'd3'])
+
+        # d1 removed from the controller
+        rows, collected = self.run_report(state_store, [device('d2', up_time='0:05:00'), device('d3')], [])
+        self.assertEqual(collected, [])
+        self.assertEqual(sorted(state_store.get_license_states()), ['d2', 'd3'])
+
+    def test_failed_license_lookup_collected_again(self):
+        state_store = apic_em_store.SnapshotStore(':memory:')
+        error = apic_em_client.APICEMError('status code 500')
+        rows, collected = self.run_report(state_store, [device('d1')], error)
+        self.assertEqual(rows, [['sw-d1', 'FOCd1', get_device_license.LICENSE_LOOKUP_FAILED]])
+        rows, collected = self.run_report(state_store, [device('d1')], lambda device_id: [])
+        self.assertEqual(collected, ['d1'])
+
+
+if __name__ == '__main__':
+    unittest.main()